@@ -0,0 +1,33 @@
+#Strong scaling of connect_parallel: the same point cloud is connected
+#serially and in an increasing number of tiles, printing the wall time of
+#each and the speedup over connect.
+import time
+import numpy
+import pylagrit
+from pylagrit.io import write_avs
+
+#Create your pylagrit session.
+lg = pylagrit.PyLaGriT()
+
+#Write a random point cloud, whose Delaunay mesh is unique.
+numpy.random.seed(0)
+write_avs('connect_parallel_pts.inp', numpy.random.rand(200000, 3))
+
+#Connect it in a single LaGriT session.
+pts = lg.read('connect_parallel_pts.inp')
+start = time.time()
+pts.connect()
+serial = time.time() - start
+print('%12s %10s %8s' % ('tiles', 'seconds', 'speedup'))
+print('%12s %10.2f %8.2f' % ('connect', serial, 1.))
+pts.delete()
+
+#Connect it in overlapping tiles, one LaGriT session per tile.
+for tiles in [2, 4, 8, 16, 32]:
+    pts = lg.read('connect_parallel_pts.inp')
+    start = time.time()
+    tet = pts.connect_parallel(tiles=tiles)
+    wall = time.time() - start
+    print('%12d %10.2f %8.2f' % (tiles, wall, serial / wall))
+    pts.delete()
+    tet.delete()
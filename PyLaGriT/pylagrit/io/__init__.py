@@ -0,0 +1,14 @@
+from pylagrit.io.avs import read_avs, iter_avs, write_avs
+from pylagrit.io.compress import open_compressed, compressed_output, decompressed
+from pylagrit.io.dem import read_dem_header, iter_dem
+from pylagrit.io.exodus import write_exodus
+from pylagrit.io.uge import (
+    read_uge,
+    write_uge,
+    filter_uge,
+    scale_uge,
+    renumber_uge,
+    merge_uge_cells,
+)
+from pylagrit.io.vtk import write_vtu
+from pylagrit.io.xdmf import write_xdmf, append_xdmf
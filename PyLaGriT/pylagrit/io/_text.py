@@ -0,0 +1,101 @@
+"""
+Text parsing shared by the readers of LaGriT's text file formats
+
+Files are read in large blocks, and lines are located and numbers parsed
+with numpy, so that sections of a file are skipped or collected a chunk of
+lines at a time.
+"""
+
+import re
+import warnings
+import numpy
+
+_BLOCK_SIZE = 2 ** 24
+
+# Fortran drops the exponent letter when the exponent has three digits
+# (1.000000000000-100); the sign must follow a digit or the decimal point
+_FORTRAN_EXPONENT = re.compile(rb"(?<=[0-9.])(?=[+-][0-9]{3}\b)")
+
+
+def to_float(data):
+    """Float64 array of the numbers in bytes, as written by Fortran"""
+    try:
+        return from_string(data, numpy.float64)
+    except ValueError:
+        return from_string(_FORTRAN_EXPONENT.sub(b"E", data), numpy.float64)
+
+
+def from_string(data, dtype):
+    """Array of the whitespace separated numbers in bytes, of type dtype"""
+    # Older numpy warns instead of raising on text it cannot parse
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return numpy.fromstring(data, dtype=dtype, sep=" ")
+        except DeprecationWarning as e:
+            raise ValueError(str(e))
+
+
+class LineReader(object):
+    """
+    Buffered reader that locates line ends with numpy so sections of the
+    file can be skipped or collected a chunk of lines at a time
+    """
+
+    def __init__(self, fh, blocksize=_BLOCK_SIZE):
+        self.fh = fh
+        self.blocksize = blocksize
+        self.buf = b""
+        self.offset = 0
+        self.pos = 0
+        self.ends = numpy.zeros(0, dtype=numpy.int64)
+        self.iend = 0
+
+    def tell(self):
+        return self.offset + self.pos
+
+    def peek(self):
+        while self.iend == len(self.ends):
+            self._fill()
+        return self.buf[self.pos : self.ends[self.iend]]
+
+    def take(self, nlines, keep=True):
+        start = self.tell()
+        parts = []
+        while True:
+            navail = len(self.ends) - self.iend
+            n = min(nlines, navail)
+            if n > 0:
+                end = self.ends[self.iend + n - 1]
+                if keep:
+                    parts.append(self.buf[self.pos : end])
+                self.iend += n
+                self.pos = end
+                nlines -= n
+            if nlines == 0:
+                return start, b"".join(parts)
+            self._fill()
+
+    def read(self):
+        # Rest of the file
+        data = self.buf[self.pos :] + self.fh.read()
+        self.offset += self.pos + len(data)
+        self.buf = b""
+        self.pos = 0
+        self.ends = numpy.zeros(0, dtype=numpy.int64)
+        self.iend = 0
+        return data
+
+    def _fill(self):
+        data = self.fh.read(self.blocksize)
+        if not data:
+            if self.pos == len(self.buf):
+                raise ValueError("Unexpected end of file")
+            # Last line without a newline
+            data = b"\n"
+        self.offset += self.pos
+        self.buf = self.buf[self.pos :] + data
+        self.pos = 0
+        nl = numpy.frombuffer(self.buf, dtype=numpy.uint8) == ord("\n")
+        self.ends = numpy.flatnonzero(nl) + 1
+        self.iend = 0
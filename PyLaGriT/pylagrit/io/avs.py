@@ -0,0 +1,493 @@
+"""
+Reader for the AVS UCD files written by LaGriT (dump/avs, dump/avs2)
+
+The file is scanned once for line boundaries; the node, element and
+attribute sections are then cut into chunks of rows that are parsed in
+parallel by a pool of processes. Uncompressed files are handed to the
+workers as byte ranges, so only the parsed arrays travel between processes.
+"""
+
+import os
+from collections import OrderedDict, deque
+from itertools import chain
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy
+from pylagrit.io._text import LineReader, from_string, to_float
+from pylagrit.io.compress import COMPRESSED_EXTENSIONS, open_compressed
+
+# LaGriT element type codes (ifelmpnt, ifelmlin, ... in blockcom.h)
+ELEMENT_TYPES = OrderedDict(
+    [
+        ("pt", 1),
+        ("line", 2),
+        ("tri", 3),
+        ("quad", 4),
+        ("tet", 5),
+        ("pyr", 6),
+        ("prism", 7),
+        ("hex", 8),
+    ]
+)
+
+# Number of nodes per element, indexed by LaGriT element type code
+NODES_PER_ELEMENT = numpy.array([0, 1, 2, 3, 4, 4, 5, 6, 8], dtype=numpy.int64)
+
+# dumpavs.f permutes tet, pyr, prism and hex connectivity into the AVS
+# convention; these index lists restore the LaGriT (itet) node order.
+AVS_TO_LAGRIT_ORDER = {
+    1: [0],
+    2: [0, 1],
+    3: [0, 1, 2],
+    4: [0, 1, 2, 3],
+    5: [0, 1, 3, 2],
+    6: [1, 2, 3, 4, 0],
+    7: [3, 4, 5, 0, 1, 2],
+    8: [4, 5, 6, 7, 0, 1, 2, 3],
+}
+
+# Rows per chunk handed to a worker
+CHUNKSIZE = 2 ** 18
+
+# dumpavs.f writes at most 100 attribute values per line with dump/avs
+_MAX_COLUMNS = 100
+
+# AVS_TO_LAGRIT_ORDER as an array indexed by element type code
+_ORDER = numpy.zeros((len(NODES_PER_ELEMENT), 8), dtype=numpy.int64)
+for _ityp, _order in AVS_TO_LAGRIT_ORDER.items():
+    _ORDER[_ityp, : len(_order)] = _order
+
+
+def read_avs(filename, chunksize=CHUNKSIZE, workers=None):
+    """
+    Read an AVS UCD file written by LaGriT into numpy arrays
+
+    Connectivity is returned in LaGriT node order (as stored in the itet
+    attribute of the mesh object), not the AVS order used in the file.
+    Files with more rows than chunksize are parsed in parallel; use
+    iter_avs to process files that do not fit in memory.
+
+    :arg filename: Name of AVS file, may be gz or zst compressed
+    :type filename: str
+    :arg chunksize: Number of nodes or elements parsed per task
+    :type chunksize: int
+    :arg workers: Number of worker processes, defaults to the number of CPUs.
+                  1 parses in this process.
+    :type workers: int
+    :returns: dict with keys 'coords' (nnodes x 3), 'itetclr', 'itettyp',
+              'itetoff', 'itet' (1-based node numbers), 'node_attributes' and
+              'element_attributes' (OrderedDicts of arrays keyed by name)
+
+    Example:
+        >>> from pylagrit.io import read_avs
+        >>> mesh = read_avs('test.inp')
+        >>> print(mesh['coords'].shape, mesh['node_attributes'].keys())
+    """
+    parts = OrderedDict(
+        [
+            ("coords", []),
+            ("elements", []),
+            ("node_attributes", []),
+            ("element_attributes", []),
+        ]
+    )
+    for section, start, data in iter_avs(filename, chunksize, workers):
+        parts[section].append(data)
+
+    elems = parts["elements"]
+    mesh = OrderedDict()
+    mesh["coords"] = _concatenate(parts["coords"], numpy.zeros((0, 3)))
+    for k, dtype in [
+        ("itetclr", numpy.int64),
+        ("itettyp", numpy.int8),
+        ("itetoff", numpy.int64),
+        ("itet", numpy.int64),
+    ]:
+        mesh[k] = _concatenate([e[k] for e in elems], numpy.zeros(0, dtype=dtype))
+    for section in ["node_attributes", "element_attributes"]:
+        atts = OrderedDict()
+        for k in parts[section][0].keys() if parts[section] else []:
+            atts[k] = _concatenate([a[k] for a in parts[section]], None)
+        mesh[section] = atts
+    return dict(mesh)
+
+
+def iter_avs(filename, chunksize=CHUNKSIZE, workers=None):
+    """
+    Generator over the chunks of an AVS UCD file written by LaGriT
+
+    Chunks are yielded in file order as (section, start, data) tuples, where
+    start is the index of the first node or element in the chunk and section
+    and data are one of
+
+    * 'coords': node coordinates, chunk rows by 3
+    * 'elements': dict of 'itetclr', 'itettyp', 'itetoff' and 'itet' for the
+      chunk. itetoff is the offset into the connectivity of the whole mesh.
+    * 'node_attributes' or 'element_attributes': OrderedDict of arrays
+
+    At most two chunks per worker are held in memory at any time.
+
+    :arg filename: Name of AVS file, may be gz or zst compressed
+    :type filename: str
+    :arg chunksize: Number of nodes or elements parsed per task
+    :type chunksize: int
+    :arg workers: Number of worker processes, defaults to the number of CPUs.
+                  1 parses in this process.
+    :type workers: int
+
+    Example:
+        >>> from pylagrit.io import iter_avs
+        >>> vmax = 0.
+        >>> for section, start, data in iter_avs('big.inp'):
+        >>>     if section == 'coords':
+        >>>         vmax = max(vmax, data[:, 2].max())
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # Workers read byte ranges of uncompressed files themselves
+    by_range = os.path.splitext(filename)[1] not in COMPRESSED_EXTENSIONS
+    with open_compressed(filename, "rb") as fh:
+        reader = LineReader(fh)
+        counts = _read_header(reader)
+        pool = None
+        if workers > 1 and counts[0] + counts[1] > chunksize:
+            pool = ProcessPoolExecutor(workers)
+        try:
+            pending = deque()
+            noffset = 0
+            tasks = _tasks(filename, reader, by_range, chunksize, *counts)
+            # None flushes the chunks still pending at the end of the file
+            for task in chain(tasks, [None]):
+                if task is not None:
+                    pending.append((task[0], task[1], _submit(pool, task)))
+                while pending and (len(pending) >= 2 * workers or task is None):
+                    section, start, future = pending.popleft()
+                    data = future.result()
+                    if section == "elements":
+                        # Chunk offsets become offsets into the whole mesh
+                        data["itetoff"] += noffset
+                        noffset += len(data["itet"])
+                    yield section, start, data
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+
+def write_avs(
+    filename,
+    coords,
+    itet=None,
+    itetoff=None,
+    itettyp=None,
+    itetclr=None,
+    node_attributes=None,
+    element_attributes=None,
+    chunksize=CHUNKSIZE,
+):
+    """
+    Write an AVS UCD file that LaGriT can read with read/avs
+
+    The inverse of read_avs: connectivity is given in LaGriT node order and
+    written in the AVS convention. Rows are formatted a chunk at a time.
+    Coordinates and real attributes are written with 17 significant digits
+    so they are read back exactly.
+
+    :arg filename: Name of AVS file
+    :type filename: str
+    :arg coords: Node coordinates
+    :type coords: ndarray(nnodes,3)
+    :arg itet: 1-based node numbers of all elements, none if None
+    :type itet: ndarray(int)
+    :arg itetoff: Offset of each element in itet
+    :type itetoff: ndarray(int)
+    :arg itettyp: LaGriT element type codes
+    :type itettyp: ndarray(int)
+    :arg itetclr: Element materials, 1 if None
+    :type itetclr: ndarray(int)
+    :arg node_attributes: Node attribute arrays keyed by name, integer
+                          arrays are written as integer attributes
+    :type node_attributes: OrderedDict
+    :arg element_attributes: Element attribute arrays keyed by name
+    :type element_attributes: OrderedDict
+    :arg chunksize: Number of rows formatted at a time
+    :type chunksize: int
+
+    Example:
+        >>> from pylagrit.io import read_avs, write_avs
+        >>> mesh = read_avs('test.inp')
+        >>> keep = mesh['coords'][:,2] > 0.
+        >>> write_avs('top_points.inp', mesh['coords'][keep],
+        >>>           node_attributes={'imt1': mesh['node_attributes']['imt1'][keep]})
+    """
+    coords = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 3)
+    nnodes = len(coords)
+    if itet is None:
+        itet = numpy.zeros(0, dtype=numpy.int64)
+        itetoff = itettyp = numpy.zeros(0, dtype=numpy.int64)
+    itet = numpy.asarray(itet, dtype=numpy.int64)
+    itettyp = numpy.asarray(itettyp, dtype=numpy.int64)
+    nelems = len(itettyp)
+    if itetclr is None:
+        itetclr = numpy.ones(nelems, dtype=numpy.int64)
+    node_attributes = OrderedDict() if node_attributes is None else node_attributes
+    element_attributes = (
+        OrderedDict() if element_attributes is None else element_attributes
+    )
+    with open(filename, "w") as fh:
+        fh.write(
+            "%10d %10d %10d %10d %10d\n"
+            % (nnodes, nelems, len(node_attributes), len(element_attributes), 0)
+        )
+        for i in range(0, nnodes, chunksize):
+            c = coords[i : i + chunksize]
+            ids = numpy.arange(i + 1, i + len(c) + 1)
+            fh.write(
+                _format_rows("%d %.17g %.17g %.17g", [ids, c[:, 0], c[:, 1], c[:, 2]])
+            )
+        names = {v: k for k, v in ELEMENT_TYPES.items()}
+        for i in range(0, nelems, chunksize):
+            j = min(i + chunksize, nelems)
+            rows = numpy.empty(j - i, dtype=object)
+            for ityp in numpy.unique(itettyp[i:j]):
+                sel = numpy.flatnonzero(itettyp[i:j] == ityp) + i
+                nen = NODES_PER_ELEMENT[ityp]
+                # Inverse of AVS_TO_LAGRIT_ORDER
+                conn = numpy.empty((len(sel), nen), dtype=numpy.int64)
+                conn[:, AVS_TO_LAGRIT_ORDER[ityp]] = itet[
+                    numpy.asarray(itetoff)[sel][:, None] + numpy.arange(nen)
+                ]
+                fmt = "%d %d " + names[ityp] + " %d" * nen
+                columns = [sel + 1, numpy.asarray(itetclr)[sel]] + list(conn.T)
+                rows[sel - i] = _format_rows(fmt, columns).split("\n")[:-1]
+            fh.write("\n".join(rows) + "\n")
+        for atts, n in [(node_attributes, nnodes), (element_attributes, nelems)]:
+            if len(atts) == 0:
+                continue
+            values = [numpy.asarray(v).reshape(n, -1) for v in atts.values()]
+            fh.write(
+                "%05d" % len(atts) + "".join(["  %d" % v.shape[1] for v in values])
+            )
+            fh.write("\n")
+            fmt = "%d"
+            for name, v in zip(atts, values):
+                integer = v.dtype.kind in "iub"
+                fh.write(name + (", integer \n" if integer else ", real \n"))
+                fmt += (" %d" if integer else " %.17g") * v.shape[1]
+            for i in range(0, n, chunksize):
+                columns = [numpy.arange(i + 1, min(i + chunksize, n) + 1)]
+                for v in values:
+                    columns.extend(v[i : i + chunksize].T)
+                fh.write(_format_rows(fmt, columns))
+
+
+def write_avs_element_attributes(filename, element_attributes):
+    """
+    Write element attributes in the layout of dump/avs2/filename/mo/0 0 0 2
+
+    This is the layout of the faceset files written by
+    EltSet.create_faceset: a header, the attribute names and types and one
+    row of attribute values per element without the element number. Column
+    widths follow dumpavs.f so the file matches one written by LaGriT.
+
+    :arg filename: Name of file
+    :type filename: str
+    :arg element_attributes: Element attribute arrays keyed by name, integer
+                             arrays are written as integer attributes
+    :type element_attributes: OrderedDict
+    """
+    names = list(element_attributes.keys())
+    values = [numpy.asarray(element_attributes[k]) for k in names]
+    nelems = len(values[0]) if values else 0
+    ranks = [1 if v.ndim == 1 else v.shape[1] for v in values]
+    lines = ["%10d %10d %10d %10d %10d" % (0, 0, 0, len(names), 0)]
+    lines.append("%05d" % len(names) + "".join([" %2d" % r for r in ranks]))
+    columns = []
+    for name, v, r in zip(names, values, ranks):
+        v = v.reshape(nelems, r)
+        if v.dtype.kind in "iu":
+            lines.append(name + ", integer ")
+            # Width from the largest magnitude, as n_int_i in dumpavs.f
+            vmax = int(numpy.abs(v).max()) if nelems else 0
+            width = max(
+                3, int(numpy.floor(numpy.log10(numpy.float32(vmax + 1)) + 0.5)) + 3
+            )
+            columns.extend(
+                [("%" + str(width) + "d", v[:, k].tolist()) for k in range(r)]
+            )
+        else:
+            lines.append(name + ", real ")
+            columns.extend(
+                [("%s", [_fortran_e(x) for x in v[:, k].tolist()]) for k in range(r)]
+            )
+    fmt = "".join([c[0] for c in columns])
+    rows = zip(*[c[1] for c in columns])
+    with open(filename, "w") as fh:
+        fh.write("\n".join(lines) + "\n")
+        if nelems and columns:
+            fh.write(((fmt + "\n") * nelems) % tuple(chain.from_iterable(rows)))
+
+
+def read_avs_element_attributes(filename):
+    """
+    Read element attributes written by dump/avs2/filename/mo/0 0 0 2
+
+    :arg filename: Name of file
+    :type filename: str
+    :returns: OrderedDict of element attribute arrays keyed by name
+    """
+    with open_compressed(filename, "rb") as fh:
+        reader = LineReader(fh)
+        if _read_header(reader)[3] == 0:
+            return OrderedDict()
+        names, ranks, types = _read_attribute_header(reader)
+        values = to_float(reader.read())
+    return _attribute_arrays(values.reshape(-1, sum(ranks)), names, ranks, types)
+
+
+def _fortran_e(x, width=20, ndec=12):
+    # Fortran Ew.d edit descriptor: 0.ddddE+xx, exponent letter dropped
+    # for three digit exponents
+    if x == 0.0:
+        mantissa, exponent = "0." + "0" * ndec, 0
+    else:
+        digits, exponent = ("%.*e" % (ndec - 1, abs(x))).split("e")
+        mantissa = "0." + digits.replace(".", "")
+        exponent = int(exponent) + 1
+        if x < 0:
+            mantissa = "-" + mantissa
+    if abs(exponent) > 99:
+        return ("%s%+04d" % (mantissa, exponent)).rjust(width)
+    return ("%sE%+03d" % (mantissa, exponent)).rjust(width)
+
+
+def _format_rows(fmt, columns):
+    # One line per row of the columns, formatted in a single operation
+    columns = [numpy.asarray(c).tolist() for c in columns]
+    if len(columns[0]) == 0:
+        return ""
+    return ((fmt + "\n") * len(columns[0])) % tuple(chain.from_iterable(zip(*columns)))
+
+
+def _tasks(filename, reader, by_range, chunksize, nnodes, nelems, nnatts, neatts):
+    # Cut each section into chunks of rows as the file is scanned
+    sections = [("coords", nnodes, False), ("elements", nelems, False)]
+    if nnatts > 0:
+        sections.append(("node_attributes", nnodes, True))
+    if neatts > 0:
+        sections.append(("element_attributes", nelems, True))
+    for section, nrows, has_header in sections:
+        if nrows == 0:
+            continue
+        header = None
+        lines_per_row = 1
+        if has_header:
+            header = _read_attribute_header(reader)
+            lines_per_row = _lines_per_row(reader.peek(), sum(header[1]))
+        for start in range(0, nrows, chunksize):
+            n = min(chunksize, nrows - start)
+            offset, data = reader.take(n * lines_per_row, keep=not by_range)
+            if by_range:
+                data = (filename, offset, reader.tell() - offset)
+            yield section, start, n, header, data
+
+
+def _submit(pool, task):
+    if pool is not None:
+        return pool.submit(_parse, *task)
+    future = Future()
+    future.set_result(_parse(*task))
+    return future
+
+
+def _parse(section, start, nrows, header, data):
+    if isinstance(data, tuple):
+        filename, offset, length = data
+        with open(filename, "rb") as fh:
+            fh.seek(offset)
+            data = fh.read(length)
+    if section == "coords":
+        return to_float(data).reshape(nrows, -1)[:, -3:]
+    if section == "elements":
+        return _parse_elements(data, nrows)
+    return _parse_attributes(data, nrows, *header)
+
+
+def _parse_elements(data, nelems):
+    # Element type names become negative type codes, which mark the
+    # boundary between the material id and the connectivity of each element
+    for name, ityp in ELEMENT_TYPES.items():
+        name = name.encode("ascii")
+        if name in data:
+            data = data.replace(name, b"-%d" % ityp)
+    try:
+        words = from_string(data, numpy.int64)
+    except ValueError:
+        raise ValueError("Unknown AVS element type in: " + data[:200].decode("ascii"))
+    ityp = numpy.flatnonzero(words < 0)
+    if len(ityp) != nelems:
+        raise ValueError("Expected %d elements, found %d" % (nelems, len(ityp)))
+    itettyp = (-words[ityp]).astype(numpy.int8)
+    nen = NODES_PER_ELEMENT[itettyp]
+    itetoff = numpy.cumsum(nen) - nen
+    local = numpy.arange(nen.sum()) - numpy.repeat(itetoff, nen)
+    conn = numpy.repeat(ityp + 1, nen) + _ORDER[numpy.repeat(itettyp, nen), local]
+    return {
+        "itetclr": words[ityp - 1],
+        "itettyp": itettyp,
+        "itetoff": itetoff,
+        "itet": words[conn],
+    }
+
+
+def _parse_attributes(data, nrows, names, ranks, types):
+    # Leading column, if any, is the node or element number. Integer
+    # attributes are parsed as reals since dump/avs writes them that way.
+    values = to_float(data).reshape(nrows, -1)[:, -sum(ranks) :]
+    return _attribute_arrays(values, names, ranks, types)
+
+
+def _attribute_arrays(values, names, ranks, types):
+    atts = OrderedDict()
+    icol = 0
+    for name, r, vtype in zip(names, ranks, types):
+        v = values[:, icol] if r == 1 else values[:, icol : icol + r]
+        if vtype == "integer":
+            v = v.astype(numpy.int64)
+        else:
+            v = numpy.ascontiguousarray(v)
+        atts[name] = v
+        icol += r
+    return atts
+
+
+def _read_header(reader):
+    # Header may start with '#' when written with io_format 3 or 4
+    vs = reader.take(1)[1].replace(b"#", b" ").split()
+    return [int(v) for v in vs[:4]]
+
+
+def _read_attribute_header(reader):
+    vs = reader.take(1)[1].replace(b"#", b" ").split()
+    ranks = [int(v) for v in vs[1 : int(vs[0]) + 1]]
+    names = []
+    types = []
+    for r in ranks:
+        ln = reader.take(1)[1].decode("ascii").lstrip("# ")
+        name, vtype = ln.split(",")[:2]
+        names.append(name.strip())
+        types.append(vtype.strip())
+    return names, ranks, types
+
+
+def _lines_per_row(line, nvalues):
+    # dump/avs continues rows of more than 100 values on further lines
+    if len(line.split()) >= nvalues:
+        return 1
+    return -(-nvalues // _MAX_COLUMNS)
+
+
+def _concatenate(arrays, empty):
+    if len(arrays) == 0:
+        return empty
+    if len(arrays) == 1:
+        return arrays[0]
+    return numpy.concatenate(arrays)
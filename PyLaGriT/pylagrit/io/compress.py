@@ -0,0 +1,207 @@
+"""
+Streaming compression of files written and read by LaGriT
+
+LaGriT splits commands on '/', so every file it reads or writes must be
+named relative to the working directory. Single file formats that are
+written sequentially go to a named pipe in the working directory and are
+compressed by a background thread as they arrive. Formats that write
+several files are staged under a temporary root name and compressed
+afterwards. LaGriT readers seek, so compressed input is decompressed into
+memory backed storage and read through a symbolic link.
+"""
+
+import io
+import os
+import gzip
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+COMPRESSED_EXTENSIONS = {".gz": "gz", ".zst": "zst"}
+
+# dump formats (and file extensions when no format is given) that are
+# written as a single sequential file, opened once, suitable for a named
+# pipe. LaGriT dumps are opened twice, so they are staged.
+STREAM_FORMATS = ["avs", "avs2", "gmv", "tecplot"]
+STREAM_EXTENSIONS = [".inp", ".avs", ".gmv", ".plt"]
+
+# LaGriT truncates command tokens to 32 characters
+_MAX_TOKEN = 32
+_CHUNK_SIZE = 2 ** 20
+
+
+def open_compressed(filename, mode="rb", compress=None):
+    """
+    Open a file, transparently (de)compressing gz and zst files
+
+    :arg filename: Name of file
+    :type filename: str
+    :arg mode: File mode, as for open
+    :type mode: str
+    :arg compress: 'gz' or 'zst', detected from the file extension if None
+    :type compress: str
+    :returns: file object
+    """
+    if compress is None:
+        compress = COMPRESSED_EXTENSIONS.get(os.path.splitext(filename)[1])
+    if compress is None:
+        return open(filename, mode)
+    if compress == "gz":
+        return gzip.open(filename, mode, compresslevel=6)
+    if compress == "zst":
+        zstandard = _import_zstandard()
+        fh = open(filename, mode.replace("t", "").replace("b", "") + "b")
+        if "r" in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(fh, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(fh, closefd=True)
+        if "b" not in mode:
+            stream = io.TextIOWrapper(stream)
+        return stream
+    raise ValueError("compress must be 'gz' or 'zst'")
+
+
+@contextmanager
+def compressed_output(filename, format=None, compress="gz"):
+    """
+    Context manager yielding a file name for LaGriT to write to
+
+    Everything LaGriT writes to the yielded name is compressed into
+    filename + '.gz' (or '.zst'). Multi-file formats (fehm, stor, ...) use
+    filename as a root name and every file they produce is compressed.
+
+    :arg filename: Name (or root name) of output file, without compression suffix
+    :type filename: str
+    :arg format: LaGriT dump format
+    :type format: str
+    :arg compress: 'gz' or 'zst'
+    :type compress: str
+    """
+    if compress not in COMPRESSED_EXTENSIONS.values():
+        raise ValueError("compress must be 'gz' or 'zst'")
+    if compress == "zst":
+        _import_zstandard()
+    if format == "tecplot" and not filename.endswith(".plt"):
+        # As LaGriT names tecplot files
+        filename += ".plt"
+    ext = os.path.splitext(filename)[1]
+    if format in STREAM_FORMATS or (format is None and ext in STREAM_EXTENSIONS):
+        with _fifo_output(filename, compress) as fifo:
+            yield fifo
+    else:
+        # Keep the extension LaGriT detects the format from
+        with _staged_output(
+            filename, compress, ext if format is None else ""
+        ) as staged:
+            yield staged
+
+
+@contextmanager
+def decompressed(filename):
+    """
+    Context manager yielding the name of a decompressed copy of filename
+
+    The copy is made in a memory backed temporary directory when one is
+    available and linked into the working directory. Both are removed on exit.
+
+    :arg filename: Name of gz or zst compressed file
+    :type filename: str
+    """
+    tmpdir = tempfile.mkdtemp(
+        prefix="lg", dir="/dev/shm" if os.path.isdir("/dev/shm") else None
+    )
+    link = _temp_name(os.path.splitext(os.path.splitext(filename)[0])[1])
+    try:
+        fname = os.path.join(tmpdir, "f")
+        with open_compressed(filename, "rb") as fin:
+            with open(fname, "wb") as fout:
+                shutil.copyfileobj(fin, fout, _CHUNK_SIZE)
+        os.symlink(fname, link)
+        yield link
+    finally:
+        # Also remove scratch files some readers create next to the input
+        for f in os.listdir("."):
+            if f.startswith(link):
+                os.remove(f)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def _fifo_output(filename, compress):
+    fifo = _temp_name(os.path.splitext(filename)[1])
+    target = filename + "." + compress
+    os.mkfifo(fifo)
+    try:
+        # Both ends are opened here, before LaGriT runs, so its open never
+        # blocks, and the held writer keeps the reader from seeing the end of
+        # the file until LaGriT is done, however often it opens the pipe
+        fin = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        hold = os.open(fifo, os.O_WRONLY)
+        os.set_blocking(fin, True)
+        thread = threading.Thread(target=_pump, args=(fin, target, compress))
+        thread.daemon = True
+        thread.start()
+        try:
+            yield fifo
+        except BaseException:
+            os.close(hold)
+            thread.join()
+            if os.path.exists(target):
+                os.remove(target)
+            raise
+        os.close(hold)
+        thread.join()
+    finally:
+        os.remove(fifo)
+
+
+def _pump(fd, target, compress):
+    with os.fdopen(fd, "rb") as fin:
+        with open_compressed(target, "wb", compress=compress) as fout:
+            shutil.copyfileobj(fin, fout, _CHUNK_SIZE)
+
+
+@contextmanager
+def _staged_output(filename, compress, ext=""):
+    root = _temp_name(ext)
+    staged = []
+    try:
+        yield root
+        staged = [f for f in os.listdir(".") if f.startswith(root)]
+        threads = []
+        for f in staged:
+            # Restore the requested root name on each file written
+            dst = filename + f[len(root) :] + "." + compress
+            threads.append(
+                threading.Thread(target=_compress_file, args=(f, dst, compress))
+            )
+            threads[-1].start()
+        for t in threads:
+            t.join()
+    finally:
+        for f in staged or [f for f in os.listdir(".") if f.startswith(root)]:
+            os.remove(f)
+
+
+def _compress_file(src, dst, compress):
+    with open(src, "rb") as fin:
+        with open_compressed(dst, "wb", compress=compress) as fout:
+            shutil.copyfileobj(fin, fout, _CHUNK_SIZE)
+
+
+def _temp_name(ext):
+    # Hidden, unique name in the working directory
+    name = "._lg" + uuid.uuid4().hex[:12] + ext
+    if len(name) > _MAX_TOKEN:
+        raise ValueError("File extension too long for LaGriT: " + ext)
+    return name
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zst compression requires the zstandard package")
+    return zstandard
@@ -0,0 +1,159 @@
+"""
+Readers for ESRI ASCII grids and raw float32 DEMs
+
+An ESRI ASCII grid starts with keyword value lines
+
+    ncols <nx>
+    nrows <ny>
+    xllcorner <x>    (or xllcenter)
+    yllcorner <y>    (or yllcenter)
+    cellsize <d>     (or dx and dy)
+    NODATA_value <v> (optional)
+
+followed by nrows rows of ncols values, the first row at the top (largest
+y). A binary grid (.flt) holds the same values as raw float32, with the
+header in a separate .hdr file that may also give the BYTEORDER (LSBFIRST
+or MSBFIRST). Rasters are read a block of rows at a time so that grids
+larger than memory can be streamed.
+"""
+
+import os
+import numpy
+from collections import OrderedDict
+from pylagrit.io._text import LineReader, to_float
+from pylagrit.io.compress import open_compressed
+
+_KEYS = [
+    "ncols",
+    "nrows",
+    "xllcorner",
+    "xllcenter",
+    "yllcorner",
+    "yllcenter",
+    "cellsize",
+    "dx",
+    "dy",
+    "nodata_value",
+    "nodata",
+    "byteorder",
+]
+
+
+def read_dem_header(filename):
+    """
+    Read the header of an ESRI ASCII grid or of the .hdr file of a binary grid
+
+    Returns an OrderedDict with 'ncols', 'nrows', the center 'x' and 'y' of
+    the lower left cell, the cell sizes 'dx' and 'dy', 'nodata' (None if
+    not given), 'byteorder' ('<' or '>') and the number of header 'lines'.
+
+    :arg filename: Name of grid or header file, may be gz or zst compressed
+    :type filename: str
+    :returns: OrderedDict
+
+    Example:
+        >>> from pylagrit.io import read_dem_header
+        >>> header = read_dem_header('dem.asc')
+        >>> print(header['ncols'], header['nrows'], header['nodata'])
+    """
+    values = OrderedDict()
+    lines = 0
+    with open_compressed(filename, "rt") as fh:
+        for line in fh:
+            words = line.split()
+            if not words or words[0].lower() not in _KEYS:
+                break
+            values[words[0].lower()] = words[1]
+            lines += 1
+    return _dem_header(values, lines)
+
+
+def iter_dem(filename, header=None, block_rows=256):
+    """
+    Generator over blocks of rows of an ESRI ASCII or raw float32 grid
+
+    Blocks are yielded from the top of the raster down as (row, values)
+    tuples, where row is the index of the first row in the block and values
+    is a float64 array of block_rows (fewer for the last block) by ncols.
+
+    :arg filename: Name of ESRI ASCII grid, or of raw float32 grid if header is given
+                   or filename ends with .flt and a .hdr file exists
+    :type filename: str
+    :arg header: Header of a raw float32 grid, as the name of its .hdr file or
+                 as a dict of header keywords (e.g. ncols, nrows, cellsize)
+    :type header: str or dict
+    :arg block_rows: Number of rows per block
+    :type block_rows: int
+
+    Example:
+        >>> from pylagrit.io import iter_dem
+        >>> zmax = max(block.max() for row, block in iter_dem('dem.asc'))
+    """
+    header, binary = _find_header(filename, header)
+    ncols, nrows = header["ncols"], header["nrows"]
+    if binary:
+        dtype = numpy.dtype(header["byteorder"] + "f4")
+        with open(filename, "rb") as fh:
+            for row in range(0, nrows, block_rows):
+                n = min(block_rows, nrows - row)
+                values = numpy.fromfile(fh, dtype, n * ncols)
+                if values.size < n * ncols:
+                    raise ValueError("Unexpected end of grid in " + filename)
+                yield row, values.reshape(n, ncols).astype(numpy.float64)
+        return
+    with open_compressed(filename, "rb") as fh:
+        reader = LineReader(fh)
+        reader.take(header["lines"], keep=False)
+        rest = numpy.zeros(0)
+        for row in range(0, nrows, block_rows):
+            n = min(block_rows, nrows - row)
+            parts = [rest]
+            count = rest.size
+            # Rows usually take one line each, but may wrap
+            while count < n * ncols:
+                lines = max(1, (n * ncols - count) // ncols)
+                try:
+                    data = reader.take(lines)[1]
+                except ValueError:
+                    raise ValueError("Unexpected end of grid in " + filename)
+                parts.append(to_float(data))
+                count += parts[-1].size
+            values = numpy.concatenate(parts)
+            rest = values[n * ncols :]
+            yield row, values[: n * ncols].reshape(n, ncols)
+
+
+def _find_header(filename, header):
+    # Header dict of a grid, and whether the grid is raw float32
+    if header is None:
+        hdr = os.path.splitext(filename)[0] + ".hdr"
+        if filename.lower().endswith(".flt") and os.path.exists(hdr):
+            header = hdr
+        else:
+            return read_dem_header(filename), False
+    if isinstance(header, dict):
+        values = OrderedDict((k.lower(), str(v)) for k, v in header.items())
+        return _dem_header(values, 0), True
+    return read_dem_header(header), True
+
+
+def _dem_header(values, lines):
+    header = OrderedDict()
+    header["ncols"] = int(values["ncols"])
+    header["nrows"] = int(values["nrows"])
+    size = float(values.get("cellsize", 0))
+    header["dx"] = float(values.get("dx", size))
+    header["dy"] = float(values.get("dy", size))
+    if header["dx"] <= 0 or header["dy"] <= 0:
+        raise ValueError("Grid header has no cell size")
+    for k, d in [("x", "dx"), ("y", "dy")]:
+        if k + "llcenter" in values:
+            header[k] = float(values[k + "llcenter"])
+        else:
+            header[k] = float(values.get(k + "llcorner", 0)) + 0.5 * header[d]
+    nodata = values.get("nodata_value", values.get("nodata"))
+    header["nodata"] = None if nodata is None else float(nodata)
+    msb = values.get("byteorder", "lsbfirst").lower().startswith("msb")
+    header["byteorder"] = ">" if msb else "<"
+    header["lines"] = lines
+    return header
@@ -0,0 +1,349 @@
+"""
+Writer for Exodus II files in netCDF-3 64-bit offset format
+
+The netCDF header is assembled in memory and every variable is written
+with a single contiguous big-endian write, so no netCDF or Exodus library
+is needed.
+"""
+
+import numpy
+from collections import OrderedDict
+from pylagrit.io.avs import NODES_PER_ELEMENT
+
+# Exodus element type names, as written by LaGriT, and Exodus side numbers
+# of each LaGriT local face, indexed by LaGriT element type code, from
+# lag2exo_fmap in src/dumpexodusII.f. Its pyramid sides are all zero, so
+# side sets of pyramids are rejected.
+EXODUS_ELEMENT_TYPES = [
+    None,
+    "SPHERE",
+    "BEAM",
+    "TRI3",
+    "QUAD",
+    "TETRA",
+    "PYRAMID",
+    "WEDGE",
+    "HEX",
+]
+LAGRIT_TO_EXODUS_SIDES = [
+    [],
+    [1],
+    [1, 2],
+    [2, 3, 1],
+    [1, 2, 3, 4],
+    [2, 3, 1, 4],
+    [],
+    [4, 5, 1, 2, 3],
+    [5, 6, 1, 2, 3, 4],
+]
+
+EXODUS_API_VERSION = 5.22
+# Names are limited to 32 characters plus a terminating null
+_LEN_NAME = 33
+
+_NC_DIMENSION = 10
+_NC_VARIABLE = 11
+_NC_ATTRIBUTE = 12
+_NC_TYPES = {"S1": 2, ">i4": 4, ">f4": 5, ">f8": 6}
+
+
+def write_exodus(
+    filename,
+    coords,
+    itet,
+    itetoff,
+    itettyp,
+    itetclr=None,
+    node_sets=None,
+    side_sets=None,
+    element_sets=None,
+    node_set_names=None,
+    side_set_names=None,
+    element_set_names=None,
+    block_names=None,
+    title="PyLaGriT",
+    num_dim=None,
+):
+    """
+    Write Exodus II file
+
+    Elements are grouped into one element block per material, numbered by
+    material, as LaGriT's dump/exo does. Element numbers of side sets refer
+    to the elements as given and are renumbered to the block ordering.
+
+    :arg filename: Name of Exodus file
+    :type filename: str
+    :arg coords: Node coordinates
+    :type coords: ndarray(float), nnodes by 3
+    :arg itet: Element connectivity, 1-based node numbers in LaGriT node order
+    :type itet: ndarray(int)
+    :arg itetoff: Offset of each element's first node in itet
+    :type itetoff: ndarray(int)
+    :arg itettyp: LaGriT element type code of each element
+    :type itettyp: ndarray(int)
+    :arg itetclr: Material of each element, all 1 if None
+    :type itetclr: ndarray(int)
+    :arg node_sets: 1-based node numbers keyed by node set id
+    :type node_sets: dict
+    :arg side_sets: Tuples of 1-based element numbers and LaGriT local face
+                    numbers (idelem1 and idface1 of a faceset) keyed by side set id,
+                    of elements other than pyramids
+    :type side_sets: dict
+    :arg element_sets: 1-based element numbers keyed by element set id
+    :type element_sets: dict
+    :arg node_set_names: Node set names keyed by node set id
+    :type node_set_names: dict
+    :arg side_set_names: Side set names keyed by side set id
+    :type side_set_names: dict
+    :arg element_set_names: Element set names keyed by element set id
+    :type element_set_names: dict
+    :arg block_names: Element block names keyed by material
+    :type block_names: dict
+    :arg title: Title of the database
+    :type title: str
+    :arg num_dim: Number of spatial dimensions, the columns of coords if None
+    :type num_dim: int
+
+    Example:
+        >>> from pylagrit.io import read_avs, read_avs_element_attributes, write_exodus
+        >>> m = read_avs('test.inp')
+        >>> fs = read_avs_element_attributes('faceset_top.avs')
+        >>> write_exodus('test.exo', m['coords'], m['itet'], m['itetoff'],
+        >>>              m['itettyp'], m['itetclr'],
+        >>>              side_sets={1: (fs['idelem1'], fs['idface1'])},
+        >>>              side_set_names={1: 'top'})
+    """
+    node_sets = {} if node_sets is None else node_sets
+    side_sets = {} if side_sets is None else side_sets
+    element_sets = {} if element_sets is None else element_sets
+    node_set_names = {} if node_set_names is None else node_set_names
+    side_set_names = {} if side_set_names is None else side_set_names
+    element_set_names = {} if element_set_names is None else element_set_names
+    block_names = {} if block_names is None else block_names
+    coords = numpy.asarray(coords, dtype=numpy.float64)
+    itet = numpy.asarray(itet, dtype=numpy.int64)
+    itetoff = numpy.asarray(itetoff, dtype=numpy.int64)
+    itettyp = numpy.asarray(itettyp, dtype=numpy.int64)
+    nelems = itettyp.shape[0]
+    if itetclr is None:
+        itetclr = numpy.ones(nelems, dtype=numpy.int64)
+    itetclr = numpy.asarray(itetclr, dtype=numpy.int64)
+    if num_dim is None:
+        num_dim = coords.shape[1]
+
+    # Stable sort of elements by material gives the Exodus element order
+    order = numpy.argsort(itetclr, kind="stable")
+    elem_map = numpy.empty(nelems, dtype=numpy.int64)
+    elem_map[order] = numpy.arange(1, nelems + 1)
+    materials, starts = numpy.unique(itetclr[order], return_index=True)
+    bounds = numpy.append(starts, nelems)
+
+    dims = OrderedDict(
+        [
+            ("len_string", _LEN_NAME),
+            ("len_line", 81),
+            ("four", 4),
+            ("len_name", _LEN_NAME),
+            ("time_step", 0),
+            ("num_dim", num_dim),
+            ("num_nodes", coords.shape[0]),
+            ("num_elem", nelems),
+            ("num_el_blk", len(materials)),
+        ]
+    )
+    sets = [
+        ("ns", "num_node_sets", node_sets, node_set_names),
+        ("ss", "num_side_sets", side_sets, side_set_names),
+        ("els", "num_elem_sets", element_sets, element_set_names),
+    ]
+    for _, dim, members, _ in sets:
+        if len(members):
+            dims[dim] = len(members)
+
+    variables = [
+        ("time_whole", ["time_step"], numpy.zeros(0, dtype=">f8"), {}),
+        ("eb_status", ["num_el_blk"], numpy.ones(len(materials), dtype=int), {}),
+        ("eb_prop1", ["num_el_blk"], materials, {"name": "ID"}),
+    ]
+    for prefix, dim, members, _ in sets:
+        if len(members):
+            ids = numpy.array(list(members.keys()))
+            status = numpy.ones(len(ids), dtype=int)
+            variables.append((prefix + "_status", [dim], status, {}))
+            variables.append((prefix + "_prop1", [dim], ids, {"name": "ID"}))
+    for i, c in enumerate("xyz"[:num_dim]):
+        variables.append(("coord" + c, ["num_nodes"], coords[:, i], {}))
+    variables.append(
+        ("eb_names", ["num_el_blk", "len_name"], _names(block_names, materials), {})
+    )
+    for prefix, dim, members, names in sets:
+        if len(members):
+            names = _names(names, members.keys())
+            variables.append((prefix + "_names", [dim, "len_name"], names, {}))
+    variables.append(
+        (
+            "coor_names",
+            ["num_dim", "len_name"],
+            _names(dict(zip("XYZ", "XYZ")), "XYZ"[:num_dim]),
+            {},
+        )
+    )
+
+    for i, mat in enumerate(materials):
+        blk = order[bounds[i] : bounds[i + 1]]
+        ityp = numpy.unique(itettyp[blk])
+        if len(ityp) > 1:
+            raise ValueError("Material %d has more than one element type" % mat)
+        ityp = int(ityp[0])
+        nen = NODES_PER_ELEMENT[ityp]
+        connect = itet[itetoff[blk][:, None] + numpy.arange(nen)]
+        n = str(i + 1)
+        dims["num_el_in_blk" + n] = len(blk)
+        dims["num_nod_per_el" + n] = nen
+        variables.append(
+            (
+                "connect" + n,
+                ["num_el_in_blk" + n, "num_nod_per_el" + n],
+                connect,
+                {"elem_type": EXODUS_ELEMENT_TYPES[ityp]},
+            )
+        )
+
+    for i, nodes in enumerate(node_sets.values()):
+        n = str(i + 1)
+        nodes = numpy.asarray(nodes).ravel()
+        dims["num_nod_ns" + n] = len(nodes)
+        variables.append(("node_ns" + n, ["num_nod_ns" + n], nodes, {}))
+
+    sides = _side_table()
+    for i, (elems, faces) in enumerate(side_sets.values()):
+        n = str(i + 1)
+        elems = numpy.asarray(elems, dtype=numpy.int64).ravel()
+        faces = numpy.asarray(faces, dtype=numpy.int64).ravel()
+        if len(faces) and (faces.min() < 1 or faces.max() >= sides.shape[1]):
+            raise ValueError("Invalid local face number in side set " + n)
+        if numpy.any(itettyp[elems - 1] == 6):
+            raise ValueError("Pyramid faces have no Exodus sides, in side set " + n)
+        exo_sides = sides[itettyp[elems - 1], faces]
+        if numpy.any(exo_sides == 0):
+            raise ValueError("Invalid local face number in side set " + n)
+        dims["num_side_ss" + n] = len(elems)
+        variables.append(("elem_ss" + n, ["num_side_ss" + n], elem_map[elems - 1], {}))
+        variables.append(("side_ss" + n, ["num_side_ss" + n], exo_sides, {}))
+
+    for i, elems in enumerate(element_sets.values()):
+        n = str(i + 1)
+        elems = numpy.asarray(elems, dtype=numpy.int64).ravel()
+        dims["num_ele_els" + n] = len(elems)
+        variables.append(("elem_els" + n, ["num_ele_els" + n], elem_map[elems - 1], {}))
+
+    attributes = OrderedDict(
+        [
+            ("api_version", numpy.array([EXODUS_API_VERSION], dtype=">f4")),
+            ("version", numpy.array([EXODUS_API_VERSION], dtype=">f4")),
+            ("floating_point_word_size", numpy.array([8], dtype=">i4")),
+            ("file_size", numpy.array([1], dtype=">i4")),
+            ("maximum_name_length", numpy.array([_LEN_NAME - 1], dtype=">i4")),
+            ("int64_status", numpy.array([0], dtype=">i4")),
+            ("title", title[:80]),
+        ]
+    )
+    _write_netcdf(filename, dims, attributes, variables)
+
+
+def _names(names, keys):
+    # Fixed length, null padded name table
+    table = numpy.zeros((len(keys), _LEN_NAME), dtype="S1")
+    for i, k in enumerate(keys):
+        name = str(names.get(k, ""))
+        name = numpy.frombuffer(name.encode()[: _LEN_NAME - 1], dtype="S1")
+        table[i, : len(name)] = name
+    return table
+
+
+def _side_table():
+    # Exodus side number of each (LaGriT element type, LaGriT local face)
+    table = numpy.zeros((len(LAGRIT_TO_EXODUS_SIDES), 7), dtype=numpy.int64)
+    for ityp, sides in enumerate(LAGRIT_TO_EXODUS_SIDES):
+        table[ityp, 1 : len(sides) + 1] = sides
+    return table
+
+
+def _write_netcdf(filename, dims, attributes, variables):
+    # netCDF-3 64-bit offset file: header, then each fixed size variable in
+    # order. The single record variable (time_whole) has no records.
+    dim_ids = dict([(k, i) for i, k in enumerate(dims.keys())])
+    # Values are converted to big-endian one variable at a time as written
+    data = [numpy.asarray(v[2]) for v in variables]
+    dtypes = [_nc_dtype(v) for v in data]
+    nbytes = [v.size * dt.itemsize for v, dt in zip(data, dtypes)]
+
+    def header(offsets):
+        h = [b"CDF\x02", _int(0)]
+        h.append(_int(_NC_DIMENSION) + _int(len(dims)))
+        for k, v in dims.items():
+            h.append(_name(k) + _int(v))
+        h.append(_attribute_list(attributes))
+        h.append(_int(_NC_VARIABLE) + _int(len(variables)))
+        for i, (name, vdims, _, atts) in enumerate(variables):
+            h.append(_name(name) + _int(len(vdims)))
+            h.append(b"".join([_int(dim_ids[d]) for d in vdims]))
+            h.append(_attribute_list(atts))
+            vsize = _padded(nbytes[i] if "time_step" not in vdims else 8)
+            h.append(_int(_NC_TYPES[dtypes[i].str.lstrip("|")]))
+            h.append(_int(min(vsize, 2 ** 32 - 1)))
+            h.append(numpy.array([offsets[i]], dtype=">i8").tobytes())
+        return b"".join(h)
+
+    # Fixed size variables follow the header, record variables come last
+    offsets = [0] * len(variables)
+    begin = len(header(offsets))
+    fixed = [i for i, v in enumerate(variables) if "time_step" not in v[1]]
+    for i in fixed:
+        offsets[i] = begin
+        begin += _padded(nbytes[i])
+    for i, v in enumerate(variables):
+        if "time_step" in v[1]:
+            offsets[i] = begin
+    with open(filename, "wb") as fh:
+        fh.write(header(offsets))
+        for i in fixed:
+            values = numpy.ascontiguousarray(data[i], dtype=dtypes[i])
+            fh.write(memoryview(values.reshape(-1)).cast("B"))
+            fh.write(b"\x00" * (_padded(nbytes[i]) - nbytes[i]))
+
+
+def _nc_dtype(values):
+    # Characters, doubles and 32-bit integers
+    if values.dtype.kind == "S":
+        return numpy.dtype("S1")
+    if values.dtype.kind == "f":
+        return numpy.dtype(">f8")
+    if values.size and (values.max() > 2 ** 31 - 1 or values.min() < -(2 ** 31)):
+        raise ValueError("Integer values do not fit 32 bits")
+    return numpy.dtype(">i4")
+
+
+def _attribute_list(atts):
+    if len(atts) == 0:
+        return _int(0) + _int(0)
+    h = [_int(_NC_ATTRIBUTE) + _int(len(atts))]
+    for k, v in atts.items():
+        if isinstance(v, str):
+            v = numpy.frombuffer(v.encode(), dtype="S1")
+        h.append(_name(k) + _int(_NC_TYPES[v.dtype.str.lstrip("|")]) + _int(len(v)))
+        h.append(v.tobytes() + b"\x00" * (_padded(v.nbytes) - v.nbytes))
+    return b"".join(h)
+
+
+def _name(s):
+    s = s.encode()
+    return _int(len(s)) + s + b"\x00" * (_padded(len(s)) - len(s))
+
+
+def _int(v):
+    return numpy.array([v], dtype=">i4").tobytes()
+
+
+def _padded(n):
+    return (n + 3) // 4 * 4
@@ -0,0 +1,368 @@
+"""
+Reader, writer and transforms for PFLOTRAN unstructured explicit (.uge) files
+
+A uge file written by MO.dump_pflotran lists the Voronoi cells (id,
+centroid and volume) followed by the connections between them (ids of
+the two cells, face center and face area):
+
+    CELLS <N>
+    id x y z volume
+    ...
+    CONNECTIONS <M>
+    id_up id_dn x y z area
+    ...
+
+Files are read a chunk of lines at a time into preallocated arrays and
+written a block of lines at a time from fixed width fields formatted with
+numpy. Transforms work on the dictionary returned by read_uge and return a
+new dictionary.
+"""
+
+import numpy
+from collections import OrderedDict
+from pylagrit.io._text import LineReader, to_float
+from pylagrit.io.avs import CHUNKSIZE
+from pylagrit.io.compress import open_compressed
+
+# Fortran formats of dump_pflo_stor.f: i10 ids and 1pe20.12 reals
+_ID_WIDTH = 10
+_REAL_WIDTH = 20
+_NDEC = 12
+
+
+def read_uge(filename, chunksize=CHUNKSIZE):
+    """
+    Read a PFLOTRAN uge file into numpy arrays
+
+    Returns an OrderedDict with the cell 'ids', 'centroids' (N by 3) and
+    'volumes', and the 'connections' (M by 2 cell ids, up then down),
+    'face_centers' (M by 3) and 'areas' of the connections. Files written
+    with the area/distance column also have 'area_distance'. gz and zst
+    compressed files are decompressed as they are read.
+
+    :arg filename: Name of uge file
+    :type filename: str
+    :arg chunksize: Number of lines parsed at a time
+    :type chunksize: int
+    :returns: OrderedDict
+
+    Example:
+        >>> from pylagrit.io import read_uge
+        >>> uge = read_uge('mesh.uge')
+        >>> print(uge['volumes'].sum(), uge['areas'].min())
+    """
+    uge = OrderedDict()
+    with open_compressed(filename, "rb") as fh:
+        reader = LineReader(fh)
+        ncells = _read_count(reader, b"CELLS")
+        cells = _read_rows(reader, ncells, 5, chunksize)
+        uge["ids"] = cells[:, 0].astype(numpy.int64)
+        uge["centroids"] = cells[:, 1:4].copy()
+        uge["volumes"] = cells[:, 4].copy()
+        del cells
+        nconns = _read_count(reader, b"CONNECTIONS")
+        ncols = 6
+        if nconns > 0:
+            ncols = len(reader.peek().split())
+        conns = _read_rows(reader, nconns, ncols, chunksize)
+        uge["connections"] = conns[:, 0:2].astype(numpy.int64)
+        uge["face_centers"] = conns[:, 2:5].copy()
+        uge["areas"] = conns[:, 5].copy()
+        if ncols > 6:
+            uge["area_distance"] = conns[:, 6].copy()
+    return uge
+
+
+def write_uge(filename, uge, chunksize=CHUNKSIZE):
+    """
+    Write a PFLOTRAN uge file
+
+    Lines are formatted as LaGriT writes them (i10 ids, 1pe20.12 reals),
+    a block of chunksize lines at a time. gz and zst compressed files are
+    written when filename ends in .gz or .zst.
+
+    :arg filename: Name of uge file
+    :type filename: str
+    :arg uge: Cell and connection arrays, as returned by read_uge
+    :type uge: dict
+    :arg chunksize: Number of lines formatted at a time
+    :type chunksize: int
+
+    Example:
+        >>> from pylagrit.io import read_uge, write_uge, filter_uge
+        >>> uge = read_uge('mesh.uge')
+        >>> write_uge('mesh_nonzero.uge', filter_uge(uge, uge['areas'] > 0.))
+    """
+    ids = numpy.asarray(uge["ids"])
+    cells = [ids, uge["centroids"], uge["volumes"]]
+    conns = [uge["connections"], uge["face_centers"], uge["areas"]]
+    header = "CONNECTIONS  %10d" % len(uge["connections"])
+    if "area_distance" in uge:
+        conns.append(uge["area_distance"])
+        header += "  I J  Xm Ym Zm   Aij  Aij/dist "
+    with open_compressed(filename, "wb") as fh:
+        fh.write(("CELLS  %10d\n" % len(ids)).encode())
+        _write_rows(fh, cells, 1, chunksize)
+        fh.write((header + "\n").encode())
+        _write_rows(fh, conns, 2, chunksize)
+
+
+def filter_uge(uge, keep):
+    """
+    Keep only the selected connections
+
+    :arg uge: Cell and connection arrays, as returned by read_uge
+    :type uge: dict
+    :arg keep: Boolean mask or indices of connections to keep
+    :type keep: ndarray
+    :returns: OrderedDict
+
+    Example:
+        >>> from pylagrit.io import read_uge, filter_uge
+        >>> uge = read_uge('mesh.uge')
+        >>> uge = filter_uge(uge, numpy.abs(uge['areas']) > 1.e-12)
+    """
+    out = OrderedDict()
+    for k, v in uge.items():
+        out[k] = v[keep] if k in _CONNECTION_KEYS else v
+    return out
+
+
+def scale_uge(uge, volume=1.0, area=1.0, anisotropy=None):
+    """
+    Scale cell volumes and connection areas
+
+    With anisotropy factors (kx, ky, kz) each area is also multiplied by
+    kx*nx**2 + ky*ny**2 + kz*nz**2, where n is the unit vector between the
+    centroids of the connected cells.
+
+    :arg uge: Cell and connection arrays, as returned by read_uge
+    :type uge: dict
+    :arg volume: Factor, or factor of each cell, applied to volumes
+    :type volume: float or ndarray
+    :arg area: Factor, or factor of each connection, applied to areas
+    :type area: float or ndarray
+    :arg anisotropy: Factors in the x, y and z directions
+    :type anisotropy: tuple(float)
+    :returns: OrderedDict
+
+    Example:
+        >>> from pylagrit.io import read_uge, scale_uge
+        >>> uge = scale_uge(read_uge('mesh.uge'), anisotropy=(1., 1., 0.1))
+    """
+    out = OrderedDict(uge)
+    out["volumes"] = uge["volumes"] * volume
+    areas = uge["areas"] * area
+    if anisotropy is not None:
+        pos = _positions(uge, uge["connections"])
+        d = uge["centroids"][pos[:, 1]] - uge["centroids"][pos[:, 0]]
+        d2 = d * d
+        dist2 = d2.sum(axis=1)
+        dist2[dist2 == 0.0] = 1.0
+        areas = areas * (d2 / dist2[:, None]).dot(numpy.asarray(anisotropy, float))
+    out["areas"] = areas
+    return out
+
+
+def renumber_uge(uge, order=None, start=1):
+    """
+    Renumber cells consecutively
+
+    Cells are put in the given order and numbered from start. Connection
+    ids are updated and connections are sorted by their up then down ids.
+
+    :arg uge: Cell and connection arrays, as returned by read_uge
+    :type uge: dict
+    :arg order: Indices of cells in their new order, current order if None
+    :type order: ndarray(int)
+    :arg start: First cell id
+    :type start: int
+    :returns: OrderedDict
+
+    Example:
+        >>> from pylagrit.io import read_uge, renumber_uge
+        >>> uge = read_uge('mesh.uge')
+        >>> # Number cells from bottom to top
+        >>> uge = renumber_uge(uge, numpy.argsort(uge['centroids'][:,2], kind='stable'))
+    """
+    ncells = len(uge["ids"])
+    if order is None:
+        order = numpy.arange(ncells)
+    order = numpy.asarray(order)
+    if order.shape != (ncells,):
+        raise ValueError("order must list every cell once")
+    new_ids = numpy.empty(ncells, dtype=numpy.int64)
+    new_ids[order] = numpy.arange(start, start + ncells)
+    conns = new_ids[_positions(uge, uge["connections"])]
+    perm = numpy.lexsort((conns[:, 1], conns[:, 0]))
+    out = OrderedDict()
+    for k, v in uge.items():
+        if k == "ids":
+            out[k] = new_ids[order]
+        elif k == "connections":
+            out[k] = conns[perm]
+        elif k in _CONNECTION_KEYS:
+            out[k] = v[perm]
+        else:
+            out[k] = v[order]
+    return out
+
+
+def merge_uge_cells(uge, groups):
+    """
+    Merge groups of cells into single cells
+
+    Volumes of the cells of a group are summed and their centroids are
+    volume weighted. Connections within a group are removed and
+    connections between the same two groups are combined into one, with
+    areas summed and face centers area weighted. Merged cells are
+    numbered from 1 in order of their group labels. The area/distance
+    column, if present, is computed again from the merged centroids, and
+    is 0 for merged cells with the same centroid.
+
+    :arg uge: Cell and connection arrays, as returned by read_uge
+    :type uge: dict
+    :arg groups: Group label of each cell
+    :type groups: ndarray(int)
+    :returns: OrderedDict
+
+    Example:
+        >>> from pylagrit.io import read_uge, merge_uge_cells
+        >>> uge = read_uge('mesh.uge')
+        >>> # Merge cells in 10 m columns
+        >>> xy = numpy.floor(uge['centroids'][:,:2]/10.).astype(int)
+        >>> uge = merge_uge_cells(uge, xy[:,0]*100000 + xy[:,1])
+    """
+    groups = numpy.asarray(groups)
+    labels, cell_group = numpy.unique(groups, return_inverse=True)
+    cell_group = cell_group.ravel()
+    ngroups = len(labels)
+    volumes = numpy.bincount(cell_group, uge["volumes"], ngroups)
+    centroids = numpy.empty((ngroups, 3))
+    weights = numpy.where(volumes == 0.0, 1.0, volumes)
+    counts = numpy.bincount(cell_group, minlength=ngroups)
+    for i in range(3):
+        wsum = numpy.bincount(
+            cell_group, uge["centroids"][:, i] * uge["volumes"], ngroups
+        )
+        # Mean of the centroids for groups of zero volume
+        mean = numpy.bincount(cell_group, uge["centroids"][:, i], ngroups) / counts
+        centroids[:, i] = numpy.where(volumes == 0.0, mean, wsum / weights)
+
+    conns = cell_group[_positions(uge, uge["connections"])]
+    external = conns[:, 0] != conns[:, 1]
+    conns = conns[external]
+    areas = uge["areas"][external]
+    centers = uge["face_centers"][external]
+    # Connections between the same groups, in either direction, are combined
+    lo = numpy.minimum(conns[:, 0], conns[:, 1])
+    hi = numpy.maximum(conns[:, 0], conns[:, 1])
+    key = lo * ngroups + hi
+    perm = numpy.argsort(key, kind="stable")
+    key = key[perm]
+    first = numpy.flatnonzero(numpy.concatenate([[True], key[1:] != key[:-1]]))
+    merged_areas = numpy.add.reduceat(areas[perm], first) if len(key) else areas
+    abs_areas = numpy.abs(areas[perm])
+    asum = numpy.add.reduceat(abs_areas, first) if len(key) else abs_areas
+    merged_centers = numpy.empty((len(first), 3))
+    for i in range(3):
+        c = centers[perm, i]
+        if len(key) == 0:
+            break
+        wsum = numpy.add.reduceat(c * abs_areas, first)
+        mean = numpy.add.reduceat(c, first) / numpy.diff(numpy.append(first, len(c)))
+        merged_centers[:, i] = numpy.where(
+            asum == 0.0, mean, wsum / numpy.where(asum == 0.0, 1.0, asum)
+        )
+
+    out = OrderedDict()
+    out["ids"] = numpy.arange(1, ngroups + 1)
+    out["centroids"] = centroids
+    out["volumes"] = volumes
+    out["connections"] = numpy.column_stack([lo[perm][first], hi[perm][first]]) + 1
+    out["face_centers"] = merged_centers
+    out["areas"] = merged_areas
+    if "area_distance" in uge:
+        # Distances between the merged centroids, as LaGriT divides areas
+        pos = out["connections"] - 1
+        d = centroids[pos[:, 1]] - centroids[pos[:, 0]]
+        dist = numpy.sqrt((d * d).sum(axis=1))
+        out["area_distance"] = merged_areas / numpy.where(dist == 0.0, 1.0, dist)
+        out["area_distance"][dist == 0.0] = 0.0
+    return out
+
+
+_CONNECTION_KEYS = ["connections", "face_centers", "areas", "area_distance"]
+
+
+def _positions(uge, ids):
+    # Index into the cell arrays of each cell id
+    cell_ids = numpy.asarray(uge["ids"])
+    n = len(cell_ids)
+    if n and cell_ids[0] == 1 and cell_ids[-1] == n:
+        if numpy.all(numpy.diff(cell_ids) == 1):
+            return numpy.asarray(ids) - 1
+    order = numpy.argsort(cell_ids, kind="stable")
+    pos = numpy.searchsorted(cell_ids, ids, sorter=order)
+    pos = order[numpy.minimum(pos, n - 1)]
+    if not numpy.all(cell_ids[pos] == ids):
+        raise ValueError("Connection refers to a cell that is not listed")
+    return pos
+
+
+def _read_count(reader, keyword):
+    line = reader.take(1)[1].split()
+    if len(line) < 2 or line[0].upper() != keyword:
+        raise ValueError("Expected %s line in uge file" % keyword.decode())
+    return int(line[1])
+
+
+def _read_rows(reader, nrows, ncols, chunksize):
+    rows = numpy.empty((nrows, ncols))
+    for i in range(0, nrows, chunksize):
+        n = min(chunksize, nrows - i)
+        values = to_float(reader.take(n)[1])
+        if values.size != n * ncols:
+            raise ValueError("Expected %d values per line in uge file" % ncols)
+        rows[i : i + n] = values.reshape(n, ncols)
+    return rows
+
+
+def _write_rows(fh, columns, nids, chunksize):
+    # Each row is nids id fields followed by real fields, separated by a
+    # space, as in format(i10,[1x,i10,]n(1x,1pe20.12))
+    columns = [numpy.asarray(c) for c in columns]
+    columns = [c.reshape(len(c), -1) for c in columns]
+    nrows = len(columns[0])
+    for i in range(0, nrows, chunksize):
+        parts = [c[i : i + chunksize] for c in columns]
+        fields = [_format_int(c, _ID_WIDTH) for c in parts[0].T]
+        for c in parts[1:]:
+            fields += [_format_e(v) for v in c.T]
+        line = fields[0]
+        for f in fields[1:]:
+            line = numpy.char.add(numpy.char.add(line, " "), f)
+        fh.write(("\n".join(line.tolist()) + "\n").encode())
+
+
+def _format_int(values, width):
+    # Right justified integer fields
+    v = numpy.asarray(values).astype(numpy.int64)
+    if len(v) and (v.min() < 0 or v.max() >= 10 ** width):
+        raise ValueError("Ids do not fit i%d fields" % width)
+    return numpy.char.mod("%" + str(width) + "d", v)
+
+
+def _format_e(values):
+    # Fortran 1pe20.12 fields, which drop the exponent letter of three
+    # digit exponents
+    x = numpy.asarray(values, dtype=numpy.float64)
+    if not numpy.all(numpy.isfinite(x)):
+        raise ValueError("Values must be finite")
+    text = numpy.char.mod("%" + str(_REAL_WIDTH) + "." + str(_NDEC) + "E", x)
+    wide = numpy.char.rfind(text, "E") < _REAL_WIDTH - 4
+    if wide.any():
+        text[wide] = numpy.char.rjust(
+            numpy.char.replace(text[wide], "E", ""), _REAL_WIDTH
+        )
+    return text
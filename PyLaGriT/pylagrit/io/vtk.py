@@ -0,0 +1,147 @@
+"""
+Writer for VTK XML unstructured grid (.vtu) files with appended binary data
+"""
+
+import zlib
+import numpy
+from pylagrit.io.avs import NODES_PER_ELEMENT
+
+# VTK cell types indexed by LaGriT element type code. LaGriT node order
+# for each element matches VTK (as it does Exodus II), so no permutation
+# of the connectivity is needed.
+VTK_CELL_TYPES = numpy.array([0, 1, 3, 5, 9, 10, 14, 13, 12], dtype=numpy.uint8)
+
+_VTK_DTYPES = {
+    "f4": "Float32",
+    "f8": "Float64",
+    "i1": "Int8",
+    "i2": "Int16",
+    "i4": "Int32",
+    "i8": "Int64",
+    "u1": "UInt8",
+    "u2": "UInt16",
+    "u4": "UInt32",
+    "u8": "UInt64",
+}
+
+# Uncompressed block size used for zlib compressed arrays
+_BLOCK_SIZE = 2 ** 20
+
+
+def write_vtu(
+    filename,
+    coords,
+    itet,
+    itetoff,
+    itettyp,
+    node_data=None,
+    cell_data=None,
+    compression=None,
+):
+    """
+    Write a VTK XML unstructured grid file with raw appended binary arrays
+
+    :arg filename: Name of vtu file
+    :type filename: str
+    :arg coords: Node coordinates
+    :type coords: ndarray(float), nnodes by 3
+    :arg itet: Element connectivity, 1-based node numbers in LaGriT node order
+    :type itet: ndarray(int)
+    :arg itetoff: Offset of each element's first node in itet
+    :type itetoff: ndarray(int)
+    :arg itettyp: LaGriT element type code of each element
+    :type itettyp: ndarray(int)
+    :arg node_data: Node attribute arrays keyed by name
+    :type node_data: dict
+    :arg cell_data: Element attribute arrays keyed by name
+    :type cell_data: dict
+    :arg compression: None for raw arrays or 'zlib' for zlib compressed arrays
+    :type compression: str
+
+    Example:
+        >>> from pylagrit.io import read_avs, write_vtu
+        >>> m = read_avs('test.inp')
+        >>> write_vtu('test.vtu', m['coords'], m['itet'], m['itetoff'], m['itettyp'],
+        >>>           cell_data={'itetclr': m['itetclr']}, compression='zlib')
+    """
+    node_data = {} if node_data is None else node_data
+    cell_data = {} if cell_data is None else cell_data
+    if compression not in [None, "zlib"]:
+        raise ValueError("compression must be None or 'zlib'")
+    coords = numpy.asarray(coords, dtype=numpy.float64)
+    itettyp = numpy.asarray(itettyp)
+    itetoff = numpy.asarray(itetoff, dtype=numpy.int64)
+    arrays = [
+        ("Points", "Points", _le(coords)),
+        ("Cells", "connectivity", _le(numpy.asarray(itet, dtype=numpy.int64) - 1)),
+        ("Cells", "offsets", _le(itetoff + NODES_PER_ELEMENT[itettyp])),
+        ("Cells", "types", VTK_CELL_TYPES[itettyp]),
+    ]
+    for k, v in node_data.items():
+        arrays.append(("PointData", k, _le(v)))
+    for k, v in cell_data.items():
+        arrays.append(("CellData", k, _le(v)))
+
+    if compression == "zlib":
+        blocks = [_compress(a) for _, _, a in arrays]
+    else:
+        blocks = [
+            [numpy.array([a.nbytes], dtype="<u8"), a.reshape(-1)] for _, _, a in arrays
+        ]
+
+    offset = 0
+    sections = {"Points": [], "Cells": [], "PointData": [], "CellData": []}
+    for (section, name, a), blk in zip(arrays, blocks):
+        ncomp = a.shape[1] if a.ndim > 1 else 1
+        sections[section].append(
+            '        <DataArray type="%s" Name="%s" NumberOfComponents="%d" '
+            'format="appended" offset="%d"/>\n'
+            % (_VTK_DTYPES[a.dtype.str[1:]], name, ncomp, offset)
+        )
+        offset += sum([b.nbytes for b in blk])
+
+    header = '<?xml version="1.0"?>\n'
+    header += '<VTKFile type="UnstructuredGrid" version="1.0" '
+    header += 'byte_order="LittleEndian" header_type="UInt64"'
+    if compression == "zlib":
+        header += ' compressor="vtkZLibDataCompressor"'
+    header += ">\n  <UnstructuredGrid>\n"
+    header += '    <Piece NumberOfPoints="%d" NumberOfCells="%d">\n' % (
+        coords.shape[0],
+        itettyp.shape[0],
+    )
+    for section in ["Points", "Cells", "PointData", "CellData"]:
+        header += "      <%s>\n" % section
+        header += "".join(sections[section])
+        header += "      </%s>\n" % section
+    header += "    </Piece>\n  </UnstructuredGrid>\n"
+    header += '  <AppendedData encoding="raw">\n   _'
+
+    with open(filename, "wb") as fh:
+        fh.write(header.encode("ascii"))
+        for blk in blocks:
+            for b in blk:
+                fh.write(memoryview(numpy.ascontiguousarray(b)).cast("B"))
+        fh.write(b"\n  </AppendedData>\n</VTKFile>\n")
+
+
+def _le(a):
+    # Little endian, C contiguous copy only if needed
+    a = numpy.asarray(a)
+    if a.dtype == bool:
+        a = a.astype(numpy.uint8)
+    return numpy.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<"))
+
+
+def _compress(a):
+    raw = memoryview(numpy.ascontiguousarray(a).reshape(-1)).cast("B")
+    nblocks = max(1, -(-len(raw) // _BLOCK_SIZE))
+    comp = [
+        numpy.frombuffer(
+            zlib.compress(raw[i * _BLOCK_SIZE : (i + 1) * _BLOCK_SIZE]), numpy.uint8
+        )
+        for i in range(nblocks)
+    ]
+    last = len(raw) - (nblocks - 1) * _BLOCK_SIZE
+    head = [nblocks, _BLOCK_SIZE, last] + [c.nbytes for c in comp]
+    return [numpy.array(head, dtype="<u8")] + comp
@@ -0,0 +1,195 @@
+"""
+Writer for XDMF light data with flat little-endian binary heavy data files
+"""
+
+import os
+import copy
+import numpy
+from pylagrit.io.avs import NODES_PER_ELEMENT
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+from xml.dom import minidom
+
+# XDMF topology names and mixed topology codes indexed by LaGriT element type
+XDMF_TOPOLOGY_TYPES = [
+    None,
+    "Polyvertex",
+    "Polyline",
+    "Triangle",
+    "Quadrilateral",
+    "Tetrahedron",
+    "Pyramid",
+    "Wedge",
+    "Hexahedron",
+]
+XDMF_MIXED_TYPES = numpy.array([0, 1, 2, 4, 5, 6, 7, 8, 9], dtype=numpy.int64)
+
+
+def write_xdmf(
+    basename, coords, itet, itetoff, itettyp, node_data=None, cell_data=None, time=0.0
+):
+    """
+    Write XDMF file (<basename>.xmf) with binary heavy data files
+
+    Coordinates, connectivity and each attribute are written to their own
+    flat little-endian file with a single contiguous write:
+    <basename>_coords.bin, <basename>_topology.bin and
+    <basename>_<attribute>_<step>.bin. Further time steps of attributes
+    can be added with append_xdmf without rewriting the geometry.
+
+    :arg basename: Base name of files to create
+    :type basename: str
+    :arg coords: Node coordinates
+    :type coords: ndarray(float), nnodes by 3
+    :arg itet: Element connectivity, 1-based node numbers in LaGriT node order
+    :type itet: ndarray(int)
+    :arg itetoff: Offset of each element's first node in itet
+    :type itetoff: ndarray(int)
+    :arg itettyp: LaGriT element type code of each element
+    :type itettyp: ndarray(int)
+    :arg node_data: Node attribute arrays keyed by name
+    :type node_data: dict
+    :arg cell_data: Element attribute arrays keyed by name
+    :type cell_data: dict
+    :arg time: Time value of the first step
+    :type time: float
+    """
+    node_data = {} if node_data is None else node_data
+    cell_data = {} if cell_data is None else cell_data
+    coords = numpy.asarray(coords, dtype="<f8")
+    itet = numpy.asarray(itet, dtype="<i8") - 1
+    itettyp = numpy.asarray(itettyp)
+    nelems = itettyp.shape[0]
+    root = os.path.basename(basename)
+
+    coords.tofile(basename + "_coords.bin")
+
+    types = numpy.unique(itettyp)
+    if len(types) == 1:
+        ityp = int(types[0])
+        topology = ET.Element(
+            "Topology",
+            {
+                "TopologyType": XDMF_TOPOLOGY_TYPES[ityp],
+                "NumberOfElements": str(nelems),
+            },
+        )
+        if XDMF_TOPOLOGY_TYPES[ityp] in ["Polyvertex", "Polyline"]:
+            topology.set("NodesPerElement", str(NODES_PER_ELEMENT[ityp]))
+        itet.tofile(basename + "_topology.bin")
+        dims = (nelems, NODES_PER_ELEMENT[ityp])
+    else:
+        # Mixed topology: type code, (node count for polyvertex and
+        # polyline), then the element's nodes
+        nen = NODES_PER_ELEMENT[itettyp]
+        nhead = numpy.where(itettyp <= 2, 2, 1)
+        start = numpy.cumsum(nen + nhead) - nen - nhead
+        mixed = numpy.empty(len(itet) + nhead.sum(), dtype="<i8")
+        mixed[start] = XDMF_MIXED_TYPES[itettyp]
+        mixed[start[itettyp <= 2] + 1] = nen[itettyp <= 2]
+        pos = numpy.repeat(start + nhead - numpy.asarray(itetoff), nen)
+        mixed[pos + numpy.arange(len(itet))] = itet
+        topology = ET.Element(
+            "Topology", {"TopologyType": "Mixed", "NumberOfElements": str(nelems)}
+        )
+        mixed.tofile(basename + "_topology.bin")
+        dims = (len(mixed),)
+    topology.append(_data_item(root + "_topology.bin", dims, numpy.dtype("<i8")))
+
+    geometry = ET.Element("Geometry", {"GeometryType": "XYZ"})
+    geometry.append(_data_item(root + "_coords.bin", coords.shape, coords.dtype))
+
+    xdmf = ET.Element("Xdmf", {"Version": "3.0"})
+    domain = ET.SubElement(xdmf, "Domain")
+    collection = ET.SubElement(
+        domain,
+        "Grid",
+        {"Name": root, "GridType": "Collection", "CollectionType": "Temporal"},
+    )
+    collection.append(
+        _step_grid(basename, 0, time, topology, geometry, node_data, cell_data)
+    )
+    _write_xml(basename + ".xmf", xdmf)
+
+
+def append_xdmf(basename, node_data=None, cell_data=None, time=None):
+    """
+    Append a time step of attributes to an XDMF file written by write_xdmf
+
+    Only the new attribute heavy data files and the light XML are written;
+    the new step references the existing coordinate and topology files.
+
+    :arg basename: Base name used with write_xdmf
+    :type basename: str
+    :arg node_data: Node attribute arrays keyed by name
+    :type node_data: dict
+    :arg cell_data: Element attribute arrays keyed by name
+    :type cell_data: dict
+    :arg time: Time value of the step, defaults to the step number
+    :type time: float
+    :returns: step number
+    """
+    node_data = {} if node_data is None else node_data
+    cell_data = {} if cell_data is None else cell_data
+    xdmf = ET.parse(basename + ".xmf").getroot()
+    collection = xdmf.find("Domain").find("Grid")
+    grids = collection.findall("Grid")
+    step = len(grids)
+    if time is None:
+        time = float(step)
+    topology = copy.deepcopy(grids[0].find("Topology"))
+    geometry = copy.deepcopy(grids[0].find("Geometry"))
+    collection.append(
+        _step_grid(basename, step, time, topology, geometry, node_data, cell_data)
+    )
+    _write_xml(basename + ".xmf", xdmf)
+    return step
+
+
+def _step_grid(basename, step, time, topology, geometry, node_data, cell_data):
+    root = os.path.basename(basename)
+    grid = ET.Element("Grid", {"Name": "%s_%d" % (root, step), "GridType": "Uniform"})
+    ET.SubElement(grid, "Time", {"Value": repr(float(time))})
+    grid.append(topology)
+    grid.append(geometry)
+    for center, data in [("Node", node_data), ("Cell", cell_data)]:
+        for name, v in data.items():
+            v = numpy.asarray(v)
+            v = numpy.ascontiguousarray(v, dtype=v.dtype.newbyteorder("<"))
+            fname = "%s_%s_%d.bin" % (basename, name, step)
+            v.tofile(fname)
+            atype = "Scalar" if v.ndim == 1 else "Vector"
+            att = ET.SubElement(
+                grid,
+                "Attribute",
+                {"Name": name, "AttributeType": atype, "Center": center},
+            )
+            att.append(_data_item(os.path.basename(fname), v.shape, v.dtype))
+    return grid
+
+
+def _data_item(filename, shape, dtype):
+    number_type = {"f": "Float", "i": "Int", "u": "UInt"}[dtype.kind]
+    item = ET.Element(
+        "DataItem",
+        {
+            "Dimensions": " ".join([str(v) for v in shape]),
+            "NumberType": number_type,
+            "Precision": str(dtype.itemsize),
+            "Format": "Binary",
+            "Endian": "Little",
+        },
+    )
+    item.text = filename
+    return item
+
+
+def _write_xml(filename, xdmf):
+    x_str = ET.tostring(xdmf)
+    # Strip whitespace from previous writes before pretty printing again
+    x_reparsed = minidom.parseString(b"".join([v.strip() for v in x_str.splitlines()]))
+    with open(filename, "w") as f:
+        f.write(x_reparsed.toprettyxml(indent="  "))
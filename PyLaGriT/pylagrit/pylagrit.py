@@ -1,7 +1,11 @@
 from pexpect import spawn
 from subprocess import call
 import os, sys
+import re
 import glob
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from collections import OrderedDict
 import numpy
 import warnings
@@ -12,6 +16,27 @@ try:
 except ImportError:
     import xml.etree.ElementTree as ET
 from xml.dom import minidom
+from pylagrit.io.avs import (
+    CHUNKSIZE,
+    NODES_PER_ELEMENT,
+    read_avs,
+    read_avs_element_attributes,
+    write_avs,
+    write_avs_element_attributes,
+)
+from pylagrit.io.compress import (
+    COMPRESSED_EXTENSIONS,
+    compressed_output,
+    decompressed,
+    open_compressed,
+)
+from pylagrit.io.dem import iter_dem, _find_header as _find_dem_header
+from pylagrit.io.exodus import write_exodus
+from pylagrit.io.vtk import write_vtu
+from pylagrit.io.xdmf import write_xdmf, append_xdmf
+from pylagrit.spatial import BVH, LEAFSIZE, QUERY_CHUNKSIZE, KDTree
+from pylagrit.utilities import read_zone, write_zone
+
 
 # Universal-safe function for ensuring string integrity
 def _decode_binary(b):
@@ -23,11 +48,27 @@ def _decode_binary(b):
 
 catch_errors = True
 
+# Number of mesh objects PyLaGriT.merge merges one after another before
+# merging pairwise
+MERGE_RUN = 8
+
 
 class LaGriT_Warning(Warning):
     pass
 
 
+# Short names LaGriT accepts for node attributes, and the names that
+# to_arrays and dump files give them
+_ATTRIBUTE_ALIASES = {"imt": "imt1", "itp": "itp1", "icr": "icr1", "isn": "isn1"}
+
+# Commands that leave mesh objects unchanged, and so do not make spatial
+# indexes stale
+_QUERY_COMMANDS = ("cmo/select", "cmo/status", "cmo/printatt", "dump")
+
+# Commands that make the mesh object they name the selected one
+_SELECT_COMMANDS = ("cmo/select", "cmo/create")
+
+
 class PyLaGriT(spawn):
     """
     Python lagrit class
@@ -62,6 +103,8 @@ class PyLaGriT(spawn):
         self.verbose = verbose
         self.mo = {}
         self.batch = batch
+        self._changes = {}
+        self._selected = None
         self._check_rc()
 
         if lagrit_exe is not None:
@@ -114,6 +157,7 @@ class PyLaGriT(spawn):
             super(PyLaGriT, self).expect(expectstr, timeout=timeout)
 
     def sendline(self, cmd, verbose=True, expectstr="Enter a command"):
+        self._count_change(cmd)
         if self.batch:
             self.fh.write(cmd + "\n")
         else:
@@ -129,6 +173,20 @@ class PyLaGriT(spawn):
                     elif "WARNING" in _line:
                         warnings.warn(_line, category=LaGriT_Warning)
 
+    def _count_change(self, cmd):
+        # Count the commands that can change each mesh object. LaGriT
+        # commands name their sink before their sources, so a command
+        # changes the first mesh object it names, or else the selected one.
+        # Changes to an unknown mesh object are counted under None.
+        words = re.split(r"[/\s,;]+", cmd.strip())
+        command = "/".join(words[:2]).lower()
+        if command.startswith(_SELECT_COMMANDS) and len(words) > 2:
+            self._selected = words[2]
+        if command.startswith(_QUERY_COMMANDS):
+            return
+        name = next((w for w in words[1:] if w in self.mo), self._selected)
+        self._changes[name] = self._changes.get(name, 0) + 1
+
     def interact(self, escape_character="^"):
         if self.batch:
             print("Interactive mode unavailable during batch mode")
@@ -166,6 +224,8 @@ class PyLaGriT(spawn):
         :type binary: bool
         :returns: MO
 
+        Files ending in .gz or .zst are decompressed transparently.
+
         Example 1:
             >>> #To use pylagrit, import the module.
             >>> import pylagrit
@@ -203,6 +263,11 @@ class PyLaGriT(spawn):
             >>> print 'Name of mesh object read in should be testmo, is: ', ms_read.name
         """
 
+        # LaGriT readers seek, so compressed files are decompressed first
+        if os.path.splitext(filename)[1] in COMPRESSED_EXTENSIONS:
+            with decompressed(filename) as fname:
+                return self.read(fname, filetype=filetype, name=name, binary=binary)
+
         # If filetype is lagrit, name is irrelevant
         if filetype == "lagrit" or filename.split(".")[-1] in [
             "lg",
@@ -248,7 +313,10 @@ class PyLaGriT(spawn):
             return self.mo[name]
 
     def read_fehm(self, filename, avs_filename="temp.inp", elem_type=None):
-        with open(filename, "r") as fh:
+        """
+        Read FEHM grid file, which may be gz or zst compressed
+        """
+        with open_compressed(filename, "rt") as fh:
             ln = fh.readline()
             nn = int(fh.readline().strip())
             while not "elem" in ln:
@@ -256,8 +324,10 @@ class PyLaGriT(spawn):
             vs = fh.readline().strip().split()
         elem_int = int(vs[0])
         ne = int(vs[1])
-        crds = numpy.genfromtxt(filename, skip_header=2, max_rows=nn)
-        conns = numpy.genfromtxt(filename, skip_header=2 + nn + 3, max_rows=ne)
+        with open_compressed(filename, "rt") as fh:
+            crds = numpy.genfromtxt(fh, skip_header=2, max_rows=nn)
+        with open_compressed(filename, "rt") as fh:
+            conns = numpy.genfromtxt(fh, skip_header=2 + nn + 3, max_rows=ne)
         with open(avs_filename, "w") as fh:
             fh.write("    %d    %d    0    0    0\n" % (nn, ne))
             numpy.savetxt(fh, crds, fmt="%d %f %f %f")
@@ -373,15 +443,14 @@ class PyLaGriT(spawn):
         self.sendline("cmo/create/{}".format(name))
         self.sendline("cmo/select/{}".format(name))
 
-        # Read in elevation file and append to mesh
+        # Read in elevation file and append to mesh, on continuation lines
+        # as LaGriT reads at most 80 characters per line
         cmd = [
             "read",
             "sheetij",
             filename,
-            ",".join(NXY),
-            ",".join(minXY),
-            ",".join(DXY),
-            skip_str,
+            ",".join(NXY) + " &\n" + ",".join(minXY),
+            ",".join(DXY) + " &\n" + skip_str,
             flip_str,
             connect_str,
             file_type,
@@ -392,6 +461,156 @@ class PyLaGriT(spawn):
         self.mo[name] = MO(name, self)
         return self.mo[name]
 
+    def read_dem(
+        self,
+        filename,
+        header=None,
+        name=None,
+        elem_type="quad",
+        nodata="remove",
+        window=None,
+        tiles=None,
+        block_rows=256,
+    ):
+        """
+        Create a surface mesh from an ESRI ASCII grid or a raw float32 DEM
+
+        The grid is streamed a block of rows at a time into a raw double
+        file per tile, which is read by read/sheetij as a connected quad
+        surface with nodes at the cell centers and the elevation in zic.
+
+        :arg filename: Name of ESRI ASCII grid (may be gz or zst compressed), or of raw
+                       float32 grid if header is given or filename ends with .flt and a
+                       .hdr file exists
+        :type filename: str
+        :arg header: Header of a raw float32 grid, as the name of its .hdr file or as a
+                     dict of header keywords (e.g. ncols, nrows, xllcorner, yllcorner,
+                     cellsize, NODATA_value, byteorder)
+        :type header: str or dict
+        :arg name: Internal Lagrit name of new mesh object, automatically created if None.
+                   Tiles are named with the tile number appended.
+        :type name: str
+        :arg elem_type: 'quad', or 'tri' to split each quad into two triangles
+        :type elem_type: str
+        :arg nodata: 'remove' to remove the NODATA nodes and the elements using them,
+                     or 'keep' to keep them with the NODATA value as elevation
+        :type nodata: str
+        :arg window: Subset of the grid to read as (first column, first row, number of
+                     columns, number of rows), with rows counted from the top
+        :type window: tuple(int, int, int, int)
+        :arg tiles: Number of tiles in x and y to split the grid (or window) into, as
+                    separate mesh objects sharing the nodes on their common edges
+        :type tiles: tuple(int, int)
+        :arg block_rows: Number of grid rows held in memory at a time
+        :type block_rows: int
+        :returns: MO, or list of MO tiles ordered by x then y if tiles is given
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> surface = lg.read_dem('dem.asc')
+            >>> surface.dump('dem.inp')
+            >>> # A large DEM read as 4 by 4 triangulated tiles
+            >>> parts = lg.read_dem('big.flt', elem_type='tri', tiles=(4, 4))
+        """
+        if elem_type not in ["quad", "tri"]:
+            raise ValueError("elem_type must be quad or tri")
+        if nodata not in ["remove", "keep"]:
+            raise ValueError("nodata must be remove or keep")
+        hdr = _find_dem_header(filename, header)[0]
+        if window is None:
+            window = (0, 0, hdr["ncols"], hdr["nrows"])
+        col0, row0, ncols, nrows = window
+        if (
+            min(col0, row0) < 0
+            or col0 + ncols > hdr["ncols"]
+            or row0 + nrows > hdr["nrows"]
+        ):
+            raise ValueError("window is outside of the grid")
+        ntiles = (1, 1) if tiles is None else tiles
+        if ntiles[0] > ncols - 1 or ntiles[1] > nrows - 1:
+            raise ValueError("Tiles must be at least one cell wide")
+        # Grid columns and rows (from the top) of the tile edges
+        cols = numpy.linspace(col0, col0 + ncols - 1, ntiles[0] + 1).round()
+        rows = numpy.linspace(row0 + nrows - 1, row0, ntiles[1] + 1).round()
+        parts = []
+        for j in range(ntiles[1]):
+            for i in range(ntiles[0]):
+                parts.append(
+                    (
+                        "._" + uuid.uuid4().hex[:12] + ".dem",
+                        int(cols[i]),
+                        int(cols[i + 1]),
+                        int(rows[j + 1]),
+                        int(rows[j]),
+                    )
+                )
+        has_nodata = [False] * len(parts)
+        handles = [open(p[0], "wb") for p in parts]
+        try:
+            for row, block in iter_dem(filename, header, block_rows):
+                last = row + len(block) - 1
+                for k, (fname, c0, c1, r0, r1) in enumerate(parts):
+                    if r1 < row or r0 > last:
+                        continue
+                    values = block[max(r0, row) - row : min(r1, last) - row + 1]
+                    values = values[:, c0 : c1 + 1]
+                    # read/sheetij reads native doubles
+                    values.astype(numpy.float64).tofile(handles[k])
+                    if hdr["nodata"] is not None:
+                        has_nodata[k] |= bool(numpy.any(values == hdr["nodata"]))
+                if last >= row0 + nrows - 1:
+                    break
+        finally:
+            for fh in handles:
+                fh.close()
+        mos = []
+        try:
+            for k, (fname, c0, c1, r0, r1) in enumerate(parts):
+                if name is None:
+                    mo_name = make_name("mo", self.mo.keys())
+                elif tiles is None:
+                    mo_name = name
+                else:
+                    mo_name = name + str(k + 1)
+                quad_name = mo_name
+                if elem_type == "tri":
+                    quad_name = make_name("mo", list(self.mo.keys()) + [mo_name])
+                mo = self.read_sheetij(
+                    quad_name,
+                    fname,
+                    [c1 - c0 + 1, r1 - r0 + 1],
+                    [
+                        hdr["x"] + c0 * hdr["dx"],
+                        hdr["y"] + (hdr["nrows"] - 1 - r1) * hdr["dy"],
+                    ],
+                    [hdr["dx"], hdr["dy"]],
+                    file_type="binary",
+                    flip="y",
+                    data_type="double",
+                )
+                # read/sheetij also creates an empty file for its Fortran unit
+                for f in [fname, fname + "F"]:
+                    if os.path.exists(f):
+                        os.remove(f)
+                if nodata == "remove" and has_nodata[k]:
+                    pset = mo.pset_attribute("zic", hdr["nodata"])
+                    eltset = pset.eltset(membership="inclusive")
+                    mo.rmpoint_eltset(eltset)
+                    eltset.delete()
+                    pset.delete()
+                if elem_type == "tri":
+                    tri = mo.grid2grid_quadtotri2(name=mo_name)
+                    mo.delete()
+                    mo = tri
+                mos.append(mo)
+        finally:
+            for p in parts:
+                for f in [p[0], p[0] + "F"]:
+                    if os.path.exists(f):
+                        os.remove(f)
+        return mos[0] if tiles is None else mos
+
     def read_modflow(
         self,
         materials_file,
@@ -889,15 +1108,28 @@ class PyLaGriT(spawn):
             self.sendline("cmo/release/temp_cmo")
             os.unlink("old_format")
 
-    def merge(self, mesh_objs, elem_type="tet", name=None):
+    def merge(self, mesh_objs, elem_type="tet", name=None, workers=None):
         """
         Merge Mesh Objects
 
         Merges two or more mesh objects together and returns the combined mesh
         object.
 
+        Runs of MERGE_RUN mesh objects are merged one after another and the
+        runs are then merged pairwise in a balanced tree, so each node and
+        element is copied once per level rather than once per mesh object.
+        Intermediate mesh objects are released as soon as they are merged.
+        The result is the same as merging the mesh objects one after another
+        in list order.
+
+        With workers, the list is split into that many contiguous groups,
+        each written as LaGriT binary snapshots and merged in its own LaGriT
+        session. The merged groups are read back and merged in this session.
+
         :param mesh_objs: An argument list of mesh objects.
         :type  mesh_objs: MO list
+        :param workers: Number of concurrent LaGriT sessions, default merges in this session
+        :type  workers: int
 
         Returns: MO.
 
@@ -924,18 +1156,41 @@ class PyLaGriT(spawn):
         """
         if name is None:
             name = make_name("mo", self.mo.keys())
-        self.mo[name] = MO(name, self)
-        if len(mesh_objs) > 1:
-            # mo_merge = self.create(elem_type=elem_type)
-            for mo in mesh_objs:
-                cmd = "/".join(["addmesh", "merge", name, name, mo.name])
-                self.sendline(cmd)
-                # mo_merge = self.addmesh_merge(mo_merge,mo)
-            # return mo_merge
-            # return reduce(self.addmesh_merge, mesh_objs)
-        else:
+        if len(mesh_objs) < 2:
             raise ValueError("Must provide at least two objects to merge.")
-        return self.mo[name]
+        ngroups = 1 if workers is None else min(workers, len(mesh_objs) // 2)
+        if ngroups < 2:
+            return _merge_tree(self, mesh_objs, name)
+        bounds = numpy.linspace(0, len(mesh_objs), ngroups + 1).astype(int)
+        root = "._" + uuid.uuid4().hex[:12]
+        names = list(self.mo.keys()) + [name]
+        groups = []
+        for i in range(ngroups):
+            snapshots = []
+            for j, mo in enumerate(mesh_objs[bounds[i] : bounds[i + 1]]):
+                snapshot = root + "_%d_%d.lg" % (i, j)
+                mo.dump(snapshot, "lagrit", "binary")
+                snapshots.append((snapshot, mo.name))
+            names.append(make_name("mo", names))
+            groups.append((snapshots, names[-1], root + "_%d.lg" % i))
+        try:
+            with ThreadPoolExecutor(max(1, workers)) as pool:
+                futures = [
+                    pool.submit(_merge_session, self.lagrit_exe, *group)
+                    for group in groups
+                ]
+                for future in futures:
+                    future.result()
+            merged = []
+            for snapshots, group_name, result in groups:
+                self.read(result)
+                merged.append(self.mo[group_name])
+        finally:
+            for snapshots, group_name, result in groups:
+                for f in [s for s, nm in snapshots] + [result]:
+                    if os.path.exists(f):
+                        os.remove(f)
+        return _merge_tree(self, merged, name, release=merged)
 
     def create(self, elem_type="tet", name=None, npoints=0, nelements=0):
         """
@@ -1531,6 +1786,7 @@ class MO(object):
         self.regions = {}
         self.mregions = {}
         self.surfaces = {}
+        self._index = None
 
     def __repr__(self):
         return self.name
@@ -2186,6 +2442,212 @@ class MO(object):
         """
         return self.pset_geom(geom="rtp", **minus_self(locals()))
 
+    def classify_nodes(self, shapes, attribute="id_region", priority=None, psets=False):
+        """
+        Label nodes by the geometric shapes that contain them
+
+        Shapes are pset_geom regions evaluated together on the node
+        coordinates with the same tests as pset/geom, and the labels are
+        written to an integer node attribute with a single cmo/readatt,
+        rather than a pset and setatt per shape. Nodes in more than one
+        shape take the label of the shape with the highest priority, or of
+        the last one if no priorities are given. Nodes in no shape keep the
+        value of an existing attribute, and are 0 in a new one.
+
+        :arg shapes: Shapes as dicts of pset_geom arguments mins, maxs and optionally
+                     ctr and geom ('xyz', 'rtz' or 'rtp'), plus the label 'value'
+                     (default is the position of the shape plus one) and the pset 'name'
+        :type shapes: list(dict)
+        :arg attribute: Name of node attribute to write labels to
+        :type attribute: str
+        :arg priority: Priority of each shape
+        :type priority: list(float)
+        :arg psets: Also create a pset of the nodes labeled by each shape
+        :type psets: bool
+        :returns: numpy array of node labels
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create()
+            >>> m.createpts_brick_xyz((21,21,21),(0,0,0),(10,10,10))
+            >>> shapes = [{'mins': (0,0,0), 'maxs': (10,10,4), 'value': 1},
+            >>>           {'mins': (0,0,4), 'maxs': (10,10,10), 'value': 2},
+            >>>           {'geom': 'rtz', 'mins': (0,0,0), 'maxs': (1,360,10),
+            >>>            'ctr': (5,5,0), 'value': 3, 'name': 'well'}]
+            >>> labels = m.classify_nodes(shapes, attribute='imt', psets=True)
+        """
+        if priority is None:
+            priority = range(len(shapes))
+        arrays = self.to_arrays()
+        coords = arrays["coords"]
+        key = _ATTRIBUTE_ALIASES.get(attribute, attribute)
+        if key in arrays["node_attributes"]:
+            labels = arrays["node_attributes"][key].copy()
+        else:
+            self.addatt(attribute, vtype="VINT")
+            labels = numpy.zeros(len(coords), dtype=numpy.int64)
+        lo = coords.min(axis=0)
+        hi = coords.max(axis=0)
+        best = numpy.full(len(coords), -numpy.inf)
+        values = []
+        for i, (shape, p) in enumerate(zip(shapes, priority)):
+            inside = _in_geom(
+                coords,
+                shape.get("geom", "xyz"),
+                shape["mins"],
+                shape["maxs"],
+                shape.get("ctr", (0, 0, 0)),
+                lo,
+                hi,
+            )
+            inside &= p >= best
+            values.append(shape.get("value", i + 1))
+            labels[inside] = values[-1]
+            best[inside] = p
+        self._bulk_setatt(attribute, labels)
+        if psets:
+            for shape, value in zip(shapes, values):
+                self.pset_attribute(attribute, value, name=shape.get("name"))
+        return labels
+
+    def assign_from_raster(
+        self,
+        array,
+        origin,
+        spacing,
+        attribute,
+        method="nearest",
+        nodata=None,
+        elements=None,
+        chunksize=CHUNKSIZE,
+    ):
+        """
+        Set an attribute by sampling a raster at node or element centroid coordinates
+
+        The raster is sampled in numpy by index arithmetic on the x and y
+        coordinates, chunksize nodes or elements at a time, and the values
+        are written with a single cmo/readatt for node attributes or a
+        single read/zone_element for element attributes. Nodes and elements
+        outside the raster or on nodata cells keep their current values.
+
+        :arg array: Raster values, with the first row at the top (largest y)
+                    as in ESRI ASCII grids and GeoTIFFs
+        :type array: numpy.ndarray
+        :arg origin: x and y of the lower left corner of the raster
+        :type origin: tuple(float, float)
+        :arg spacing: Cell size, or cell sizes in x and y
+        :type spacing: float or tuple(float, float)
+        :arg attribute: Name of attribute to set, e.g. 'imt' or 'itetclr'.
+                        A new attribute is integer if the raster is.
+        :type attribute: str
+        :arg method: 'nearest' for the value of the containing cell, or
+                     'bilinear' to interpolate between cell centers
+        :type method: str
+        :arg nodata: Raster value of cells without data
+        :type nodata: float
+        :arg elements: Sample at element centroids into an element attribute,
+                       defaults to True for itetclr and existing element
+                       attributes. Element attributes are integer, so only
+                       nearest sampling is supported.
+        :type elements: bool
+        :arg chunksize: Number of nodes or elements sampled at a time
+        :type chunksize: int
+        :returns: numpy array of attribute values
+
+        Example:
+            >>> import numpy
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create_hex()
+            >>> m.createpts_brick_xyz((41,41,6),(0,0,0),(400,400,50))
+            >>> geology = numpy.random.randint(1, 4, (20, 20))
+            >>> m.assign_from_raster(geology, (0,0), 20., 'itetclr')
+            >>> elevation = numpy.random.rand(20, 20)
+            >>> m.assign_from_raster(elevation, (0,0), 20., 'elev', method='bilinear')
+        """
+        array = numpy.asarray(array)
+        if method not in ("nearest", "bilinear"):
+            raise ValueError("Unknown raster sampling method " + str(method))
+        arrays = self.to_arrays()
+        key = _ATTRIBUTE_ALIASES.get(attribute, attribute)
+        if elements is None:
+            elements = key == "itetclr" or key in arrays["element_attributes"]
+        if elements:
+            if method != "nearest":
+                raise ValueError("Element attributes only support nearest sampling")
+            itet = arrays["itet"] - 1
+            counts = NODES_PER_ELEMENT[arrays["itettyp"]]
+            if key == "itetclr":
+                current = arrays["itetclr"]
+            else:
+                current = arrays["element_attributes"].get(key)
+            dtype = numpy.int64
+        else:
+            current = arrays["node_attributes"].get(key)
+            if current is not None:
+                dtype = current.dtype
+            elif method == "nearest" and array.dtype.kind in "iub":
+                dtype = numpy.int64
+            else:
+                dtype = numpy.float64
+        n = len(arrays["itetoff"]) if elements else len(arrays["coords"])
+        if current is None:
+            values = numpy.zeros(n, dtype=dtype)
+            self.addatt(
+                attribute,
+                vtype="VINT" if dtype == numpy.int64 else "VDOUBLE",
+                length="nelements" if elements else "nnodes",
+            )
+        else:
+            values = current.astype(dtype)
+        sampled = numpy.zeros(n, dtype=bool)
+        for start in range(0, n, chunksize):
+            stop = min(start + chunksize, n)
+            if elements:
+                off = arrays["itetoff"][start:stop]
+                xy = numpy.add.reduceat(
+                    arrays["coords"][itet[off[0] : off[-1] + counts[stop - 1]], :2],
+                    off - off[0],
+                )
+                xy /= counts[start:stop, None]
+            else:
+                xy = arrays["coords"][start:stop, :2]
+            v, ok = _sample_raster(array, origin, spacing, xy, method, nodata)
+            if values.dtype.kind in "iu":
+                v = numpy.rint(v)
+            values[start:stop][ok] = v[ok]
+            sampled[start:stop] = ok
+        if elements:
+            self._bulk_setatt(attribute, values, ids=numpy.flatnonzero(sampled))
+        else:
+            self._bulk_setatt(attribute, values)
+        return values
+
+    def _bulk_setatt(self, attribute, values, ids=None, reset=False):
+        # Write attribute values with a single LaGriT command. Without ids,
+        # values are for every node and read with cmo/readatt. With ids,
+        # values are integers for every element, and those of elements ids
+        # (0-based) are read with read/zone_element, which leaves the others
+        # unchanged, or sets them to 0 if reset.
+        if ids is None:
+            filename = "._" + self.name + "_" + attribute + ".txt"
+            fmt = "%d" if values.dtype.kind in "iu" else "%.17g"
+            numpy.savetxt(filename, values, fmt=fmt)
+            cmd = ["cmo", "readatt", self.name, attribute, "1,0,0", filename]
+        else:
+            filename = "._" + self.name + "_" + attribute
+            filename += ".zone" if reset else ".zonn"
+            zones = OrderedDict(
+                (int(v), ids[values[ids] == v] + 1) for v in numpy.unique(values[ids])
+            )
+            write_zone(filename, zones, zonn=not reset)
+            cmd = ["read", "zone_element", filename, self.name, attribute]
+        try:
+            self.sendline("/".join(cmd))
+        finally:
+            os.remove(filename)
+
     def pset_attribute(
         self, attribute, value, comparison="eq", stride=(1, 0, 0), name=None
     ):
@@ -2230,7 +2692,9 @@ class MO(object):
 
         return self.pset[name]
 
-    def compute_distance(self, mo, option="distance_field", attname="dfield"):
+    def compute_distance(
+        self, mo, option="distance_field", attname="dfield", index=None
+    ):
         """
         Compute distance from one mesh object to another
 
@@ -2244,6 +2708,10 @@ class MO(object):
         :kwarg attname: The name of the attribute to be created in the base mesh.
         :type  attname: str
 
+        :kwarg index: Spatial index of mo, whose nodes are searched in place of
+         a new LaGriT search for 'distance_field'
+        :type  index: SpatialIndex
+
         Returns: New attribute in base mesh object
 
         Example:
@@ -2262,13 +2730,165 @@ class MO(object):
         #compute distance and store in sink mesh attribute 'dfield'
         snk_mo.compute_distance(src_mo)
         snk_mo.dump('comptest.gmv')
+
+        #reuse the search structure of src_mo for more sink meshes
+        index = SpatialIndex(src_mo)
+        snk_mo.compute_distance(src_mo, attname='dfield2', index=index)
         """
         if option not in ["distance_field", "signed_distance_field"]:
             print("ERROR: 'option' must be 'distance_field' or 'signed_distance_field'")
             return
+        if index is not None:
+            if option != "distance_field":
+                raise ValueError("A spatial index computes distance_field only")
+            if index.mo is not mo:
+                raise ValueError("Spatial index is not of mesh object " + mo.name)
+            distance = index.nearest(self.to_arrays()["coords"])[0]
+            self._bulk_setatt(attname, distance)
+            return
 
         self.sendline("/".join(["compute", option, self.name, mo.name, attname]))
 
+    def spatial_index(self):
+        """
+        Spatial index of the mesh object, kept between calls
+
+        The index is created at the first call, and read and built again by
+        queries after the mesh object changes. See SpatialIndex.
+
+        :returns: SpatialIndex
+        """
+        if self._index is None:
+            self._index = SpatialIndex(self)
+        return self._index
+
+    def nearest_nodes(self, query_xyz, k=1, radius=None):
+        """
+        Nearest nodes of the mesh object to each query point
+
+        A KD-tree of the node coordinates is built at the first call, kept in
+        the spatial index of the mesh object, and built again only after the
+        coordinates change. The query points are searched in chunks, by numpy
+        operations over each chunk, without new mesh objects or LaGriT
+        commands. Equidistant nodes are broken by the lowest node number.
+
+        :arg query_xyz: Coordinates of query points, n by 3
+        :type query_xyz: numpy.ndarray
+        :arg k: Number of nearest nodes
+        :type k: int
+        :arg radius: Largest distance of returned nodes
+        :type radius: float
+        :returns: Distances and 1-based node numbers, of length n if k is 1 and
+                  n by k otherwise, with distance inf and node 0 where fewer
+                  than k nodes are found
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create()
+            >>> m.createpts_brick_xyz((101,101,101),(0,0,0),(1,1,1))
+            >>> wells = [[0.512, 0.3, 0.5], [0.25, 0.75, 0.1]]
+            >>> distance, node = m.nearest_nodes(wells)
+            >>> # The four nodes within 0.02 of each well, closest first
+            >>> distance, nodes = m.nearest_nodes(wells, k=4, radius=0.02)
+        """
+        return self.spatial_index().nearest(query_xyz, k=k, radius=radius)
+
+    def locate(self, points, tol=1e-8):
+        """
+        Element of the mesh object that contains each point
+
+        A bounding volume hierarchy of the elements is built at the first
+        call, kept in the spatial index of the mesh object, and built again
+        only after the coordinates or elements change. The candidate elements
+        of each chunk of points are tested together, by their barycentric (or
+        isoparametric) weights, without new mesh objects or LaGriT commands.
+        Points in several elements, as on shared faces, are located in the
+        lowest numbered.
+
+        :arg points: Coordinates, n by 3
+        :type points: numpy.ndarray
+        :arg tol: Relative tolerance of the test
+        :type tol: float
+        :returns: 1-based element numbers, 0 for points outside the mesh, and n
+                  by nodes per element weights of the element nodes
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.read('tet.inp')
+            >>> element, barycentric = m.locate([[0.5, 0.5, 0.5], [0.1, 0.2, 0.3]])
+        """
+        return self.spatial_index().locate(points, tol=tol)
+
+    def probe(self, points, attributes, method="linear", tol=1e-8):
+        """
+        Sample attributes of the mesh object at points
+
+        Node attributes are interpolated with the weights of the element
+        that contains each point for 'linear', or taken from the nearest node
+        for 'nearest'. Element attributes, including itetclr, are taken from
+        the element that contains each point. Points are located with locate
+        and nearest_nodes, so repeated probes of a mesh object that does not
+        change reuse the same search trees, and add no mesh objects.
+
+        :arg points: Coordinates, n by 3
+        :type points: numpy.ndarray
+        :arg attributes: Names of node or element attributes
+        :type attributes: str or list(str)
+        :arg method: 'linear' or 'nearest'
+        :type method: str
+        :arg tol: Relative tolerance of the point in element test
+        :type tol: float
+        :returns: OrderedDict of float arrays of length n by attribute, with nan
+                  for points outside the mesh, except nearest node values
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.read('tet.inp')
+            >>> wells = [[0.5, 0.5, 0.5], [0.1, 0.2, 0.3]]
+            >>> values = m.probe(wells, ['pressure', 'itetclr'])
+            >>> print(values['pressure'])
+        """
+        if method not in ("linear", "nearest"):
+            raise ValueError("Unknown probe method " + str(method))
+        if isinstance(attributes, str):
+            attributes = [attributes]
+        index = self.spatial_index()
+        arrays = index.update()
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        element = weights = node = None
+        values = OrderedDict()
+        for att in attributes:
+            key = _ATTRIBUTE_ALIASES.get(att, att)
+            on_nodes = key in arrays["node_attributes"]
+            if on_nodes:
+                source = arrays["node_attributes"][key].astype(numpy.float64)
+                if method == "nearest":
+                    if node is None:
+                        node = index.nearest(points)[1]
+                    values[att] = source[node - 1]
+                    continue
+            elif key == "itetclr":
+                source = arrays["itetclr"].astype(numpy.float64)
+            elif key in arrays["element_attributes"]:
+                source = arrays["element_attributes"][key].astype(numpy.float64)
+            else:
+                raise ValueError("Attribute does not exist: " + att)
+            if element is None:
+                element, weights = index.locate(points, tol=tol)
+                inside = element > 0
+            values[att] = numpy.full(len(points), numpy.nan)
+            if on_nodes:
+                off = arrays["itetoff"][element[inside] - 1]
+                nodes = off[:, None] + numpy.arange(weights.shape[1])
+                nodes = arrays["itet"][numpy.minimum(nodes, len(arrays["itet"]) - 1)]
+                values[att][inside] = (source[nodes - 1] * weights[inside]).sum(axis=1)
+            else:
+                values[att][inside] = source[element[inside] - 1]
+        return values
+
     def compute_extrapolate(self, surf_mo, dir="zpos", attname="zic"):
         """
         Given a 3D mesh and a 2D surface, this command will extrapolate a scalar
@@ -3097,6 +3717,99 @@ class MO(object):
             "sum", attsink, cmosrc, attsrc, stride, boundary_choice, keepatt, set_id
         )
 
+    def upscale_many(self, upscales, cmosrc, mapping=None, keepatt=False):
+        """
+        Upscale several attributes from the nodes of a fine source mesh with one search
+
+        The source nodes within the Voronoi cell of each sink node are found
+        once, by a single upscale command that keeps the source attribute
+        pt_gtg, or are given by the mapping returned by an earlier call.
+        The source mesh is then read with one to_arrays dump, and every
+        attribute is upscaled in numpy by reductions over the source nodes
+        of each sink node, sorted once. As when upscale reuses a kept
+        pt_gtg, source nodes on cell boundaries are only used for the first
+        sink node found.
+        Sink nodes without source nodes are set to 0, and integer sink
+        attributes are rounded to the nearest integer.
+
+        :arg upscales: Tuples of (method, attsink, attsrc), where method is one
+                       of sum, min, max, ariave, harave and geoave, and attsrc
+                       defaults to attsink if None. Missing sink attributes are
+                       added as VDOUBLE.
+        :type upscales: list(tuple)
+        :arg cmosrc: PyLaGriT mesh object source
+        :type cmosrc: PyLaGriT Mesh Object
+        :arg mapping: Sink node numbers of the source nodes returned by an earlier
+                      call with the same meshes, to skip the search
+        :type mapping: numpy.ndarray
+        :arg keepatt: Keep the source attributes pt_gtg and dups_gtg
+        :type keepatt: bool
+        :returns: numpy array of the 1-based sink node number of each source node,
+                  0 for source nodes outside the sink mesh
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> fine = lg.create()
+            >>> fine.createpts_brick_xyz((101,101,11),(0,0,0),(1000,1000,100))
+            >>> for att in ['kx', 'ky', 'kz', 'por']:
+            >>>     fine.addatt(att, value=1.)
+            >>> coarse = lg.create()
+            >>> coarse.createpts_brick_xyz((11,11,3),(0,0,0),(1000,1000,100))
+            >>> mapping = coarse.upscale_many([('harave', 'kx', None), ('harave', 'ky', None),
+            >>>                                ('geoave', 'kz', None), ('ariave', 'por', None)], fine)
+            >>> # Reuse the mapping for later properties of the same meshes
+            >>> fine.addatt('sat', value=0.5)
+            >>> coarse.upscale_many([('ariave', 'sat', None)], fine, mapping=mapping)
+        """
+        upscales = [
+            (method, attsink, attsink if attsrc is None else attsrc)
+            for method, attsink, attsrc in upscales
+        ]
+        for method, attsink, attsrc in upscales:
+            if method not in ("sum", "min", "max", "ariave", "harave", "geoave"):
+                raise ValueError("Unknown upscale method " + str(method))
+        info = self.information()
+        attributes = info["attributes"]
+        for method, attsink, attsrc in upscales:
+            if _ATTRIBUTE_ALIASES.get(attsink, attsink) not in attributes:
+                self.addatt(attsink)
+                attributes[attsink] = {"type": "VDOU"}
+        if mapping is None:
+            method, attsink, attsrc = upscales[0]
+            self.upscale(
+                method,
+                attsink,
+                cmosrc,
+                attsrc,
+                boundary_choice="single",
+                keepatt=True,
+                set_id=True,
+            )
+        arrays = cmosrc.to_arrays()
+        if mapping is None:
+            mapping = arrays["node_attributes"]["pt_gtg"].copy()
+            if not keepatt:
+                cmosrc.delatt(["pt_gtg", "dups_gtg"])
+        sinks = numpy.asarray(mapping) - 1
+        used = numpy.flatnonzero(sinks >= 0)
+        order = used[numpy.argsort(sinks[used], kind="stable")]
+        groups = sinks[order]
+        starts = numpy.flatnonzero(numpy.r_[True, groups[1:] != groups[:-1]])
+        counts = numpy.diff(numpy.r_[starts, len(order)])
+        for method, attsink, attsrc in upscales:
+            key = _ATTRIBUTE_ALIASES.get(attsrc, attsrc)
+            if key not in arrays["node_attributes"]:
+                raise ValueError("Source attribute does not exist: " + attsrc)
+            v = arrays["node_attributes"][key][order].astype(numpy.float64)
+            values = numpy.zeros(info["nodes"])
+            if len(v):
+                values[groups[starts]] = _upscale_reduce(method, v, starts, counts)
+            if attributes[_ATTRIBUTE_ALIASES.get(attsink, attsink)]["type"] == "VINT":
+                values = numpy.rint(values).astype(numpy.int64)
+            self._bulk_setatt(attsink, values)
+        return mapping
+
     def gmv(self, exe=None, filename=None):
         if filename is None:
             filename = self.name + ".gmv"
@@ -3105,15 +3818,50 @@ class MO(object):
         self.sendline("dump/gmv/" + filename + "/" + self.name)
         os.system(self._parent.gmv_exe + " -i " + filename)
 
-    def paraview(self, exe=None, filename=None):
+    def paraview(self, exe=None, filename=None, format="avs"):
+        """
+        Dump mesh object and open it in ParaView
+
+        :arg exe: Path to ParaView executable
+        :type exe: str
+        :arg filename: Name of file to dump
+        :type filename: str
+        :arg format: File format to dump, 'avs' or 'vtu' (binary VTK XML)
+        :type format: str
+        """
+        if format not in ["avs", "vtu"]:
+            raise ValueError("format must be 'avs' or 'vtu'")
         if filename is None:
-            filename = self.name + ".inp"
+            filename = self.name + (".inp" if format == "avs" else ".vtu")
         if exe is not None:
             self._parent.paraview_exe = exe
-        self.sendline("dump/avs/" + filename + "/" + self.name)
+        if format == "vtu":
+            self.dump_vtu(filename)
+        else:
+            self.sendline("dump/avs/" + filename + "/" + self.name)
         os.system(self._parent.paraview_exe + " " + filename)
 
-    def dump(self, filename=None, format=None, *args):
+    def dump(self, filename=None, format=None, *args, compress=None):
+        """
+        Dump mesh object to file
+
+        :arg filename: Name of file (root name for multi-file formats like fehm)
+        :type filename: str
+        :arg format: LaGriT dump format, detected by LaGriT from the extension if None
+        :type format: str
+        :arg compress: Compress output on the fly, 'gz' or 'zst' (requires zstandard).
+                       The compression suffix is appended to each file written.
+        :type compress: str
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> l = PyLaGriT()
+            >>> m = l.create()
+            >>> m.createpts_xyz((3,3,3),(0.,0.,0.),(1.,1.,1.),rz_switch=[1,1,1],connect=True)
+            >>> # Writes cube.inp.gz, uncompressed data never lands on disk
+            >>> m.dump('cube.inp',compress='gz')
+            >>> m2 = l.read('cube.inp.gz')
+        """
         if filename is None and format is None:
             print("Error: At least one of either filename or format option is required")
             return
@@ -3124,7 +3872,6 @@ class MO(object):
                 filename = filename.split(".")[0]
             if format == "stor" and len(args) == 0:
                 filename = filename.split(".")[0]
-            cmd = "/".join(["dump", format, filename, self.name])
         elif format:
             if format in ["avs", "avs2"]:
                 filename = self.name + ".inp"
@@ -3138,6 +3885,14 @@ class MO(object):
                 filename = self.name + ".lg"
             elif format == "exo":
                 filename = self.name + ".exo"
+        if compress is not None:
+            with compressed_output(filename, format, compress) as fname:
+                self._dump(fname, format, args)
+        else:
+            self._dump(filename, format, args)
+
+    def _dump(self, filename, format, args):
+        if format:
             cmd = "/".join(["dump", format, filename, self.name])
         else:
             cmd = "/".join(["dump", filename, self.name])
@@ -3171,18 +3926,197 @@ class MO(object):
             int(element_attr),
         )
 
-    def dump_exo(self, filename, psets=False, eltsets=False, facesets=[]):
+    def dump_vtu(self, filename=None, attributes=None, compression=None):
+        """
+        Dump VTK XML unstructured grid (vtu) file with binary appended arrays
+
+        Cell types are mapped from itettyp, so hybrid meshes are supported.
+
+        :arg filename: Name of vtu file, defaults to <mesh object name>.vtu
+        :type filename: str
+        :arg attributes: Node and element attributes to include, all if None
+        :type attributes: lst(str)
+        :arg compression: None for raw arrays or 'zlib' for zlib compressed arrays
+        :type compression: str
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> l = PyLaGriT()
+            >>> m = l.create()
+            >>> m.createpts_xyz((3,3,3),(0.,0.,0.),(1.,1.,1.),rz_switch=[1,1,1],connect=True)
+            >>> m.dump_vtu('cube.vtu',attributes=['imt1','itetclr'],compression='zlib')
+        """
+        if filename is None:
+            filename = self.name + ".vtu"
+        arrays, node_data, cell_data = self._attribute_arrays(attributes)
+        write_vtu(
+            filename,
+            arrays["coords"],
+            arrays["itet"],
+            arrays["itetoff"],
+            arrays["itettyp"],
+            node_data=node_data,
+            cell_data=cell_data,
+            compression=compression,
+        )
+
+    def dump_xdmf(self, basename=None, attributes=None, time=None, append=False):
+        """
+        Dump XDMF file with flat binary heavy data files
+
+        Writes <basename>.xmf along with little-endian binary files for the
+        coordinates, connectivity and each attribute, each written with a
+        single contiguous write so that visualization tools can memory-map
+        them. With append=True, only the attributes are written as a new
+        time step of an existing XDMF file; geometry is not rewritten.
+
+        :arg basename: Base name of files, defaults to mesh object name
+        :type basename: str
+        :arg attributes: Node and element attributes to include, all if None
+        :type attributes: lst(str)
+        :arg time: Time value of the step, defaults to the step number
+        :type time: float
+        :arg append: Append attributes as a new time step to existing file
+        :type append: bool
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> l = PyLaGriT()
+            >>> m = l.create()
+            >>> m.createpts_xyz((3,3,3),(0.,0.,0.),(1.,1.,1.),rz_switch=[1,1,1],connect=True)
+            >>> m.addatt('temperature')
+            >>> m.dump_xdmf('cube',attributes=['temperature'],time=0.)
+            >>> m.setatt('temperature',20.)
+            >>> m.dump_xdmf('cube',attributes=['temperature'],time=1.,append=True)
+        """
+        if basename is None:
+            basename = self.name
+        arrays, node_data, cell_data = self._attribute_arrays(attributes)
+        if append:
+            append_xdmf(basename, node_data=node_data, cell_data=cell_data, time=time)
+        else:
+            write_xdmf(
+                basename,
+                arrays["coords"],
+                arrays["itet"],
+                arrays["itetoff"],
+                arrays["itettyp"],
+                node_data=node_data,
+                cell_data=cell_data,
+                time=0.0 if time is None else time,
+            )
+
+    def _attribute_arrays(self, attributes=None):
+        # Mesh arrays plus node and element (including itetclr) attributes
+        arrays = self.to_arrays()
+        node_data = arrays["node_attributes"]
+        cell_data = OrderedDict([("itetclr", arrays["itetclr"])])
+        cell_data.update(arrays["element_attributes"])
+        if attributes is not None:
+            node_data = OrderedDict(
+                [(k, v) for k, v in node_data.items() if k in attributes]
+            )
+            cell_data = OrderedDict(
+                [(k, v) for k, v in cell_data.items() if k in attributes]
+            )
+        return arrays, node_data, cell_data
+
+    def to_arrays(self, filename=None):
+        """
+        Get mesh coordinates, connectivity and attributes as numpy arrays
+
+        The mesh object is transferred through a temporary avs2 file that is
+        removed afterwards. See pylagrit.io.read_avs for the returned arrays.
+
+        :arg filename: Name of temporary avs file
+        :type filename: str
+        :returns: dict
+        """
+        if filename is None:
+            filename = "._" + self.name + "_arrays.inp"
+        self.dump(filename, "avs2")
+        try:
+            arrays = read_avs(filename)
+        finally:
+            os.remove(filename)
+        return arrays
+
+    def dump_many(self, dumps, workers=None):
+        """
+        Dump mesh object to several formats concurrently
+
+        The mesh object is written once as a LaGriT binary snapshot, which is
+        read by separate LaGriT sessions that write the formats in parallel.
+        Returns when every file is written.
+
+        :arg dumps: Formats keyed by name, e.g. 'exo', 'fehm', 'pflotran' or
+                    'avs'. Values are the file name, a tuple of positional
+                    arguments or a dict of keyword arguments of the matching
+                    dump_<format> method, or of MO.dump if there is none.
+        :type dumps: dict
+        :arg workers: Number of concurrent LaGriT sessions, defaults to one per format
+        :type workers: int
+        :returns: OrderedDict of seconds taken by the snapshot and by each format
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create_hex()
+            >>> m.createpts_brick_xyz((20,20,20),(0,0,0),(1,1,1))
+            >>> times = m.dump_many({'exo': 'cube.exo', 'fehm': 'cube',
+            >>>                      'pflotran': 'cube', 'avs': 'cube.inp'})
+            >>> print(times)
+        """
+        if workers is None:
+            workers = len(dumps)
+        timings = OrderedDict()
+        t0 = time.time()
+        snapshot = "._" + uuid.uuid4().hex[:12] + ".lg"
+        self.dump(snapshot, "lagrit", "binary")
+        timings["snapshot"] = time.time() - t0
+        try:
+            with ThreadPoolExecutor(max(1, workers)) as pool:
+                futures = OrderedDict(
+                    [
+                        (
+                            format,
+                            pool.submit(
+                                _dump_session,
+                                self._parent.lagrit_exe,
+                                snapshot,
+                                format,
+                                args,
+                            ),
+                        )
+                        for format, args in dumps.items()
+                    ]
+                )
+                for format, future in futures.items():
+                    timings[format] = future.result()
+        finally:
+            os.remove(snapshot)
+        return timings
+
+    def dump_exo(self, filename, psets=False, eltsets=False, facesets=[], native=False):
         """
         Dump exo file
 
+        With native=True the file is written by PyLaGriT's own Exodus II
+        writer (pylagrit.io.write_exodus) from the mesh arrays, so LaGriT
+        does not need to be built with Exodus. Side sets are then read from
+        the faceset files or taken directly from (idelem1, idface1) arrays.
+
         :arg filename: Name of exo file
         :type filename: str
         :arg psets: Boolean indicating that exodus will only include psets
         :type psets: bool
         :arg eltsets: Boolean indicating that exodus will only include element sets
         :type eltsets: bool
-        :arg facesets:  Array of FaceSet objects
+        :arg facesets:  Array of FaceSet objects, or with native=True also
+                        tuples of element and local face number arrays
         :type facesets: lst(FaceSet)
+        :arg native: Write the file with PyLaGriT instead of LaGriT
+        :type native: bool
 
         Example:
             >>> from pylagrit import PyLaGriT
@@ -3193,7 +4127,11 @@ class MO(object):
             >>> m.status (brief=True)
             >>> fs = m.create_boundary_facesets(base_name='faceset_bounds')
             >>> m.dump_exo('cube.exo',facesets=fs.values())
+            >>> m.dump_exo('cube_native.exo',facesets=fs.values(),native=True)
         """
+        if native:
+            self._dump_exo_native(filename, psets, eltsets, facesets)
+            return
         cmd = "/".join(["dump/exo", filename, self.name])
         if psets:
             cmd = "/".join([cmd, "psets"])
@@ -3209,6 +4147,42 @@ class MO(object):
                 cmd += " &\n" + fc.filename
         self.sendline(cmd)
 
+    def _dump_exo_native(self, filename, psets, eltsets, facesets):
+        # Sets are numbered from 1 in the order they were defined, as in
+        # LaGriT's dump/exo
+        arrays = self.to_arrays()
+        node_sets = OrderedDict()
+        node_set_names = {}
+        if psets:
+            for i, name in enumerate(self.pset.keys()):
+                node_sets[i + 1] = self._pset_members(name) + 1
+                node_set_names[i + 1] = name
+        element_sets = OrderedDict()
+        element_set_names = {}
+        if eltsets:
+            for i, name in enumerate(self.eltset.keys()):
+                element_sets[i + 1] = self._eltset_members(name) + 1
+                element_set_names[i + 1] = name
+        side_sets = OrderedDict()
+        for i, fc in enumerate(facesets):
+            if isinstance(fc, FaceSet):
+                fs = read_avs_element_attributes(fc.filename)
+                fc = (fs["idelem1"], fs["idface1"])
+            side_sets[i + 1] = fc
+        write_exodus(
+            filename,
+            arrays["coords"],
+            arrays["itet"],
+            arrays["itetoff"],
+            arrays["itettyp"],
+            arrays["itetclr"],
+            node_sets=node_sets,
+            side_sets=side_sets,
+            element_sets=element_sets,
+            node_set_names=node_set_names,
+            element_set_names=element_set_names,
+        )
+
     def dump_gmv(self, filename, format="binary"):
         self.dump(filename, "gmv", format)
 
@@ -3222,6 +4196,74 @@ class MO(object):
         cmd = ["dump", "zone_imt", filename, self.name, str(imt_value)]
         self.sendline("/".join(cmd))
 
+    def dump_zones_by_attribute(
+        self, attname, filerootname, values=None, zonetype="zone", single_file=True
+    ):
+        """
+        Dump zone files of nodes grouped by the value of an integer node attribute
+
+        Node attributes are transferred once and the nodes of every value are
+        found with a single sort, instead of one dump/zone_imt per value. Zone
+        ids are the attribute values.
+
+        :arg attname: Integer node attribute, e.g. 'imt'
+        :type attname: str
+        :arg filerootname: Root name of zone files. A single file is named
+                           <filerootname>_<attname>.<zonetype>, otherwise
+                           the value is added, <filerootname>_<attname>_<value>.<zonetype>
+        :type filerootname: str
+        :arg values: Values to dump, all values present if None. Values
+                     without nodes are written as empty zones.
+        :type values: lst(int)
+        :arg zonetype: Type of zone file to dump, 'zone' or 'zonn'
+        :type zonetype: str
+        :arg single_file: Write all zones to one file, otherwise one file per value
+        :type single_file: bool
+        :returns: OrderedDict of 1-based node numbers keyed by value
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create()
+            >>> m.createpts_brick_xyz((10,10,10),(0,0,0),(1,1,1))
+            >>> m.setatt('imt',2,stride=[1,500,0])
+            >>> zones = m.dump_zones_by_attribute('imt','cube')
+        """
+        if zonetype not in ["zone", "zonn"]:
+            raise ValueError("zonetype must be 'zone' or 'zonn'")
+        atts = self.to_arrays()["node_attributes"]
+        key = _ATTRIBUTE_ALIASES.get(attname, attname)
+        if key not in atts or atts[key].ndim != 1:
+            raise ValueError("Scalar node attribute " + attname + " not found")
+        att = atts[key]
+        if not numpy.issubdtype(att.dtype, numpy.integer):
+            if not numpy.all(att == numpy.rint(att)):
+                raise ValueError("Zones need integer values of " + attname)
+            att = att.astype(numpy.int64)
+        order = numpy.argsort(att, kind="stable")
+        sorted_att = att[order]
+        if values is None:
+            values = sorted_att[
+                numpy.flatnonzero(numpy.diff(sorted_att, prepend=sorted_att[:1] - 1))
+            ]
+        values = numpy.asarray(values, dtype=numpy.int64).ravel()
+        start = numpy.searchsorted(sorted_att, values, "left")
+        stop = numpy.searchsorted(sorted_att, values, "right")
+        zones = OrderedDict(
+            [(int(v), order[i:j] + 1) for v, i, j in zip(values, start, stop)]
+        )
+        root = filerootname + "_" + attname
+        if single_file:
+            write_zone(root + "." + zonetype, zones, zonn=zonetype == "zonn")
+        else:
+            for v, nodes in zones.items():
+                write_zone(
+                    root + "_" + str(v) + "." + zonetype,
+                    {v: nodes},
+                    zonn=zonetype == "zonn",
+                )
+        return zones
+
     def dump_pflotran(self, filename_root, nofilter_zero=False):
         """
         Dump PFLOTRAN UGE file
@@ -3458,69 +4500,234 @@ class MO(object):
         with open(filename, "w") as f:
             f.write(m_reparsed.toprettyxml(indent="  "))
 
-    def dump_pset(self, filerootname, zonetype="zone", pset=[]):
+    def dump_pset(self, filerootname, zonetype="zone", pset=[], single_file=False):
         """
         Dump zone file of psets
+
+        With single_file, the zone files LaGriT writes for the psets are
+        read and written again as one file.
+
         :arg filerootname: rootname of files to create, pset name will be added to name
         :type filerootname: string
         :arg zonetype: Type of zone file to dump, 'zone' or 'zonn'
         :type zonetype: string
         :arg pset: list of psets to dump, all psets dumped if empty list
         :type pset: list[strings]
+        :arg single_file: Write all psets to <filerootname>.<zonetype>, one zone
+                          per pset named after the pset
+        :type single_file: bool
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create()
+            >>> m.createpts_brick_xyz((10,10,10),(0,0,0),(1,1,1))
+            >>> ps = [m.pset_geom_xyz((0.1*i,0,0),(0.1*i+0.1,1,1)) for i in range(10)]
+            >>> m.dump_pset('slices',pset=ps,single_file=True)
         """
-        if len(pset) == 0:
+        if len(pset) == 0 and not single_file:
             cmd = ["pset", "-all-", zonetype, filerootname, "ascii"]
             self.sendline("/".join(cmd))
-        else:
-            for p in pset:
-                cmd = ["pset", p.name, zonetype, filerootname + "_" + p.name, "ascii"]
+            return
+        names = [p if isinstance(p, str) else p.name for p in pset]
+        if not single_file:
+            for name in names:
+                cmd = ["pset", name, zonetype, filerootname + "_" + name, "ascii"]
                 self.sendline("/".join(cmd))
+            return
+        root = "._" + self.name + "_ps"
+        if len(names) == 0:
+            self.sendline("/".join(["pset", "-all-", zonetype, root, "ascii"]))
+        for name in names:
+            cmd = ["pset", name, zonetype, root + "_" + name, "ascii"]
+            self.sendline("/".join(cmd))
+        files = glob.glob(root + "_*." + zonetype)
+        zones = OrderedDict()
+        pset_names = OrderedDict()
+        try:
+            for f in files:
+                z, n = read_zone(f, names=True)
+                zones.update(z)
+                pset_names.update(n)
+        finally:
+            for f in files:
+                os.remove(f)
+        ids = OrderedDict([(n, zid) for zid, n in sorted(pset_names.items())])
+        if len(names) == 0:
+            names = list(ids)
+        for name in names:
+            if name not in ids:
+                raise ValueError("pset " + name + " not found")
+        write_zone(
+            filerootname + "." + zonetype,
+            OrderedDict([(ids[n], zones[ids[n]]) for n in names]),
+            names=pset_names,
+            zonn=zonetype == "zonn",
+        )
 
     def delete(self):
         self.sendline("cmo/delete/" + self.name)
         del self._parent.mo[self.name]
 
+    def create_facesets(self, eltsets, filenames=None):
+        """
+        Write faceset files for many element sets at once
+
+        The element attributes are dumped once and each element set's members
+        are written by LaGriT as a list of element numbers, so the mesh is not
+        copied or compressed for each faceset. Files are the same as those
+        written by EltSet.create_faceset.
+
+        :arg eltsets: Element sets of this mesh object
+        :type eltsets: list(EltSet or str)
+        :arg filenames: Faceset file names, defaults to faceset_<eltset name>.avs
+        :type filenames: list(str)
+        :returns: OrderedDict of FaceSet objects keyed by element set name
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create_hex()
+            >>> m.createpts_brick_xyz((10,10,10),(0,0,0),(1,1,1))
+            >>> ms = m.extract_surfmesh(external=True)
+            >>> ps = [ms.pset_geom_xyz((0.1*i-0.01,-0.1,-0.1),(0.1*i+0.11,1.1,1.1)) for i in range(9)]
+            >>> es = [p.eltset(membership="exclusive") for p in ps]
+            >>> fs = ms.create_facesets(es)
+        """
+        eltsets = [
+            e if isinstance(e, EltSet) else self.eltset.get(e, EltSet(e, self))
+            for e in eltsets
+        ]
+        if filenames is None:
+            filenames = ["faceset_" + e.name + ".avs" for e in eltsets]
+        tmpfile = "._" + self.name + "_fs.inp"
+        self.dump(tmpfile, "avs2", "0 0 0 2")
+        try:
+            atts = read_avs_element_attributes(tmpfile)
+        finally:
+            os.remove(tmpfile)
+        # Attributes EltSet.create_faceset has always left out
+        for k in ["itetclr0", "itetclr1", "facecol", "idface0", "idelem0"]:
+            atts.pop(k, None)
+        fs = OrderedDict()
+        for eltset, filename in zip(eltsets, filenames):
+            members = self._eltset_members(eltset.name)
+            write_avs_element_attributes(
+                filename, OrderedDict([(k, v[members]) for k, v in atts.items()])
+            )
+            eltset.faceset = FaceSet(filename, eltset)
+            fs[eltset.name] = eltset.faceset
+        return fs
+
+    def _eltset_members(self, name):
+        # Zero based element numbers of an element set, written by LaGriT
+        tmpfile = "._" + self.name + "_es.cellset"
+        self.sendline("/".join(["eltset", name, "write", tmpfile, "ascii"]))
+        try:
+            with open(tmpfile, "rb") as fh:
+                fh.readline()
+                fh.readline()
+                members = numpy.fromstring(fh.read(), dtype=numpy.int64, sep=" ")
+        finally:
+            os.remove(tmpfile)
+        return members - 1
+
+    def _pset_members(self, name):
+        # Zero based node numbers of a pset, written by LaGriT as a zone file
+        root = "._" + self.name + "_ps"
+        self.sendline("/".join(["pset", name, "zone", root, "ascii"]))
+        try:
+            zones = read_zone(root + ".zone")
+        finally:
+            os.remove(root + ".zone")
+        return numpy.concatenate(list(zones.values()) + [numpy.zeros(0, int)]) - 1
+
     def create_boundary_facesets(
-        self, stacked_layers=False, base_name=None, reorder=False, external=True
+        self,
+        stacked_layers=False,
+        base_name=None,
+        reorder=False,
+        external=True,
+        sides=None,
     ):
         """
         Creates facesets for each boundary and writes associated avs faceset file
+
+        Boundary faces are extracted and classified once and every faceset file
+        is written from the classified faces in a single sweep. The files are
+        the same as those written by EltSet.create_faceset.
+
         :arg base_name: base name of faceset files
         :type base_name: str
         :arg stacked_layers: if mesh is created by stack_layers, user layertyp attr to determine top and bottom
         :type stacked_layers: bool
         :arg reorder_on_meds: reorder nodes on cell medians, usually needed for exodus file
         :type reorder_on_meds: bool
+        :arg sides: Side names and the itetclr value (or list of values) of their
+                    faces, defaults to the face normal directions set by settets/normal
+                    (bottom 1, top 2, right 3, back 4, left 5, front 6)
+        :type sides: OrderedDict
         :returns: Dictionary of facesets
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> from collections import OrderedDict
+            >>> lg = PyLaGriT()
+            >>> m = lg.create_hex()
+            >>> m.createpts_brick_xyz((4,4,4),(0,0,0),(1,1,1))
+            >>> fs = m.create_boundary_facesets(base_name='faceset_bounds')
+            >>> # Top and bottom faces together, and the four lateral sides together
+            >>> sides = OrderedDict([('topbot',[1,2]),('lateral',[3,4,5,6])])
+            >>> fs2 = m.create_boundary_facesets(base_name='fs2',sides=sides)
         """
         if base_name is None:
             base_name = "faceset_" + self.name
+        if sides is None:
+            sides = OrderedDict(
+                [
+                    ("bottom", 1),
+                    ("top", 2),
+                    ("right", 3),
+                    ("back", 4),
+                    ("left", 5),
+                    ("front", 6),
+                ]
+            )
         mo_surf = self.extract_surfmesh(reorder=reorder, external=external)
-        mo_surf.addatt("id_side", vtype="vint", rank="scalar", length="nelements")
         mo_surf.settets_normal()
-        mo_surf.copyatt("itetclr", "id_side")
-        mo_surf.delatt("id_side")
-        fs = OrderedDict()
+        arrays = mo_surf.to_arrays()
+        itetclr = arrays["itetclr"]
         if stacked_layers:
-            pbot = mo_surf.pset_attribute("layertyp", -1)
-            ebot = pbot.eltset(membership="exclusive")
-        else:
-            ebot = mo_surf.eltset_attribute("itetclr", 1)
-        fs["bottom"] = ebot.create_faceset(base_name + "_bottom.avs")
-        if stacked_layers:
-            ptop = mo_surf.pset_attribute("layertyp", -2)
-            etop = ptop.eltset(membership="exclusive")
-        else:
-            etop = mo_surf.eltset_attribute("itetclr", 2)
-        fs["top"] = etop.create_faceset(base_name + "_top.avs")
-        er = mo_surf.eltset_attribute("itetclr", 3)
-        fs["right"] = er.create_faceset(base_name + "_right.avs")
-        eback = mo_surf.eltset_attribute("itetclr", 4)
-        fs["back"] = eback.create_faceset(base_name + "_back.avs")
-        el = mo_surf.eltset_attribute("itetclr", 5)
-        fs["left"] = el.create_faceset(base_name + "_left.avs")
-        ef = mo_surf.eltset_attribute("itetclr", 6)
-        fs["front"] = ef.create_faceset(base_name + "_front.avs")
+            # Faces with all nodes on the bottom (-1) or top (-2) layer
+            layertyp = arrays["node_attributes"]["layertyp"]
+            itet = arrays["itet"] - 1
+            offsets = arrays["itetoff"]
+            if len(itet):
+                bottom = numpy.minimum.reduceat(layertyp[itet] == -1, offsets)
+                top = numpy.minimum.reduceat(layertyp[itet] == -2, offsets)
+            else:
+                bottom = top = numpy.zeros(0, dtype=bool)
+        # Attributes written by EltSet.create_faceset
+        atts = OrderedDict(
+            [
+                (k, v)
+                for k, v in arrays["element_attributes"].items()
+                if k not in ["itetclr0", "itetclr1", "facecol", "idface0", "idelem0"]
+            ]
+        )
+        fs = OrderedDict()
+        for side, value in sides.items():
+            if stacked_layers and side == "bottom":
+                members = bottom
+            elif stacked_layers and side == "top":
+                members = top
+            else:
+                members = numpy.isin(itetclr, value)
+            filename = base_name + "_" + side + ".avs"
+            write_avs_element_attributes(
+                filename, OrderedDict([(k, v[members]) for k, v in atts.items()])
+            )
+            fs[side] = FaceSet(filename, mo_surf)
         return fs
 
     def createpts(
@@ -4274,6 +5481,132 @@ class MO(object):
         """
         self.connect(option1="check_interface")
 
+    def connect_parallel(
+        self,
+        tiles=2,
+        overlap=None,
+        workers=None,
+        tile_function=None,
+        name=None,
+        resetpts_itp=True,
+    ):
+        """
+        Connect the nodes into a Delaunay tetrahedral mesh by overlapping tiles
+
+        The bounding box of the nodes is split into tiles that are connected
+        concurrently in separate LaGriT sessions, each with the nodes of its
+        tile and an overlap around it. Every tile keeps the tetrahedra whose
+        centroid lies in the tile, so each tetrahedron is kept by exactly one
+        tile. A tile with tetrahedra that cover part of it and have
+        circumspheres reaching past its overlap is connected again with twice
+        the overlap, so kept tetrahedra are those of the Delaunay mesh of all
+        nodes. The tiles are merged with addmesh/merge and the interface
+        nodes filtered.
+
+        The convex hull of a subset of the nodes differs from that of all
+        nodes, so each tile is connected inside a frame of eight nodes at
+        the corners of the bounding box grown by its size on every side,
+        and tetrahedra connected to the frame are removed, much as connect
+        removes its enclosing tetrahedron. Flat tetrahedra on the convex hull
+        whose circumspheres reach the frame are not part of the mesh, so the
+        mesh does not depend on the number of tiles but may differ from that
+        of connect near the convex hull.
+
+        Interfaces are checked before merging: every face between a kept and
+        a discarded tetrahedron of a tile must be a face of exactly one other
+        tile. Nodes in degenerate positions (more than four on a sphere, as
+        in regular grids) have more than one Delaunay mesh and tiles may
+        disagree on it, which raises an error.
+
+        :arg tiles: Number of tiles, or number of tiles along x, y and z
+        :type tiles: int or tuple(int,int,int)
+        :arg overlap: Width of overlap, defaults to three times the mean node spacing
+        :type overlap: float
+        :arg workers: Number of concurrent LaGriT sessions, defaults to the number of CPUs
+        :type workers: int
+        :arg tile_function: Function called with the mesh object of each tile
+                            after connect, e.g. to set attributes. It runs in
+                            the tile's LaGriT session and must not add or move
+                            nodes, so that interfaces still match.
+        :type tile_function: function
+        :arg name: Name of the connected mesh object
+        :type name: str
+        :arg resetpts_itp: Reset node types of the connected mesh object
+        :type resetpts_itp: bool
+        :returns: MO
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create()
+            >>> m.createpts_brick_xyz((40,40,40),(0,0,0),(1,1,1))
+            >>> # Perturb the grid so that its Delaunay mesh is unique
+            >>> m.perturb(0.005,0.005,0.005)
+            >>> tet = m.connect_parallel(tiles=8)
+        """
+        arrays = self.to_arrays()
+        coords = arrays["coords"]
+        node_attributes = arrays["node_attributes"]
+        mins = coords.min(axis=0)
+        maxs = coords.max(axis=0)
+        extent = maxs - mins
+        if numpy.any(extent <= 0.0):
+            raise ValueError("connect_parallel needs nodes spanning three dimensions")
+        if isinstance(tiles, int):
+            tiles = _split_tiles(tiles, extent)
+        if overlap is None:
+            overlap = 3.0 * (numpy.prod(extent) / len(coords)) ** (1.0 / 3.0)
+        edges = [numpy.linspace(mins[i], maxs[i], tiles[i] + 1) for i in range(3)]
+        # Every tile is connected within the same frame, so that all tiles
+        # share the frame as their outer boundary
+        frame = numpy.array(list(product(*zip(mins - extent, maxs + extent))))
+        indices = list(product(*[range(n) for n in tiles]))
+        root = "._" + uuid.uuid4().hex[:12]
+        files = [root + "_t%d.inp" % i for i in range(len(indices))]
+        if workers is None:
+            workers = os.cpu_count()
+        try:
+            with ThreadPoolExecutor(max(1, min(workers, len(indices)))) as pool:
+                futures = [
+                    pool.submit(
+                        _connect_tile,
+                        self._parent.lagrit_exe,
+                        f,
+                        coords,
+                        node_attributes,
+                        frame,
+                        edges,
+                        index,
+                        overlap,
+                        tile_function,
+                    )
+                    for f, index in zip(files, indices)
+                ]
+                faces = [future.result() for future in futures]
+            unmatched = _unmatched_faces(faces)
+            if unmatched:
+                raise ValueError(
+                    "%d tile interface faces do not match; nodes may be in "
+                    "degenerate positions" % unmatched
+                )
+            mos = [self._parent.read(f) for f in files]
+        finally:
+            for f in files:
+                if os.path.exists(f):
+                    os.remove(f)
+        if len(mos) == 1:
+            mo = mos[0]
+            if name is not None:
+                self.sendline("/".join(["cmo", "move", name, mo.name]))
+                del self._parent.mo[mo.name]
+                mo = self._parent.mo[name] = MO(name, self._parent)
+        else:
+            mo = self._parent.merge(mos, name=name)
+            for m in mos:
+                m.delete()
+        mo.rmpoint_compress(filter_bool=True, resetpts_itp=resetpts_itp)
+        return mo
+
     def copypts(self, elem_type="tet", name=None):
         """
         Copy points from mesh object to new mesh object
@@ -4330,6 +5663,10 @@ class MO(object):
         """
         Refine mesh at locations that intersect another mesh object
 
+        Elements are only limited to fewer than level refinements if the
+        mesh has been refined before, since elements refined here have at
+        most as many refinements as passes made so far.
+
         :arg mo: Mesh object to intersect with current mesh object to determine where to refine
         :type mo: PyLaGriT mesh object
         :arg level: max level of refinement
@@ -4346,16 +5683,18 @@ class MO(object):
         if level is None:
             level = 1
             itetlevbool = False
+        # itetlev is added by the first refine
+        if itetlevbool:
+            itetlevbool = "itetlev" in self.information()["attributes"]
         for i in range(level):
             attr_name = self.intersect_elements(mo)
             if itetlevbool:
-                e_attr = self.eltset_attribute(attr_name, 0, boolstr="gt")
-                e_level = self.eltset_attribute("itetlev", level, boolstr="lt")
-                e_refine = self.eltset_bool([e_attr, e_level], boolstr="inter")
-                e_attr.delete()
+                # clear the flag of elements at the maximum level instead of
+                # intersecting two eltsets
+                e_level = self.eltset_attribute("itetlev", level, boolstr="ge")
+                e_level.setatt(attr_name, 0)
                 e_level.delete()
-            else:
-                e_refine = self.eltset_attribute(attr_name, 0, boolstr="gt")
+            e_refine = self.eltset_attribute(attr_name, 0, boolstr="gt")
             if prd_choice is not None:
                 p_refine = e_refine.pset()
                 p_refine.refine(prd_choice=prd_choice)
@@ -4367,9 +5706,88 @@ class MO(object):
             attr_name = self.intersect_elements(mo)
             e_attr = self.eltset_attribute(attr_name, 0, boolstr="gt")
             p = e_attr.pset()
-            p.setatt("imt", 13)
+            p.setatt("imt", imt)
             p.delete()
 
+    def refine_to_size(self, size_fn, max_passes=10, tol=0.0):
+        """
+        Refine elements until their edges are no longer than a target size
+
+        Each pass reads the mesh once, evaluates size_fn at the centroids
+        of all elements in numpy, and refines the elements whose longest
+        edge is more than (1 + tol) times their target size in a single
+        refine/eltset. Parent elements kept by octree refinement of hex
+        and quad meshes are skipped. Passes stop when no element is too
+        large, after max_passes, or when refinement no longer changes the
+        mesh.
+
+        :arg size_fn: Function of an (n, 3) array of element centroids returning
+                      the n target element sizes, or a constant size
+        :type size_fn: function or float
+        :arg max_passes: Maximum number of refinement passes
+        :type max_passes: int
+        :arg tol: Relative tolerance on target sizes
+        :type tol: float
+        :returns: OrderedDict with the number of elements refined in each pass
+                  ('refined'), the number of 'passes' and whether all elements
+                  met their target size ('converged')
+
+        Example:
+            >>> import numpy
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create_hex()
+            >>> m.createpts_brick_xyz((5,5,5),(0,0,0),(1,1,1))
+            >>> # Elements half as large within 0.5 of the origin
+            >>> size = lambda xyz: numpy.where(numpy.linalg.norm(xyz, axis=1) < 0.5, 0.15, 1.)
+            >>> result = m.refine_to_size(size)
+            >>> print(result['passes'], result['converged'])
+        """
+        flag = "refine_size"
+        added = False
+        refined = []
+        converged = False
+        nelements = None
+        while True:
+            arrays = self.to_arrays()
+            n = len(arrays["itetoff"])
+            if n == nelements:
+                # The last pass did not refine anything
+                break
+            nelements = n
+            leaves = numpy.arange(n)
+            if "itetkid" in arrays["element_attributes"]:
+                leaves = numpy.flatnonzero(arrays["element_attributes"]["itetkid"] == 0)
+            centroids = _centroids(arrays, leaves)
+            if callable(size_fn):
+                target = numpy.asarray(size_fn(centroids), dtype=float)
+            else:
+                target = numpy.full(len(leaves), float(size_fn))
+            lengths = _max_edge_length(arrays, leaves)
+            bad = leaves[lengths > (1 + tol) * target]
+            if bad.size == 0:
+                converged = True
+                break
+            if len(refined) == max_passes:
+                break
+            if not added:
+                self.addatt(flag, vtype="VINT", length="nelements")
+                added = True
+            values = numpy.zeros(n, dtype=numpy.int64)
+            values[bad] = 1
+            self._bulk_setatt(flag, values, ids=bad, reset=True)
+            e = self.eltset_attribute(flag, 0, boolstr="gt")
+            e.refine()
+            e.delete()
+            refined.append(bad.size)
+        if added:
+            self.delatt(flag)
+        result = OrderedDict()
+        result["refined"] = refined
+        result["passes"] = len(refined)
+        result["converged"] = converged
+        return result
+
     def intersect_elements(self, mo, attr_name=None):
         """
         This command takes two meshes and creates an element-based attribute in mesh1
@@ -4414,10 +5832,28 @@ class MO(object):
         flag_option=None,
         keep_option=None,
         interp_function=None,
+        index=None,
     ):
         """
         Interpolate values from attribute attsrc from mesh object cmosrc to current mesh object
+
+        With a spatial index of cmosrc, sink points are located in the index,
+        with ties to the lowest element and node numbers, and interpolation
+        is done by interpolate_many without a LaGriT search.
         """
+        if index is not None:
+            if list(stride) != [1, 0, 0] or keep_option or interp_function:
+                raise ValueError(
+                    "A spatial index interpolates all sink points, without options"
+                )
+            self.interpolate_many(
+                method,
+                [(attsink, attsrc)],
+                cmosrc,
+                flag_option=flag_option,
+                index=index,
+            )
+            return
         stride = [str(v) for v in stride]
         cmd = [
             "interpolate",
@@ -4439,10 +5875,197 @@ class MO(object):
         self.sendline("/".join(cmd))
 
     def interpolate_voronoi(
-        self, attsink, cmosrc, attsrc, stride=[1, 0, 0], interp_function=None
+        self,
+        attsink,
+        cmosrc,
+        attsrc,
+        stride=[1, 0, 0],
+        interp_function=None,
+        index=None,
     ):
         self.interpolate("voronoi", **minus_self(locals()))
 
+    def interpolate_many(
+        self,
+        method,
+        atts,
+        cmosrc,
+        tie_option=None,
+        flag_option=None,
+        plan=None,
+        keepatt=False,
+        index=None,
+    ):
+        """
+        Interpolate several attributes from a source mesh object with one search
+
+        The sink nodes, or element centroids for element sink attributes,
+        are located in cmosrc once, by an interpolate command that keeps
+        the el_gtg and pt_gtg attributes of the enclosing source element
+        and nearest source node, or are given by the plan returned by an
+        earlier call. Every attribute is then interpolated in numpy by a
+        gather from the source mesh, read with one to_arrays dump: element
+        values for map, nearest node values for voronoi, and node values
+        weighted by the isoparametric weights of the sink points in their
+        elements for continuous. As with keepatt, ties are broken once, by
+        the values of the first attribute.
+
+        Without a plan or index, the search costs one LaGriT interpolate of
+        the first attribute and a dump of the sink mesh object, on top of
+        the dump of cmosrc, so the call is worth it from two attributes on.
+        The values LaGriT gives the first attribute are replaced by the
+        gather, so that continuous values in hexes, prisms and pyramids are
+        isoparametric for every attribute, unlike those of interpolate.
+
+        With a spatial index of cmosrc, the source mesh object is read from
+        the index, and sink points are located in it, rather than by LaGriT,
+        with ties to the lowest element and node numbers.
+
+        :arg method: Interpolation method, 'map', 'continuous' or 'voronoi'
+        :type method: str
+        :arg atts: Tuples of (attsink, attsrc), where attsrc defaults to attsink if
+                   None. Missing sink attributes are added as VDOUBLE node attributes.
+                   Element sink attributes must be integer.
+        :type atts: list(tuple)
+        :arg cmosrc: PyLaGriT mesh object source
+        :type cmosrc: PyLaGriT Mesh Object
+        :arg tie_option: 'tiemax' or 'tiemin'
+        :type tie_option: str
+        :arg flag_option: Value of sink points outside the source mesh, 'plus1'
+                          (default) for one more than the source maximum, a number,
+                          or 'nearest,<node attribute>' for the value of an attribute
+                          at the nearest source node
+        :type flag_option: str or float
+        :arg plan: InterpolationPlan returned by an earlier call with the same meshes
+                   and method, to skip the search
+        :type plan: InterpolationPlan
+        :arg keepatt: Keep the sink attributes el_gtg and pt_gtg of a LaGriT search
+        :type keepatt: bool
+        :arg index: Spatial index of cmosrc
+        :type index: SpatialIndex
+        :returns: InterpolationPlan
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> fine = lg.create_tet()
+            >>> fine.createpts_brick_xyz((21,21,21),(0,0,0),(1,1,1))
+            >>> fine.connect()
+            >>> for att in ['perm', 'por', 'sat']:
+            >>>     fine.addatt(att, value=1.)
+            >>> coarse = lg.create()
+            >>> coarse.createpts_brick_xyz((6,6,6),(0.1,0.1,0.1),(0.9,0.9,0.9))
+            >>> plan = coarse.interpolate_many('continuous', [('perm', None), ('por', None)], fine)
+            >>> # Later attributes reuse the located sink points
+            >>> coarse.interpolate_many('continuous', [('sat', None)], fine, plan=plan)
+            >>> # Nearest nodes from an index kept for other sink meshes
+            >>> index = SpatialIndex(fine)
+            >>> coarse.interpolate_many('voronoi', [('perm', None)], fine, index=index)
+        """
+        if method not in ("map", "continuous", "voronoi"):
+            raise ValueError("Unknown interpolation method " + str(method))
+        atts = [
+            (attsink, attsink if attsrc is None else attsrc) for attsink, attsrc in atts
+        ]
+        attributes = self.information()["attributes"]
+        for attsink, attsrc in atts:
+            if _ATTRIBUTE_ALIASES.get(attsink, attsink) not in attributes:
+                self.addatt(attsink)
+                attributes[attsink] = {"type": "VDOU", "length": "nnodes"}
+        sinks = [attributes[_ATTRIBUTE_ALIASES.get(a, a)] for a, b in atts]
+        elements = sinks[0]["length"] == "nelements"
+        if any((s["length"] == "nelements") != elements for s in sinks):
+            raise ValueError("Sink attributes must all be node or element attributes")
+        if elements and any(s["type"] != "VINT" for s in sinks):
+            raise ValueError("Element sink attributes must be integer")
+        if index is None:
+            src = cmosrc.to_arrays()
+        elif index.mo is not cmosrc:
+            raise ValueError("Spatial index is not of mesh object " + cmosrc.name)
+        else:
+            src = index.arrays
+        if plan is None:
+            if index is None:
+                # LaGriT locates the sink points by interpolating the first
+                # attribute, whose values are replaced by the gather below
+                attsink, attsrc = atts[0]
+                self.interpolate(
+                    method,
+                    attsink,
+                    cmosrc,
+                    attsrc,
+                    tie_option=tie_option,
+                    flag_option=flag_option,
+                    keep_option="keepatt",
+                )
+            arrays = self.to_arrays()
+            if elements:
+                points = _centroids(arrays, numpy.arange(len(arrays["itetoff"])))
+            else:
+                points = arrays["coords"]
+            if index is None:
+                found = arrays["element_attributes" if elements else "node_attributes"]
+                if not keepatt:
+                    self.delatt([a for a in ["el_gtg", "pt_gtg"] if a in found])
+                element, node = found.get("el_gtg"), found.get("pt_gtg")
+            else:
+                element = node = None
+                if method != "voronoi":
+                    element = index.locate(points)[0]
+                if method == "voronoi" or str(flag_option).startswith("nearest"):
+                    node = index.nearest(points)[1]
+            plan = InterpolationPlan(
+                method, self.name, cmosrc.name, elements, element, node
+            )
+            if method == "continuous":
+                inside = numpy.flatnonzero(plan.element > 0)
+                plan.nodes = numpy.zeros((len(points), 8), dtype=numpy.int64)
+                plan.weights = numpy.zeros((len(points), 8))
+                plan.nodes[inside], plan.weights[inside] = _element_weights(
+                    src, plan.element[inside] - 1, points[inside]
+                )
+        elif (plan.method, plan.sink, plan.source, plan.elements) != (
+            method,
+            self.name,
+            cmosrc.name,
+            elements,
+        ):
+            raise ValueError("Interpolation plan is for other mesh objects or method")
+        for (attsink, attsrc), sink in zip(atts, sinks):
+            key = _ATTRIBUTE_ALIASES.get(attsrc, attsrc)
+            if key == "itetclr":
+                source = src["itetclr"]
+            elif method == "map":
+                source = src["element_attributes"].get(key)
+            else:
+                source = src["node_attributes"].get(key)
+            if source is None:
+                raise ValueError("Source attribute does not exist: " + attsrc)
+            source = source.astype(numpy.float64)
+            if method == "voronoi":
+                values = source[plan.node - 1]
+            else:
+                inside = plan.element > 0
+                if method == "map":
+                    values = source[plan.element - 1]
+                else:
+                    values = (source[plan.nodes] * plan.weights).sum(axis=1)
+                if flag_option is None or flag_option == "plus1":
+                    values[~inside] = source.max(initial=0) + 1
+                elif str(flag_option).startswith("nearest"):
+                    att = flag_option.split(",")[1].strip()
+                    nearest = src["node_attributes"][_ATTRIBUTE_ALIASES.get(att, att)]
+                    values[~inside] = nearest[plan.node[~inside] - 1]
+                else:
+                    values[~inside] = float(flag_option)
+            if sink["type"] == "VINT":
+                values = numpy.rint(values).astype(numpy.int64)
+            if elements:
+                self._bulk_setatt(attsink, values, ids=numpy.arange(len(values)))
+            else:
+                self._bulk_setatt(attsink, values)
+        return plan
+
     def interpolate_map(
         self,
         attsink,
@@ -4692,7 +6315,7 @@ class MO(object):
                     "amr " + str(prd_choice),
                 ]
             )
-        self._parent.sendline(cmd)
+        self.sendline(cmd)
 
     def regnpts(
         self,
@@ -4925,6 +6548,86 @@ class MO(object):
             cmd.append("checkaxy")
         self.sendline("/".join(cmd))
 
+    def improve(
+        self,
+        strategy=("smooth", "recon"),
+        target="aspect",
+        min_gain=1e-3,
+        max_iters=10,
+        threshold=0.5,
+    ):
+        """
+        Smooth and reconnect the mesh until its element quality stops improving
+
+        Instead of a fixed number of smooth and recon calls, sweeps of the
+        strategy steps are repeated while the mean element quality improves
+        by at least min_gain. Quality is computed with quality/aspect or
+        quality/edge_ratio and its saved attribute is read with to_arrays
+        after every sweep. The first sweep covers the whole mesh, later
+        sweeps only smooth the nodes of elements still below threshold.
+
+        :arg strategy: Steps of a sweep, 'smooth', 'recon' (recon/0), or functions
+                       called with the mesh object and the PSet of nodes to improve,
+                       which is None for the whole mesh
+        :type strategy: list
+        :arg target: Quality measure, 'aspect' or 'edge_ratio', 1 for ideal elements
+        :type target: str
+        :arg min_gain: Smallest increase of the mean quality worth another sweep
+        :type min_gain: float
+        :arg max_iters: Maximum number of sweeps
+        :type max_iters: int
+        :arg threshold: Quality below which elements are improved in later sweeps
+        :type threshold: float
+        :returns: OrderedDict with the mean quality before and after each sweep
+                  ('mean'), the number of elements below threshold ('bad'), and
+                  the number of 'sweeps'
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> motri = lg.tri_mo_from_polyline([[0,0,0],[0,1000,0],[2200,200,0],[2200,0,0]])
+            >>> motri.triangulate()
+            >>> motri.refine(refine_option='rivara',refine_type='edge',values=[75],inclusive_flag='inclusive')
+            >>> result = motri.improve(min_gain=1e-4)
+            >>> print(result['sweeps'], result['mean'][-1])
+        """
+        att = {"aspect": "aratio", "edge_ratio": "eratio"}.get(target)
+        if att is None:
+            raise ValueError("Unknown quality target " + str(target))
+        existed = att in self.information()["attributes"]
+        result = OrderedDict([("mean", []), ("bad", []), ("sweeps", 0)])
+        for i in range(max_iters + 1):
+            self.quality(quality_type=target, save_att=True)
+            values = self.to_arrays()["element_attributes"][att]
+            result["mean"].append(float(values.mean()) if values.size else 1.0)
+            result["bad"].append(int((values < threshold).sum()))
+            if i == max_iters or result["bad"][-1] == 0:
+                break
+            if i > 0 and result["mean"][-1] - result["mean"][-2] < min_gain:
+                break
+            pset = None
+            if i > 0:
+                e = self.eltset_attribute(att, threshold, boolstr="lt")
+                pset = e.pset()
+                e.delete()
+            for step in strategy:
+                if callable(step):
+                    step(self, pset)
+                elif step == "smooth" and pset is None:
+                    self.smooth()
+                elif step == "smooth":
+                    pset.smooth()
+                elif step == "recon":
+                    self.recon(0)
+                else:
+                    raise ValueError("Unknown improvement step " + str(step))
+            if pset is not None:
+                pset.delete()
+            result["sweeps"] += 1
+        if not existed:
+            self.delatt(att)
+        return result
+
     def filter(self, stride=[1, 0, 0], tolerance=None, boolean=None, attribute=None):
         stride = [str(v) for v in stride]
         cmd = ["filter", " ".join(stride)]
@@ -5096,6 +6799,87 @@ class MO(object):
                 cmd.append(a)
         self.sendline("/".join(cmd))
 
+    def quality_report(
+        self,
+        metrics=("aspect", "edge_ratio", "volume", "dihedral_min"),
+        bins=10,
+        worst=10,
+    ):
+        """
+        Element quality metrics as arrays, with histograms and worst elements
+
+        The LaGriT measures aspect, edge_ratio, edge_min and edge_max are
+        saved with quality/<metric>/y and volume (area of 2D elements) with
+        cmo/addatt/volume, and all of them are read with a single to_arrays
+        dump instead of from printed summaries. dihedral_min, the smallest
+        dihedral angle of 3D elements or interior angle of 2D elements in
+        degrees, is computed in numpy from coordinates and connectivity.
+        Attributes added for the report are deleted again.
+
+        :arg metrics: Metrics to report, from 'aspect', 'edge_ratio', 'edge_min',
+                      'edge_max', 'volume' and 'dihedral_min'
+        :type metrics: list(str)
+        :arg bins: Number of bins or bin edges of histograms
+        :type bins: int or list(float)
+        :arg worst: Number of worst (smallest) elements to report for each metric
+        :type worst: int
+        :returns: OrderedDict keyed by metric of OrderedDicts with the per element
+                  'values', 'min', 'mean' and 'max', the 'histogram' as
+                  (counts, bin_edges), and the 1-based element numbers of the
+                  'worst' elements, smallest value first
+
+        Example:
+            >>> from pylagrit import PyLaGriT
+            >>> lg = PyLaGriT()
+            >>> m = lg.create()
+            >>> m.createpts_brick_xyz((11,11,11),(0,0,0),(1,1,1))
+            >>> m.connect()
+            >>> report = m.quality_report(bins=20, worst=5)
+            >>> counts, edges = report['aspect']['histogram']
+            >>> assert report['dihedral_min']['min'] > 10.
+        """
+        saved = OrderedDict(
+            [
+                ("aspect", "aratio"),
+                ("edge_ratio", "eratio"),
+                ("edge_min", "edgemin"),
+                ("edge_max", "edgemax"),
+                ("volume", "qvolume"),
+            ]
+        )
+        for metric in metrics:
+            if metric not in saved and metric != "dihedral_min":
+                raise ValueError("Unknown quality metric " + str(metric))
+        existing = self.information()["attributes"]
+        added = []
+        for metric in metrics:
+            if metric in saved and saved[metric] not in existing:
+                added.append(saved[metric])
+            if metric == "volume":
+                self.addatt(saved[metric], keyword="volume")
+            elif metric in saved:
+                self.quality(quality_type=metric, save_att=True)
+        arrays = self.to_arrays()
+        if added:
+            self.delatt(added)
+        report = OrderedDict()
+        for metric in metrics:
+            if metric == "dihedral_min":
+                values = _min_angle(arrays)
+            else:
+                values = arrays["element_attributes"][saved[metric]]
+            finite = values[numpy.isfinite(values)]
+            result = OrderedDict()
+            result["values"] = values
+            result["min"] = float(finite.min()) if finite.size else numpy.nan
+            result["mean"] = float(finite.mean()) if finite.size else numpy.nan
+            result["max"] = float(finite.max()) if finite.size else numpy.nan
+            result["histogram"] = numpy.histogram(finite, bins=bins)
+            order = numpy.argsort(numpy.where(numpy.isnan(values), numpy.inf, values))
+            result["worst"] = order[: min(worst, finite.size)] + 1
+            report[metric] = result
+        return report
+
     def quality_aspect(self, save_att=False):
         self.quality(quality_type="aspect", save_att=save_att)
 
@@ -5157,6 +6941,185 @@ class MO(object):
         self.rmmat(material_number, option="node", exclusive=exclusive)
 
 
+class InterpolationPlan(object):
+    """
+    Sink points of a mesh object located in a source mesh object
+
+    Returned by MO.interpolate_many, and passed back to it to interpolate
+    more attributes between the same mesh objects without a new search.
+    element and node are the 1-based enclosing source element (0 outside)
+    and nearest source node of each sink point, where found, and nodes and
+    weights the 0-based source nodes and weights of continuous plans.
+    """
+
+    def __init__(self, method, sink, source, elements, element, node):
+        self.method = method
+        self.sink = sink
+        self.source = source
+        self.elements = elements
+        self.element = element
+        self.node = node
+        self.nodes = None
+        self.weights = None
+
+    def __repr__(self):
+        return "InterpolationPlan(%s, %s, %s)" % (self.method, self.source, self.sink)
+
+
+class SpatialIndex(object):
+    """
+    Search structures over a mesh object, kept between queries
+
+    The mesh object is read once, with to_arrays, and a KD-tree of its
+    nodes and a bounding volume hierarchy of its elements are built when
+    first needed. Commands sent to the PyLaGriT session that change the mesh
+    object, that is name it before any other mesh object or name none while
+    it is selected, make the index stale, and it is read again by the next
+    query. The trees are built again only if the node coordinates or the
+    elements changed, so that an index of a mesh object that does not move
+    is searched many times without new search structures, also while other
+    mesh objects are written to.
+
+    :arg mo: Mesh object to index
+    :type mo: PyLaGriT Mesh Object
+    :arg leafsize: Largest number of nodes or elements in a leaf of the trees
+    :type leafsize: int
+
+    Example:
+        >>> from pylagrit import PyLaGriT, SpatialIndex
+        >>> lg = PyLaGriT()
+        >>> src = lg.create()
+        >>> src.createpts_brick_xyz((21,21,21),(0,0,0),(1,1,1))
+        >>> index = SpatialIndex(src)
+        >>> for i in range(10):
+        >>>     snk = lg.create()
+        >>>     snk.createpts_brick_xyz((6,6,6),(0.1*i,0,0),(1,1,1))
+        >>>     snk.compute_distance(src, index=index)
+    """
+
+    def __init__(self, mo, leafsize=LEAFSIZE):
+        self.mo = mo
+        self.leafsize = leafsize
+        self._changes = None
+        self._arrays = None
+        self._nodes = None
+        self._elements = None
+
+    def __repr__(self):
+        return "SpatialIndex(%s)" % self.mo.name
+
+    @property
+    def stale(self):
+        """True if the mesh object changed since it was read"""
+        return self._changes != self._count()
+
+    def _count(self):
+        # Commands counted against the mesh object and against no known one
+        changes = self.mo._parent._changes
+        return changes.get(self.mo.name, 0), changes.get(None, 0)
+
+    @property
+    def arrays(self):
+        """Arrays of the mesh object, as returned by to_arrays"""
+        return self.update()
+
+    def update(self, force=False):
+        """
+        Read the mesh object again if it changed since it was read
+
+        :arg force: Read the mesh object even if the index is not stale
+        :type force: bool
+        :returns: Arrays of the mesh object, as returned by to_arrays
+        """
+        if force or self.stale:
+            arrays = self.mo.to_arrays()
+            # Commands that change attributes only keep the search structures
+            previous = self._arrays or {}
+            if not numpy.array_equal(arrays["coords"], previous.get("coords")):
+                self._nodes = None
+                self._elements = None
+            elif not all(
+                numpy.array_equal(arrays[key], previous[key])
+                for key in ["itet", "itetoff", "itettyp"]
+            ):
+                self._elements = None
+            self._arrays = arrays
+            self._changes = self._count()
+        return self._arrays
+
+    def nearest(self, points, k=1, radius=None):
+        """
+        Nearest nodes of the mesh object to each point
+
+        Equidistant nodes are broken by the lowest node number.
+
+        :arg points: Coordinates, n by 3
+        :type points: numpy.ndarray
+        :arg k: Number of nearest nodes
+        :type k: int
+        :arg radius: Largest distance of returned nodes
+        :type radius: float
+        :returns: Distances and 1-based node numbers, of length n if k is 1 and
+                  n by k otherwise, with distance inf and node 0 where fewer
+                  than k nodes are found
+        """
+        coords = self.update()["coords"]
+        if self._nodes is None:
+            self._nodes = KDTree(coords, self.leafsize)
+        distance, index = self._nodes.query(points, k=k, radius=radius)
+        return distance, index + 1
+
+    def locate(self, points, tol=1e-8):
+        """
+        Element of the mesh object that contains each point
+
+        Candidate elements are those whose bounding boxes, widened by tol
+        times their size, contain the point, and a point is in a candidate
+        if its weights are no less than -tol and it is within tol times the
+        element size of the element, which may be of lower dimension than
+        the space. Points in several elements, as on shared faces, are
+        located in the lowest numbered.
+
+        :arg points: Coordinates, n by 3
+        :type points: numpy.ndarray
+        :arg tol: Relative tolerance of the test
+        :type tol: float
+        :returns: 1-based element numbers, 0 for points outside the mesh, and n
+                  by nodes per element weights of the element nodes, barycentric
+                  in lines, triangles and tets, and isoparametric in quads,
+                  pyramids, prisms and hexes
+        """
+        arrays = self.update()
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        element = numpy.zeros(len(points), dtype=numpy.int64)
+        width = NODES_PER_ELEMENT[arrays["itettyp"]].max(initial=0)
+        weights = numpy.zeros((len(points), width))
+        if len(arrays["itettyp"]) == 0:
+            return element, weights
+        if self._elements is None:
+            elements = numpy.arange(len(arrays["itettyp"]))
+            lo, hi = _element_boxes(arrays, elements)
+            pad = tol * (hi - lo).max(axis=1)[:, None]
+            self._elements = BVH(lo - pad, hi + pad, self.leafsize)
+        tree = self._elements
+        # Points in the order of the leaves of the tree, so chunks are compact
+        order = numpy.argsort(tree.leaf(points), kind="stable")
+        for start in range(0, len(points), QUERY_CHUNKSIZE):
+            chunk = order[start : start + QUERY_CHUNKSIZE]
+            x = points[chunk]
+            query, candidates = tree.query(x)
+            nodes, w = _element_weights(arrays, candidates, x[query])
+            offset = numpy.einsum("mi,mij->mj", w, arrays["coords"][nodes]) - x[query]
+            size = (tree.box_hi - tree.box_lo)[candidates].max(axis=1)
+            inside = (w >= -tol).all(axis=1)
+            inside &= numpy.sqrt((offset * offset).sum(axis=1)) <= tol * size
+            query, candidates, w = query[inside], candidates[inside], w[inside]
+            first = numpy.flatnonzero(numpy.diff(query, prepend=-1))
+            element[chunk[query[first]]] = candidates[first] + 1
+            weights[chunk[query[first]]] = w[first, :width]
+        return element, weights
+
+
 class Surface(object):
     """ Surface class"""
 
@@ -5560,26 +7523,18 @@ class EltSet(object):
         del self._parent.eltset[self.name]
 
     def create_faceset(self, filename=None):
+        """
+        Write faceset file of the element set
+
+        See MO.create_facesets to write the facesets of many element sets.
+
+        :arg filename: Name of faceset file, defaults to faceset_<name>.avs
+        :type filename: str
+        :returns: FaceSet
+        """
         if filename is None:
             filename = "faceset_" + self.name + ".avs"
-        motmpnm = make_name("mo_tmp", self._parent._parent.mo.keys())
-        self._parent._parent.sendline(
-            "/".join(["cmo/copy", motmpnm, self._parent.name])
-        )
-        self._parent._parent.sendline("/".join(["cmo/DELATT", motmpnm, "itetclr0"]))
-        self._parent._parent.sendline("/".join(["cmo/DELATT", motmpnm, "itetclr1"]))
-        self._parent._parent.sendline("/".join(["cmo/DELATT", motmpnm, "facecol"]))
-        self._parent._parent.sendline("/".join(["cmo/DELATT", motmpnm, "idface0"]))
-        self._parent._parent.sendline("/".join(["cmo/DELATT", motmpnm, "idelem0"]))
-        self._parent._parent.sendline("eltset / eall / itetclr / ge / 0")
-        self._parent._parent.sendline("eltset/edel/not eall " + self.name)
-        self._parent._parent.sendline("rmpoint / element / eltset get edel")
-        self._parent._parent.sendline("rmpoint / compress")
-        self._parent._parent.sendline(
-            "/".join(["dump / avs2", filename, motmpnm, "0 0 0 2"])
-        )
-        self._parent._parent.sendline("cmo / delete /" + motmpnm)
-        self.faceset = FaceSet(filename, self)
+        self._parent.create_facesets([self], [filename])
         return self.faceset
 
     def minmax(self, attname=None, stride=[1, 0, 0]):
@@ -5716,6 +7671,623 @@ class FaceSet(object):
         return str(self.filename)
 
 
+def _dump_session(lagrit_exe, snapshot, format, args):
+    # Dump a mesh object snapshot from its own LaGriT session, returning the
+    # time taken by the dump. Session output files are kept apart from those
+    # of the calling session and removed.
+    root = "._" + uuid.uuid4().hex[:12]
+    lg = PyLaGriT(
+        lagrit_exe=lagrit_exe,
+        verbose=False,
+        args=["-log", root + ".log", "-out", root + ".out"],
+    )
+    try:
+        mo = lg.read(snapshot)
+        t0 = time.time()
+        if not isinstance(args, (dict, tuple, list)):
+            args = (args,)
+        if hasattr(mo, "dump_" + format):
+            dump = getattr(mo, "dump_" + format)
+            if isinstance(args, dict):
+                dump(**args)
+            else:
+                dump(*args)
+        elif isinstance(args, dict):
+            mo.dump(format=format, **args)
+        else:
+            mo.dump(args[0], format, *args[1:])
+        return time.time() - t0
+    finally:
+        lg.close()
+        for f in [root + ".log", root + ".out"]:
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def _merge_tree(lg, mos, name, release=()):
+    # Merge mesh objects into name, keeping the order of nodes and elements.
+    # Runs of MERGE_RUN mesh objects are merged one after another, then the
+    # runs pairwise in a balanced tree. Mesh objects made here, and those in
+    # release, are merged into in place and released once merged, so few
+    # mesh objects are alive at a time.
+    owned = set(mo.name for mo in release)
+    level = []
+    for i in range(0, len(mos), MERGE_RUN):
+        run = mos[i : i + MERGE_RUN]
+        mo = run[0]
+        for right in run[1:]:
+            mo = _merge_pair(lg, mo, right, owned, name)
+        level.append(mo)
+    while len(level) > 1:
+        merged = [
+            _merge_pair(lg, left, right, owned, name)
+            for left, right in zip(level[::2], level[1::2])
+        ]
+        if len(level) % 2:
+            merged.append(level[-1])
+        level = merged
+    mo = level[0]
+    if mo.name != name:
+        lg.sendline("/".join(["cmo", "move", name, mo.name]))
+        del lg.mo[mo.name]
+        lg.mo[name] = MO(name, lg)
+    return lg.mo[name]
+
+
+def _merge_pair(lg, left, right, owned, name):
+    # Merge right into left if left is owned, otherwise into a new mesh
+    # object, and release right if it is owned
+    if left.name in owned:
+        out = left.name
+    else:
+        out = make_name("mo", list(lg.mo.keys()) + [name])
+    lg.sendline("/".join(["addmesh", "merge", out, left.name, right.name]))
+    if right.name in owned:
+        right.delete()
+    if out not in lg.mo:
+        lg.mo[out] = MO(out, lg)
+    owned.add(out)
+    return lg.mo[out]
+
+
+def _merge_session(lagrit_exe, snapshots, name, result):
+    # Merge mesh object snapshots, given as (filename, mesh object name)
+    # pairs, in their own LaGriT session and write the result, named name, to
+    # a LaGriT binary file.
+    root = "._" + uuid.uuid4().hex[:12]
+    lg = PyLaGriT(
+        lagrit_exe=lagrit_exe,
+        verbose=False,
+        args=["-log", root + ".log", "-out", root + ".out"],
+    )
+    try:
+        mos = []
+        for snapshot, mo_name in snapshots:
+            lg.read(snapshot)
+            mos.append(lg.mo[mo_name])
+        mo = _merge_tree(lg, mos, name, release=mos)
+        mo.dump(result, "lagrit", "binary")
+    finally:
+        lg.close()
+        for f in [root + ".log", root + ".out"]:
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def _split_tiles(ntiles, extent):
+    # Tiles along x, y and z for ntiles in total, splitting the longest
+    # tile edge by each prime factor of ntiles, largest first
+    factors = []
+    n, f = ntiles, 2
+    while n > 1:
+        while n % f == 0:
+            factors.append(f)
+            n //= f
+        f += 1
+    tiles = [1, 1, 1]
+    for f in sorted(factors, reverse=True):
+        i = int(numpy.argmax(numpy.asarray(extent) / tiles))
+        tiles[i] *= f
+    return tuple(tiles)
+
+
+def _connect_tile(
+    lagrit_exe,
+    filename,
+    coords,
+    node_attributes,
+    frame,
+    edges,
+    index,
+    overlap,
+    tile_function,
+):
+    # Connect the nodes of one tile and its overlap, along with the frame
+    # nodes, in a separate LaGriT session and write the tetrahedra with
+    # centroids in the tile to filename. Returns the node coordinates of the
+    # faces of kept tetrahedra not shared with another kept tetrahedron, and
+    # whether each is on the boundary of the whole mesh.
+    root = os.path.splitext(filename)[0]
+    lo = numpy.array([edges[i][index[i]] for i in range(3)])
+    hi = numpy.array([edges[i][index[i] + 1] for i in range(3)])
+    dmin = numpy.array([e[0] for e in edges])
+    dmax = numpy.array([e[-1] for e in edges])
+    lg = PyLaGriT(
+        lagrit_exe=lagrit_exe,
+        verbose=False,
+        args=["-log", root + ".log", "-out", root + ".out"],
+    )
+    try:
+        while True:
+            # Sides without nodes beyond them are unbounded
+            ext_lo = numpy.where(lo - overlap > dmin, lo - overlap, -numpy.inf)
+            ext_hi = numpy.where(hi + overlap < dmax, hi + overlap, numpy.inf)
+            sel = numpy.flatnonzero(
+                numpy.all((coords >= ext_lo) & (coords <= ext_hi), axis=1)
+            )
+            # Frame nodes take the attributes of the first node
+            pad = numpy.append(sel, numpy.repeat(sel[:1], len(frame)))
+            write_avs(
+                root + "_pts.inp",
+                numpy.concatenate([coords[sel], frame]),
+                node_attributes=OrderedDict(
+                    [(k, v[pad]) for k, v in node_attributes.items()]
+                ),
+            )
+            mo = lg.read(root + "_pts.inp")
+            os.remove(root + "_pts.inp")
+            mo.connect()
+            if tile_function is not None:
+                tile_function(mo)
+            mesh = mo.to_arrays()
+            if numpy.any(mesh["itettyp"] != 5):
+                raise ValueError("connect_parallel only supports tetrahedra")
+            itet = mesh["itet"].reshape(-1, 4) - 1
+            xyz = mesh["coords"][itet]
+            # Frame nodes are at least half the box size outside the box
+            half = 0.5 * (dmax - dmin)
+            is_frame = numpy.any(
+                (mesh["coords"] < dmin - half) | (mesh["coords"] > dmax + half), axis=1
+            )
+            framed = is_frame[itet].any(axis=1)
+            keep = ~framed
+            for i in range(3):
+                c = xyz[:, :, i].mean(axis=1)
+                keep &= numpy.searchsorted(edges[i][1:-1], c, "right") == index[i]
+            # Tetrahedra covering part of the tile must be Delaunay for all
+            # nodes, so that the kept ones are those of the whole mesh
+            near = numpy.all((xyz.min(axis=1) <= hi) & (xyz.max(axis=1) >= lo), axis=1)
+            center, radius = _circumspheres(xyz[near])
+            slo, shi = _sphere_bounds(center, radius, dmin, dmax)
+            if numpy.all((slo >= ext_lo) & (shi <= ext_hi)):
+                break
+            mo.delete()
+            overlap *= 2.0
+        faces, boundary = _interface_faces(itet, keep, framed)
+        used = numpy.zeros(len(mesh["coords"]), dtype=bool)
+        used[itet[keep]] = True
+        renumber = numpy.cumsum(used)
+        write_avs(
+            filename,
+            mesh["coords"][used],
+            renumber[itet[keep]].ravel(),
+            4 * numpy.arange(keep.sum()),
+            mesh["itettyp"][keep],
+            mesh["itetclr"][keep],
+            OrderedDict([(k, v[used]) for k, v in mesh["node_attributes"].items()]),
+            OrderedDict([(k, v[keep]) for k, v in mesh["element_attributes"].items()]),
+        )
+        return mesh["coords"][faces], boundary
+    finally:
+        lg.close()
+        for f in [root + ".log", root + ".out"]:
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def _circumspheres(xyz):
+    # Centers and radii of the circumspheres of tetrahedra (n x 4 x 3)
+    u = xyz[:, 1] - xyz[:, 0]
+    v = xyz[:, 2] - xyz[:, 0]
+    w = xyz[:, 3] - xyz[:, 0]
+    vw = numpy.cross(v, w)
+    wu = numpy.cross(w, u)
+    uv = numpy.cross(u, v)
+    det = 2.0 * numpy.einsum("ij,ij->i", u, vw)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        offset = (
+            numpy.einsum("ij,ij->i", u, u)[:, None] * vw
+            + numpy.einsum("ij,ij->i", v, v)[:, None] * wu
+            + numpy.einsum("ij,ij->i", w, w)[:, None] * uv
+        ) / det[:, None]
+    radius = numpy.sqrt(numpy.einsum("ij,ij->i", offset, offset))
+    # Flat tetrahedra have infinite spheres centered on their centroid
+    flat = ~numpy.isfinite(radius)
+    center = xyz[:, 0] + offset
+    center[flat] = xyz[flat].mean(axis=1)
+    radius[flat] = numpy.inf
+    return center, radius
+
+
+def _sphere_bounds(center, radius, mins, maxs):
+    # Bounds of the part of each sphere inside the box mins, maxs. Along
+    # each axis the sphere is no wider than where it crosses the nearest
+    # point of the box in the other two axes.
+    gap = numpy.maximum(numpy.maximum(mins - center, center - maxs), 0.0)
+    gap2 = gap ** 2
+    with numpy.errstate(invalid="ignore"):
+        width = numpy.sqrt(
+            numpy.maximum(
+                radius[:, None] ** 2 - (gap2.sum(axis=1)[:, None] - gap2), 0.0
+            )
+        )
+    width[numpy.isinf(radius)] = numpy.inf
+    return (
+        numpy.maximum(center - width, mins),
+        numpy.minimum(center + width, maxs),
+    )
+
+
+def _interface_faces(itet, keep, framed):
+    # Node numbers (n x 3) of faces of kept tetrahedra not shared with another
+    # kept tetrahedron, and whether each is shared with a framed tetrahedron,
+    # which makes it a boundary face of the whole mesh
+    faces = numpy.sort(itet[:, [[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]]], axis=2)
+    faces = faces.reshape(-1, 3)
+    order = numpy.lexsort(faces.T[::-1])
+    same = numpy.all(faces[order[1:]] == faces[order[:-1]], axis=1)
+    first = order[:-1][same]
+    second = order[1:][same]
+    differ = keep[first // 4] != keep[second // 4]
+    face = numpy.where(keep[first // 4], first, second)[differ]
+    other = numpy.where(keep[first // 4], second, first)[differ]
+    return faces[face], framed[other // 4]
+
+
+def _unmatched_faces(faces):
+    # Number of tile interface faces not found in exactly one other tile.
+    # faces holds, for each tile, the node coordinates (n x 3 x 3) of faces
+    # of kept tetrahedra not shared with another kept tetrahedron and
+    # whether each is on the boundary of the tile mesh. Faces on the
+    # boundary of the whole mesh are found in one tile only.
+    xyz = numpy.concatenate([f.reshape(-1, 3) for f, b in faces])
+    if len(xyz) == 0:
+        return 0
+    boundary = numpy.concatenate([b for f, b in faces])
+    tile = numpy.repeat(numpy.arange(len(faces)), [len(b) for f, b in faces])
+    # Number nodes by coordinates, which are the same in every tile
+    order = numpy.lexsort(xyz.T[::-1])
+    new = numpy.ones(len(xyz), dtype=bool)
+    new[1:] = numpy.any(xyz[order[1:]] != xyz[order[:-1]], axis=1)
+    ids = numpy.empty(len(xyz), dtype=numpy.int64)
+    ids[order] = numpy.cumsum(new) - 1
+    keys = numpy.sort(ids.reshape(-1, 3), axis=1)
+    order = numpy.lexsort(keys.T[::-1])
+    keys = keys[order]
+    start = numpy.ones(len(keys), dtype=bool)
+    start[1:] = numpy.any(keys[1:] != keys[:-1], axis=1)
+    first = numpy.flatnonzero(start)
+    counts = numpy.diff(numpy.append(first, len(keys)))
+    single = first[counts == 1]
+    pairs = first[counts == 2]
+    unmatched = numpy.count_nonzero(~boundary[order[single]])
+    unmatched += 2 * numpy.count_nonzero(tile[order[pairs]] == tile[order[pairs + 1]])
+    return unmatched + int(counts[counts > 2].sum())
+
+
+# Local node pairs of the edges of each element type, indexed by itettyp
+_ELEMENT_EDGES = {
+    2: [(0, 1)],
+    3: [(0, 1), (1, 2), (2, 0)],
+    4: [(0, 1), (1, 2), (2, 3), (3, 0)],
+    5: [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)],
+    6: [(0, 1), (1, 2), (2, 3), (3, 0), (0, 4), (1, 4), (2, 4), (3, 4)],
+    7: [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (0, 3), (1, 4), (2, 5)],
+    8: [(i, (i + 1) % 4) for i in range(4)]
+    + [(4 + i, 4 + (i + 1) % 4) for i in range(4)]
+    + [(i, i + 4) for i in range(4)],
+}
+
+
+# Interior angles of 2D element types as local nodes (a, b, c) of the angle
+# between edges a-b and a-c, and dihedral angles of 3D element types as
+# local nodes (a, b, c, d) of the angle at edge a-b between the faces
+# through c and d
+_ELEMENT_ANGLES = {
+    3: [(0, 1, 2), (1, 2, 0), (2, 0, 1)],
+    4: [(i, (i + 1) % 4, (i + 3) % 4) for i in range(4)],
+    5: [
+        (0, 1, 2, 3),
+        (0, 2, 1, 3),
+        (0, 3, 1, 2),
+        (1, 2, 0, 3),
+        (1, 3, 0, 2),
+        (2, 3, 0, 1),
+    ],
+    6: [(i, (i + 1) % 4, (i + 3) % 4, 4) for i in range(4)]
+    + [(i, 4, (i + 1) % 4, (i + 3) % 4) for i in range(4)],
+    7: [(i, (i + 1) % 3, (i + 2) % 3, i + 3) for i in range(3)]
+    + [(3 + i, 3 + (i + 1) % 3, 3 + (i + 2) % 3, i) for i in range(3)]
+    + [(i, i + 3, (i + 1) % 3, (i + 2) % 3) for i in range(3)],
+    8: [(i, (i + 1) % 4, (i + 3) % 4, i + 4) for i in range(4)]
+    + [(4 + i, 4 + (i + 1) % 4, 4 + (i + 3) % 4, i) for i in range(4)]
+    + [(i, i + 4, (i + 1) % 4, (i + 3) % 4) for i in range(4)],
+}
+
+
+def _min_angle(arrays):
+    # Smallest interior (2D) or dihedral (3D) angle of each element in degrees
+    itet = arrays["itet"] - 1
+    coords = arrays["coords"]
+    off = arrays["itetoff"]
+    types = arrays["itettyp"]
+    angles = numpy.full(len(off), numpy.nan)
+    for t, corners in _ELEMENT_ANGLES.items():
+        sel = numpy.flatnonzero(types == t)
+        if sel.size == 0:
+            continue
+        for nodes in corners:
+            x = [coords[itet[off[sel] + i]] for i in nodes]
+            u = x[2] - x[0]
+            v = x[1] - x[0] if len(nodes) == 3 else x[3] - x[0]
+            if len(nodes) == 4:
+                # Project onto the plane normal to the edge
+                e = x[1] - x[0]
+                e /= numpy.sqrt((e ** 2).sum(axis=1))[:, None]
+                u -= (u * e).sum(axis=1)[:, None] * e
+                v -= (v * e).sum(axis=1)[:, None] * e
+            cos = (u * v).sum(axis=1) / numpy.sqrt(
+                (u ** 2).sum(axis=1) * (v ** 2).sum(axis=1)
+            )
+            a = numpy.degrees(numpy.arccos(numpy.clip(cos, -1, 1)))
+            angles[sel] = numpy.fmin(angles[sel], a)
+    return angles
+
+
+def _centroids(arrays, elements):
+    # Centroids of elements of the mesh arrays of to_arrays
+    itet = arrays["itet"] - 1
+    off = arrays["itetoff"][elements]
+    counts = NODES_PER_ELEMENT[arrays["itettyp"][elements]]
+    centroids = numpy.zeros((len(elements), 3))
+    for i in range(counts.max(initial=0)):
+        has = counts > i
+        centroids[has] += arrays["coords"][itet[off[has] + i]]
+    return centroids / numpy.maximum(counts, 1)[:, None]
+
+
+# Local coordinates of the centres of element types, indexed by itettyp,
+# where Newton iterations for the local coordinates of points start
+_ELEMENT_CENTRES = {
+    2: [0.5],
+    3: [1 / 3.0, 1 / 3.0],
+    4: [0.5, 0.5],
+    5: [0.25, 0.25, 0.25],
+    6: [0.5, 0.5, 0.2],
+    7: [1 / 3.0, 1 / 3.0, 0.5],
+    8: [0.5, 0.5, 0.5],
+}
+
+
+def _element_boxes(arrays, elements):
+    # Lower and upper corners of the bounding boxes of elements of the mesh
+    # arrays of to_arrays
+    itet = arrays["itet"] - 1
+    off = arrays["itetoff"][elements]
+    counts = NODES_PER_ELEMENT[arrays["itettyp"][elements]]
+    lo = arrays["coords"][itet[off]]
+    hi = lo.copy()
+    for i in range(1, counts.max(initial=0)):
+        has = counts > i
+        x = arrays["coords"][itet[off[has] + i]]
+        lo[has] = numpy.minimum(lo[has], x)
+        hi[has] = numpy.maximum(hi[has], x)
+    return lo, hi
+
+
+def _shape_functions(t, u):
+    # Weights of the nodes of elements of type t at local coordinates u, with
+    # one row per coordinate, as in LaGriT's node order: barycentric in lines,
+    # triangles and tets, bilinear in quads, trilinear in hexes, barycentric
+    # times linear in prisms, and bilinear times linear in pyramids
+    if t in (2, 3, 5):
+        return [1 - u.sum(axis=0)] + list(u)
+    if t in (4, 6, 8):
+        w = [
+            (1 - u[0]) * (1 - u[1]),
+            u[0] * (1 - u[1]),
+            u[0] * u[1],
+            (1 - u[0]) * u[1],
+        ]
+    else:
+        w = [1 - u[0] - u[1], u[0], u[1]]
+    if t == 6:
+        return [v * (1 - u[2]) for v in w] + [u[2]]
+    if t in (7, 8):
+        return [v * (1 - u[2]) for v in w] + [v * u[2] for v in w]
+    return w
+
+
+def _element_weights(arrays, elements, points, steps=20):
+    # Interpolation weights of points in elements of the mesh arrays of
+    # to_arrays, and the nodes they weight, padded to 8 per element. The
+    # local coordinates of the points are found by Gauss-Newton iterations,
+    # which also project points onto elements of lower dimension than the
+    # space, and are exact after one step in lines, triangles and tets.
+    itet = arrays["itet"] - 1
+    off = arrays["itetoff"][elements]
+    types = arrays["itettyp"][elements]
+    nodes = numpy.zeros((len(elements), 8), dtype=numpy.int64)
+    weights = numpy.zeros((len(elements), 8))
+    for t in numpy.unique(types):
+        if t not in _ELEMENT_CENTRES:
+            raise ValueError("Interpolation in element type %d not supported" % t)
+        sel = numpy.flatnonzero(types == t)
+        n = NODES_PER_ELEMENT[t]
+        nodes[sel, :n] = itet[off[sel, None] + numpy.arange(n)]
+        x = arrays["coords"][nodes[sel, :n]]
+        d = len(_ELEMENT_CENTRES[t])
+        u = numpy.repeat(numpy.array(_ELEMENT_CENTRES[t])[:, None], len(sel), axis=1)
+        for step in range(1 if t in (2, 3, 5) else steps):
+            w = numpy.column_stack(_shape_functions(t, u))
+            r = points[sel] - numpy.einsum("mi,mij->mj", w, x)
+            # Shape functions are linear in each local coordinate, so their
+            # derivatives are differences at coordinates 1 and 0
+            jac = numpy.empty((len(sel), 3, d))
+            for k in range(d):
+                hi, lo = u.copy(), u.copy()
+                hi[k], lo[k] = 1, 0
+                dw = numpy.column_stack(_shape_functions(t, hi))
+                dw -= numpy.column_stack(_shape_functions(t, lo))
+                jac[:, :, k] = numpy.einsum("mi,mij->mj", dw, x)
+            g = numpy.einsum("mji,mjk->mik", jac, jac)
+            # Keep degenerate elements, and pyramid apexes, solvable
+            g += 1e-14 * numpy.trace(g, axis1=1, axis2=2)[:, None, None] * numpy.eye(d)
+            g[:, range(d), range(d)] += numpy.finfo(float).tiny
+            b = numpy.einsum("mji,mj->mi", jac, r)
+            du = numpy.linalg.solve(g, b[..., None])[..., 0].T
+            # Points far outside distorted elements may not converge, but
+            # are kept near the element so that their weights stay finite
+            u = numpy.clip(u + du, -2, 3)
+            if numpy.abs(du).max(initial=0) < 1e-12:
+                break
+        weights[sel, :n] = numpy.column_stack(_shape_functions(t, u))
+    return nodes, weights
+
+
+def _max_edge_length(arrays, elements):
+    # Length of the longest edge of elements of the mesh arrays of to_arrays
+    itet = arrays["itet"] - 1
+    coords = arrays["coords"]
+    off = arrays["itetoff"][elements]
+    types = arrays["itettyp"][elements]
+    lengths = numpy.zeros(len(elements))
+    for t, edges in _ELEMENT_EDGES.items():
+        sel = numpy.flatnonzero(types == t)
+        for a, b in edges:
+            d = coords[itet[off[sel] + a]] - coords[itet[off[sel] + b]]
+            lengths[sel] = numpy.maximum(lengths[sel], numpy.sqrt((d ** 2).sum(axis=1)))
+    return lengths
+
+
+def _upscale_reduce(method, values, starts, counts):
+    # Upscale values grouped by sink node, starting at starts, with counts each
+    if method == "sum":
+        return numpy.add.reduceat(values, starts)
+    elif method == "min":
+        return numpy.minimum.reduceat(values, starts)
+    elif method == "max":
+        return numpy.maximum.reduceat(values, starts)
+    elif method == "ariave":
+        return numpy.add.reduceat(values, starts) / counts
+    elif method == "harave":
+        return counts / numpy.add.reduceat(1.0 / values, starts)
+    elif method == "geoave":
+        return numpy.exp(numpy.add.reduceat(numpy.log(values), starts) / counts)
+
+
+def _sample_raster(array, origin, spacing, xy, method, nodata):
+    # Values of a raster with its first row at the top at points xy, and
+    # whether each point is on a cell with data. Bilinear values are
+    # weighted over the surrounding cell centers that have data.
+    nrows, ncols = array.shape
+    dx, dy = numpy.broadcast_to(numpy.asarray(spacing, dtype=float), (2,))
+    fx = (xy[:, 0] - origin[0]) / dx
+    fy = (xy[:, 1] - origin[1]) / dy
+    inside = (fx >= 0) & (fx <= ncols) & (fy >= 0) & (fy <= nrows)
+    if nodata is None:
+        has_data = numpy.ones(array.shape, dtype=bool)
+    elif numpy.isnan(nodata):
+        has_data = ~numpy.isnan(array)
+    else:
+        has_data = array != nodata
+    if method == "nearest":
+        col = numpy.clip(numpy.floor(fx), 0, ncols - 1).astype(numpy.int64)
+        row = nrows - 1 - numpy.clip(numpy.floor(fy), 0, nrows - 1).astype(numpy.int64)
+        return array[row, col].astype(float), inside & has_data[row, col]
+    fx = numpy.clip(fx - 0.5, 0, ncols - 1)
+    fy = numpy.clip(fy - 0.5, 0, nrows - 1)
+    col = numpy.minimum(numpy.floor(fx), max(ncols - 2, 0)).astype(numpy.int64)
+    row = numpy.minimum(numpy.floor(fy), max(nrows - 2, 0)).astype(numpy.int64)
+    tx = fx - col
+    ty = fy - row
+    total = numpy.zeros(len(xy))
+    weight = numpy.zeros(len(xy))
+    for i, j, w in [
+        (0, 0, (1 - tx) * (1 - ty)),
+        (0, 1, tx * (1 - ty)),
+        (1, 0, (1 - tx) * ty),
+        (1, 1, tx * ty),
+    ]:
+        r = nrows - 1 - numpy.minimum(row + i, nrows - 1)
+        c = numpy.minimum(col + j, ncols - 1)
+        w = numpy.where(has_data[r, c], w, 0.0)
+        total += w * numpy.where(w > 0, array[r, c], 0.0)
+        weight += w
+    ok = inside & (weight > 0)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.where(ok, total / weight, 0.0), ok
+
+
+def _in_geom(coords, geom, mins, maxs, ctr, lo, hi):
+    # Nodes inside a pset/geom shape, tested as LaGriT's pset does: limits
+    # are clamped to the extents lo and hi of the nodes, and a node is
+    # inside if it is within each half range of the shape's center
+    # coordinates, relative to the range
+    l = numpy.array(mins, dtype=float)
+    u = numpy.array(maxs, dtype=float)
+    ctr = numpy.array(ctr, dtype=float)
+    a, b, c = (coords - ctr).T
+    if geom == "xyz":
+        if numpy.any(l + ctr > hi) or numpy.any(u + ctr < lo) or numpy.any(l > u):
+            return numpy.zeros(len(coords), dtype=bool)
+        l = numpy.maximum(l, lo - ctr)
+        u = numpy.minimum(u, hi - ctr)
+        v = numpy.column_stack([a, b, c])
+    elif geom == "rtz":
+        l[0] = max(l[0], 0.0)
+        u[0] = min(u[0], numpy.sqrt(numpy.sum((hi - lo) ** 2)))
+        l[2] = max(l[2], lo[2] - ctr[2])
+        u[2] = min(u[2], hi[2] - ctr[2])
+        r = numpy.hypot(a, b)
+        theta = numpy.where(r == 0, 0.5 * (l[1] + u[1]), _azimuth(a, b, c))
+        v = numpy.column_stack([r, theta, c])
+    elif geom == "rtp":
+        r = numpy.sqrt(a ** 2 + b ** 2 + c ** 2)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            theta = numpy.degrees(numpy.arccos(numpy.clip(c / r, -1.0, 1.0)))
+        center = (
+            (numpy.abs(a) < 1e-10) & (numpy.abs(b) < 1e-10) & (numpy.abs(c) < 1e-10)
+        )
+        theta[center] = 0.0
+        phi = _azimuth(a, b, c)
+        theta = numpy.where(r == 0, 0.5 * (l[1] + u[1]), theta)
+        phi = numpy.where(r == 0, 0.5 * (l[2] + u[2]), phi)
+        v = numpy.column_stack([r, theta, phi])
+    else:
+        raise ValueError("Unknown geometry " + str(geom))
+    mid = 0.5 * (l + u)
+    rat = 2.0 / (numpy.abs(l - u) + 1e-20)
+    return numpy.all(numpy.abs((v - mid) * rat) - 1e-14 < 1.0, axis=1)
+
+
+def _azimuth(a, b, c):
+    # Angle in degrees from the x axis in the xy plane, between 0 and 360,
+    # snapped to the axes within LaGriT's angle3v tolerance
+    dsxy = numpy.hypot(a, b)
+    axis = dsxy < numpy.sqrt(dsxy ** 2 + c ** 2) * 1e-10
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        cosph = numpy.where(axis, 0.0, -b / dsxy)
+        sinph = numpy.where(axis, 1.0, a / dsxy)
+    phi = numpy.degrees(numpy.arctan2(-cosph, sinph)) % 360.0
+    phi[numpy.abs(cosph - 1) <= 1e-10] = 270.0
+    phi[numpy.abs(sinph - 1) <= 1e-10] = 0.0
+    phi[numpy.abs(cosph + 1) <= 1e-10] = 90.0
+    phi[numpy.abs(sinph + 1) <= 1e-10] = 180.0
+    phi[(numpy.abs(a) < 1e-10) & (numpy.abs(b) < 1e-10)] = 0.0
+    return phi
+
+
 def make_name(base, names):
     i = 1
     name = base + str(i)
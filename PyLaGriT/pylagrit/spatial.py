@@ -0,0 +1,348 @@
+"""
+Search trees over points and boxes, stored as flat numpy arrays
+
+The trees are built without a Python loop per point, and are searched a
+level at a time for whole batches of query points, so that the cost of a
+query is a few numpy operations per level of the tree rather than
+interpreted code per point.
+"""
+
+import numpy
+
+LEAFSIZE = 16
+QUERY_CHUNKSIZE = 2 ** 14
+
+
+class KDTree(object):
+    """
+    Balanced KD-tree over points
+
+    The points are split at the median of their widest coordinate until no
+    more than leafsize remain in a node, which gives 2 ** depth leaves whose
+    sizes differ by at most one. Nodes are numbered as in a binary heap,
+    the root is 1 and the children of node i are 2*i and 2*i+1, and each
+    keeps the bounding box of its points in lo and hi. The points of leaf j
+    are points[order[starts[j]:starts[j+1]]].
+
+    :arg points: Coordinates, n by dimension
+    :type points: numpy.ndarray
+    :arg leafsize: Largest number of points in a leaf
+    :type leafsize: int
+
+    Example:
+        >>> import numpy
+        >>> from pylagrit.spatial import KDTree
+        >>> tree = KDTree(numpy.random.rand(100000, 3))
+        >>> distance, index = tree.query(numpy.random.rand(10, 3))
+    """
+
+    def __init__(self, points, leafsize=LEAFSIZE):
+        self.points = numpy.ascontiguousarray(points, dtype=numpy.float64)
+        if self.points.ndim != 2 or len(self.points) == 0:
+            raise ValueError("KDTree needs an n by dimension array of points")
+        self.depth, self.starts, self.axis, self.split, self.order = _kd_order(
+            self.points, leafsize
+        )
+        points = self.points[self.order]
+        self.lo, self.hi = _node_boxes(points, points, self.starts, self.depth)
+        # Leaves padded to the same size, with points that are never closest
+        self._leaf_index = _leaf_table(self.order, self.starts)
+        pad = self._leaf_index == len(self.points)
+        points = self.points[numpy.where(pad, 0, self._leaf_index)]
+        self._leaf_points = numpy.where(pad[:, :, None], numpy.inf, points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, x, k=1, radius=None, chunksize=QUERY_CHUNKSIZE):
+        """
+        Nearest points to each query point
+
+        Points further than radius are not returned, and equidistant points
+        are broken by the lowest index.
+
+        :arg x: Query coordinates, m by dimension
+        :type x: numpy.ndarray
+        :arg k: Number of nearest points
+        :type k: int
+        :arg radius: Largest distance of returned points
+        :type radius: float
+        :arg chunksize: Number of query points searched at a time
+        :type chunksize: int
+        :returns: Distances and 0-based indices of the nearest points, of length m
+                  if k is 1 and m by k otherwise, with distance inf and index -1
+                  where fewer than k points are found
+        """
+        x = numpy.asarray(x, dtype=numpy.float64).reshape(-1, self.points.shape[1])
+        if k < 1:
+            raise ValueError("KDTree query needs k of at least 1")
+        bound = numpy.inf if radius is None else float(radius) ** 2
+        # Search the queries in the order of their leaves so that chunks
+        # are compact
+        first = _descend(self, x)
+        order = numpy.argsort(first, kind="stable")
+        distance = numpy.empty((len(x), k))
+        index = numpy.empty((len(x), k), dtype=numpy.int64)
+        for start in range(0, len(x), chunksize):
+            chunk = order[start : start + chunksize]
+            distance[chunk], index[chunk] = self._query(
+                x[chunk], first[chunk], k, bound
+            )
+        missing = index == len(self.points)
+        distance[missing] = numpy.inf
+        index[missing] = -1
+        if k == 1:
+            return numpy.sqrt(distance[:, 0]), index[:, 0]
+        return numpy.sqrt(distance), index
+
+    def _query(self, x, first, k, bound):
+        # Squared distances and indices of the k nearest points to each of x,
+        # whose first leaves are sorted, starting from the leaves of the
+        # ancestor of the first leaf with at least k points
+        rows = numpy.arange(len(x))
+        best = numpy.full((len(x), k), bound)
+        index = numpy.full((len(x), k), len(self.points), dtype=numpy.int64)
+        up = 0
+        while up < self.depth and (self.starts[1] - self.starts[0]) << up < k:
+            up += 1
+        query = numpy.repeat(rows, 2 ** up)
+        node = ((first >> up) << up)[query] + numpy.tile(numpy.arange(2 ** up), len(x))
+        self._search_leaves(x, query, node, best, index)
+        # Search the leaves not yet searched and no further from the query
+        # than its bound, padded by a few rounding errors since the distances
+        # to boxes and to points are summed differently, so that no point
+        # tied with the k-th nearest is left out
+        bound = best[:, -1] * (1 + 8 * numpy.finfo(numpy.float64).eps)
+        query, node = _near_leaves(self, x, first, bound)
+        keep = (node >> up) != (first[query] >> up)
+        self._search_leaves(x, query[keep], node[keep], best, index)
+        return best, index
+
+    def _search_leaves(self, x, query, node, best, index):
+        # Merge the points of the leaves into the k nearest of the queries,
+        # whose pairs with the leaves are sorted by query
+        if len(query) == 0:
+            return
+        k = best.shape[1]
+        d = self._leaf_points[node - 2 ** self.depth] - x[query][:, None, :]
+        d = numpy.einsum("ijk,ijk->ij", d, d)
+        # Table of the current and new points, a row for each query
+        queries, first, counts = numpy.unique(
+            query, return_index=True, return_counts=True
+        )
+        rank = numpy.arange(len(query)) - numpy.repeat(first, counts)
+        rows = numpy.repeat(numpy.arange(len(queries)), counts)[:, None]
+        columns = k + rank[:, None] * d.shape[1] + numpy.arange(d.shape[1])
+        distances = numpy.full((len(queries), k + counts.max() * d.shape[1]), numpy.inf)
+        indices = numpy.full(distances.shape, len(self.points))
+        distances[:, :k] = best[queries]
+        indices[:, :k] = index[queries]
+        distances[rows, columns] = d
+        indices[rows, columns] = self._leaf_index[node - 2 ** self.depth]
+        # Keep the first k of each row by distance, then index
+        if k == 1:
+            best[queries, 0] = distances.min(axis=1)
+            closest = distances == best[queries]
+            nearest = numpy.where(closest, indices, len(self.points))
+            index[queries, 0] = nearest.min(axis=1)
+            return
+        # Partition out the k closest, and sort the whole row only where
+        # points tied with the k-th closest may have been left out
+        o = numpy.argpartition(distances, k - 1, axis=1)[:, :k]
+        d = numpy.take_along_axis(distances, o, axis=1)
+        kth = d.max(axis=1)[:, None]
+        real = indices < len(self.points)
+        ties = ((distances == kth) & real).sum(axis=1)
+        ties = ties > ((d == kth) & numpy.take_along_axis(real, o, axis=1)).sum(axis=1)
+        o[ties] = numpy.lexsort((indices[ties], distances[ties]), axis=1)[:, :k]
+        d = numpy.take_along_axis(distances, o, axis=1)
+        i = numpy.take_along_axis(indices, o, axis=1)
+        o = numpy.lexsort((i, d), axis=1)
+        best[queries] = numpy.take_along_axis(d, o, axis=1)
+        index[queries] = numpy.take_along_axis(i, o, axis=1)
+
+
+class BVH(object):
+    """
+    Bounding volume hierarchy over boxes
+
+    The boxes are ordered as the points of a KDTree of their centers, with
+    the same node numbering, and each node keeps the box that encloses the
+    boxes of its leaves in lo and hi.
+
+    :arg lo: Lower corners of the boxes, n by dimension
+    :type lo: numpy.ndarray
+    :arg hi: Upper corners of the boxes, n by dimension
+    :type hi: numpy.ndarray
+    :arg leafsize: Largest number of boxes in a leaf
+    :type leafsize: int
+
+    Example:
+        >>> import numpy
+        >>> from pylagrit.spatial import BVH
+        >>> lo = numpy.random.rand(1000, 3)
+        >>> tree = BVH(lo, lo + 0.05)
+        >>> point, box = tree.query(numpy.random.rand(10, 3))
+    """
+
+    def __init__(self, lo, hi, leafsize=LEAFSIZE):
+        self.box_lo = numpy.ascontiguousarray(lo, dtype=numpy.float64)
+        self.box_hi = numpy.ascontiguousarray(hi, dtype=numpy.float64)
+        if self.box_lo.ndim != 2 or len(self.box_lo) == 0:
+            raise ValueError("BVH needs n by dimension arrays of box corners")
+        centers = 0.5 * (self.box_lo + self.box_hi)
+        self.depth, self.starts, self.axis, self.split, self.order = _kd_order(
+            centers, leafsize
+        )
+        self.lo, self.hi = _node_boxes(
+            self.box_lo[self.order], self.box_hi[self.order], self.starts, self.depth
+        )
+        self._leaf_index = _leaf_table(self.order, self.starts)
+
+    def __len__(self):
+        return len(self.box_lo)
+
+    def leaf(self, x):
+        """
+        Leaf of the tree on the side of every split of each query point
+
+        Points sorted by their leaves are close together, and are searched
+        faster in chunks of that order.
+
+        :arg x: Query coordinates, m by dimension
+        :type x: numpy.ndarray
+        :returns: Leaf node numbers, of length m
+        """
+        x = numpy.asarray(x, dtype=numpy.float64).reshape(-1, self.box_lo.shape[1])
+        return _descend(self, x)
+
+    def query(self, x):
+        """
+        Boxes that contain each query point
+
+        :arg x: Query coordinates, m by dimension
+        :type x: numpy.ndarray
+        :returns: 0-based indices of query points and of boxes that contain them,
+                  sorted by point and then box
+        """
+        x = numpy.asarray(x, dtype=numpy.float64).reshape(-1, self.box_lo.shape[1])
+        first = self.leaf(x)
+        order = numpy.argsort(first, kind="stable")
+        query, node = _near_leaves(self, x[order], first[order], numpy.zeros(len(x)))
+        query = order[query]
+        boxes = self._leaf_index[node - 2 ** self.depth]
+        query = numpy.repeat(query, boxes.shape[1])
+        boxes = boxes.ravel()
+        keep = boxes < len(self.box_lo)
+        query, boxes = query[keep], boxes[keep]
+        inside = (self.box_lo[boxes] <= x[query]) & (x[query] <= self.box_hi[boxes])
+        keep = inside.all(axis=1)
+        query, boxes = query[keep], boxes[keep]
+        o = numpy.lexsort((boxes, query))
+        return query[o], boxes[o]
+
+
+def _kd_order(points, leafsize):
+    # Depth, leaf starts, split axes and values, and order of the points of
+    # a balanced KD-tree with no more than leafsize points in a leaf
+    if leafsize < 2:
+        raise ValueError("Tree leafsize must be at least 2")
+    n = len(points)
+    depth = 0
+    while n > leafsize * 2 ** depth:
+        depth += 1
+    leaves = 2 ** depth
+    starts = n * numpy.arange(leaves + 1) // leaves
+    split_axis = numpy.zeros(leaves, dtype=numpy.int64)
+    split = numpy.zeros(leaves)
+    order = numpy.arange(n)
+    for level in range(depth):
+        # Sort the points of every node of the level along the widest
+        # coordinate of the node, so the next level splits at medians
+        nodes = numpy.arange(2 ** level, 2 ** (level + 1))
+        width = 2 ** (depth - level)
+        bounds = starts[(nodes - 2 ** level) * width]
+        sorted_points = points[order]
+        lo = numpy.minimum.reduceat(sorted_points, bounds)
+        extent = numpy.maximum.reduceat(sorted_points, bounds) - lo
+        axis = numpy.argmax(extent, axis=1)
+        lo = lo[numpy.arange(len(nodes)), axis]
+        extent = numpy.maximum(extent[numpy.arange(len(nodes)), axis], 1e-300)
+        node = numpy.repeat(numpy.arange(len(nodes)), numpy.diff(bounds, append=n))
+        key = (sorted_points[numpy.arange(n), axis[node]] - lo[node]) / extent[node]
+        order = order[numpy.argsort(node + 0.5 * key)]
+        middle = starts[(nodes - 2 ** level) * width + width // 2]
+        split_axis[nodes] = axis
+        split[nodes] = points[order[middle], axis]
+    # Order the points of each leaf by index, so the first closest point of
+    # a leaf is the one with the lowest index
+    leaf = numpy.repeat(numpy.arange(leaves), numpy.diff(starts))
+    order = order[numpy.argsort(leaf * n + order)]
+    return depth, starts, split_axis, split, order
+
+
+def _descend(tree, x):
+    # Leaf of a tree of _kd_order on the side of every split of each of x
+    first = numpy.ones(len(x), dtype=numpy.int64)
+    rows = numpy.arange(len(x))
+    for level in range(tree.depth):
+        first = 2 * first + (x[rows, tree.axis[first]] >= tree.split[first])
+    return first
+
+
+def _near_leaves(tree, x, first, bound):
+    # Pairs of queries and leaves of a tree whose boxes are no further from
+    # the query than the square root of its bound, for queries sorted by
+    # their first leaves. The tree is searched once for each group of
+    # queries with the same first leaf, with the box of the group and the
+    # largest of their bounds, and the leaves near each group then tested
+    # for each query of the group.
+    rows = numpy.arange(len(x))
+    if len(x) == 0:
+        return rows, rows
+    starts = numpy.flatnonzero(numpy.r_[True, first[1:] != first[:-1]])
+    group = numpy.repeat(numpy.arange(len(starts)), numpy.diff(starts, append=len(x)))
+    lo = numpy.minimum.reduceat(x, starts)
+    hi = numpy.maximum.reduceat(x, starts)
+    far = numpy.maximum.reduceat(bound, starts)
+    near = numpy.arange(len(starts))
+    node = numpy.ones(len(starts), dtype=numpy.int64)
+    for level in range(tree.depth + 1):
+        if level:
+            near = numpy.repeat(near, 2)
+            node = 2 * numpy.repeat(node, 2) + numpy.tile([0, 1], len(node))
+        d = numpy.maximum(tree.lo[node] - hi[near], 0)
+        d += numpy.maximum(lo[near] - tree.hi[node], 0)
+        keep = (d * d).sum(axis=1) <= far[near]
+        near, node = near[keep], node[keep]
+    counts = numpy.bincount(near, minlength=len(starts))[group]
+    offsets = numpy.cumsum(counts) - counts
+    query = numpy.repeat(rows, counts)
+    slot = numpy.arange(len(query)) - numpy.repeat(offsets, counts)
+    node = node[numpy.repeat(numpy.searchsorted(near, group), counts) + slot]
+    d = numpy.maximum(tree.lo[node] - x[query], 0)
+    d += numpy.maximum(x[query] - tree.hi[node], 0)
+    keep = (d * d).sum(axis=1) <= bound[query]
+    return query[keep], node[keep]
+
+
+def _node_boxes(lo, hi, starts, depth):
+    # Boxes of the nodes of a tree, from the boxes of its items in leaf order
+    leaves = 2 ** depth
+    node_lo = numpy.empty((2 * leaves, lo.shape[1]))
+    node_hi = numpy.empty((2 * leaves, lo.shape[1]))
+    node_lo[leaves:] = numpy.minimum.reduceat(lo, starts[:-1])
+    node_hi[leaves:] = numpy.maximum.reduceat(hi, starts[:-1])
+    for level in reversed(range(depth)):
+        i = numpy.arange(2 ** level, 2 ** (level + 1))
+        node_lo[i] = numpy.minimum(node_lo[2 * i], node_lo[2 * i + 1])
+        node_hi[i] = numpy.maximum(node_hi[2 * i], node_hi[2 * i + 1])
+    return node_lo, node_hi
+
+
+def _leaf_table(order, starts):
+    # Items of each leaf, a row per leaf padded with len(order)
+    width = numpy.diff(starts).max()
+    slots = starts[:-1, None] + numpy.arange(width)
+    pad = slots >= starts[1:, None]
+    return numpy.where(pad, len(order), order[numpy.minimum(slots, len(order) - 1)])
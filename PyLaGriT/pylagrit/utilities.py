@@ -1,17 +1,299 @@
 import os
+import mmap
 import numpy as np
+from collections import OrderedDict
 from datetime import datetime
 
+# FEHM zone files list node numbers 10 per line in i10 fields
+ZONE_COLUMNS = 10
+ZONE_WIDTH = 10
+_ZONE_CHUNK = 2 ** 20
+# Markers that end a node list: the next nnum, zone/zonn or stop keyword
+# and blank lines
+_LIST_ENDS = [b"nnum", b"zon", b"stop", b"\n\n", b"\n \n"]
 
-def zone_to_zonn(zonefile):
+
+def zone_to_zonn(zonefile, inplace=False):
+    """
+    Convert FEHM zone file to zonn file (<root>.zonn)
+
+    The file is streamed in blocks rather than read into memory. Every
+    zone keyword is replaced, so files with several zone macros are
+    converted completely.
+
+    :arg zonefile: Name of zone file
+    :type zonefile: str
+    :arg inplace: Rewrite the keywords in zonefile and rename it instead of copying
+    :type inplace: bool
+    :returns: Name of zonn file
+
+    Example:
+    from pylagrit import utilities as util
+    util.zone_to_zonn('mesh_outside.zone', inplace=True)
+    """
     zonnfile = os.path.splitext(zonefile)[0] + ".zonn"
-    with open(zonefile, "r") as fh:
-        fh.readline()
-        lns = fh.readlines()
-    with open(zonnfile, "w") as fout:
-        fout.write("zonn\n")
-        for l in lns:
-            fout.write(l)
+    if inplace:
+        # zone and zonn have the same length, so only the keywords change
+        with open(zonefile, "r+b") as fh:
+            offset = 0
+            for chunk in _line_chunks(fh):
+                here = fh.tell()
+                for k in _zone_keywords(chunk):
+                    fh.seek(offset + k + 3)
+                    fh.write(b"n")
+                fh.seek(here)
+                offset += len(chunk)
+        os.rename(zonefile, zonnfile)
+    else:
+        with open(zonefile, "rb") as fh:
+            with open(zonnfile, "wb") as fout:
+                for chunk in _line_chunks(fh):
+                    chunk = bytearray(chunk)
+                    for k in _zone_keywords(chunk):
+                        chunk[k + 3 : k + 4] = b"n"
+                    fout.write(chunk)
+    return zonnfile
+
+
+def read_zone(zonefile, names=False):
+    """
+    Read FEHM zone or zonn file
+
+    Files written by dump_pset, dump_zone_imt, dump_zone_outside and
+    dump_fehm are read, as are files in any other layout FEHM accepts
+    for the nnum option. Node lists are parsed in bulk from a memory
+    map of the file. Node numbers of zones listed more than once are
+    combined.
+
+    :arg zonefile: Name of zone or zonn file
+    :type zonefile: str
+    :arg names: Also return zone names
+    :type names: bool
+    :returns: OrderedDict of int32 arrays of 1-based node numbers keyed
+        by zone id, and an OrderedDict of zone names if names is True
+
+    Example:
+    from pylagrit import utilities as util
+    zones = util.read_zone('mesh_material.zone')
+    print(zones[1])
+    """
+    zones = OrderedDict()
+    znames = OrderedDict()
+    with open(zonefile, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return (zones, znames) if names else zones
+        buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            ends = dict([(k, -1) for k in _LIST_ENDS])
+            pos = buf.find(b"nnum")
+            while pos >= 0:
+                # Zone id (and optional name) is on the line before nnum
+                start = buf.rfind(b"\n", 0, buf.rfind(b"\n", 0, pos)) + 1
+                vs = buf[start:pos].split()
+                if len(vs) == 0 or not vs[0].isdigit():
+                    raise ValueError("Missing zone id before nnum in " + zonefile)
+                zid = int(vs[0])
+                start = buf.find(b"\n", pos) + 1
+                pos = buf.find(b"\n", start) + 1 or len(buf)
+                nnum = int(buf[start:pos])
+                end = _node_list_end(buf, pos, ends)
+                nodes = np.array(buf[pos:end].split(), dtype=np.int64)
+                if nodes.size < nnum:
+                    raise ValueError(
+                        "Zone %d of %s lists %d of %d node numbers"
+                        % (zid, zonefile, nodes.size, nnum)
+                    )
+                nodes = nodes[:nnum].astype(np.int32)
+                if zid in zones:
+                    nodes = _unique(np.concatenate([zones[zid], nodes]))
+                zones[zid] = nodes
+                if len(vs) > 1:
+                    znames[zid] = vs[1].decode()
+                else:
+                    znames.setdefault(zid, "")
+                pos = buf.find(b"nnum", end)
+        finally:
+            buf.close()
+    return (zones, znames) if names else zones
+
+
+def write_zone(zonefile, zones, names=None, zonn=False):
+    """
+    Write FEHM zone or zonn file
+
+    Node numbers are written in the layout LaGriT writes, 10 i10 fields
+    per line.
+
+    :arg zonefile: Name of file to write
+    :type zonefile: str
+    :arg zones: Arrays of 1-based node numbers keyed by zone id
+    :type zones: dict
+    :arg names: Optional zone names keyed by zone id
+    :type names: dict
+    :arg zonn: Write zonn instead of zone keyword
+    :type zonn: bool
+
+    Example:
+    from pylagrit import utilities as util
+    zones = util.read_zone('mesh_material.zone')
+    util.write_zone('mesh_top.zonn', {10: zones[1]}, names={10: 'top'}, zonn=True)
+    """
+    names = {} if names is None else names
+    with open(zonefile, "wb") as fh:
+        fh.write(b"zonn\n" if zonn else b"zone\n")
+        for zid, nodes in zones.items():
+            nodes = np.asarray(nodes, dtype=np.int64).ravel()
+            if nodes.size and (nodes.min() < 0 or nodes.max() >= 10 ** ZONE_WIDTH):
+                raise ValueError("Node numbers of zone %d do not fit i10" % zid)
+            line = "%05d" % zid
+            if names.get(zid):
+                line += "  " + names[zid]
+            fh.write(("%s\nnnum\n%10d\n" % (line, nodes.size)).encode())
+            _write_node_list(fh, nodes)
+        fh.write(b" \nstop\n")
+
+
+def merge_zones(*zones):
+    """
+    Merge zones with the same id from several zone dictionaries
+
+    The union of every zone is formed with a single sort of all node
+    numbers, so hundreds of zones are merged at once.
+
+    :arg zones: Zone dictionaries as returned by read_zone
+    :type zones: dict
+    :returns: OrderedDict of sorted int32 arrays of node numbers keyed by zone id
+
+    Example:
+    from pylagrit import utilities as util
+    zones = util.merge_zones(util.read_zone('a.zone'), util.read_zone('b.zone'))
+    """
+    ids = []
+    for z in zones:
+        ids += [k for k in z.keys() if k not in ids]
+    index = dict([(k, i) for i, k in enumerate(ids)])
+    labels = []
+    nodes = []
+    for z in zones:
+        for k, v in z.items():
+            v = np.asarray(v, dtype=np.int64).ravel()
+            labels.append(np.full(v.size, index[k], dtype=np.int64))
+            nodes.append(v)
+    labels = np.concatenate(labels + [np.zeros(0, dtype=np.int64)])
+    nodes = np.concatenate(nodes + [np.zeros(0, dtype=np.int64)])
+    # Unique (zone, node) pairs sort by zone first, then node
+    keys = _unique((labels << 32) | nodes)
+    return _split_zones(ids, keys >> 32, keys & 0xFFFFFFFF)
+
+
+def subtract_zones(zones, nodes):
+    """
+    Remove nodes from every zone
+
+    Membership of all zones is tested at once.
+
+    :arg zones: Zone dictionary as returned by read_zone
+    :type zones: dict
+    :arg nodes: 1-based node numbers to remove, or a zone dictionary
+        whose nodes are all removed
+    :type nodes: array_like(int) or dict
+    :returns: OrderedDict of int32 arrays of node numbers keyed by zone id
+
+    Example:
+    from pylagrit import utilities as util
+    zones = util.read_zone('mesh_material.zone')
+    outside = util.read_zone('mesh_outside.zone')
+    interior = util.subtract_zones(zones, outside)
+    """
+    if isinstance(nodes, dict):
+        nodes = [np.asarray(v).ravel() for v in nodes.values()]
+        nodes = np.concatenate(nodes + [np.zeros(0, dtype=np.int64)])
+    ids = list(zones.keys())
+    counts = [np.size(v) for v in zones.values()]
+    labels = np.repeat(np.arange(len(ids)), counts)
+    allnodes = np.concatenate(
+        [np.asarray(v).ravel() for v in zones.values()] + [np.zeros(0, dtype=np.int64)]
+    )
+    keep = ~np.isin(allnodes, nodes)
+    return _split_zones(ids, labels[keep], allnodes[keep])
+
+
+def _split_zones(ids, labels, nodes):
+    # Split node numbers sorted by zone label into a dictionary keyed by id
+    bounds = np.searchsorted(labels, np.arange(len(ids) + 1))
+    return OrderedDict(
+        [
+            (k, nodes[bounds[i] : bounds[i + 1]].astype(np.int32))
+            for i, k in enumerate(ids)
+        ]
+    )
+
+
+def _node_list_end(buf, pos, ends):
+    # Node numbers run to the first list end marker after pos. The next
+    # occurrence of each marker is cached in ends, so the file is only
+    # scanned once however many zones it holds.
+    end = len(buf)
+    for k in _LIST_ENDS:
+        if ends[k] < pos and ends[k] != len(buf):
+            ends[k] = buf.find(k, pos)
+            if ends[k] < 0:
+                ends[k] = len(buf)
+        if ends[k] == len(buf):
+            continue
+        if k.startswith(b"\n"):
+            end = min(end, ends[k] + 1)
+        else:
+            line = buf.rfind(b"\n", 0, ends[k]) + 1
+            if k == b"nnum":
+                # The zone id line precedes nnum
+                line = buf.rfind(b"\n", 0, line - 1) + 1
+            end = min(end, line)
+    return end
+
+
+def _zone_keywords(chunk):
+    # Offsets of zone keyword lines in a block of whole lines
+    k = chunk.find(b"zone")
+    while k >= 0:
+        if chunk[chunk.rfind(b"\n", 0, k) + 1 : k].strip() == b"":
+            nl = chunk.find(b"\n", k)
+            if chunk[k + 4 : nl if nl >= 0 else len(chunk)].strip() == b"":
+                yield k
+        k = chunk.find(b"zone", k + 4)
+
+
+def _unique(a):
+    # Sorted unique values
+    a = np.sort(a)
+    return a[np.concatenate([[True], a[1:] != a[:-1]])] if a.size else a
+
+
+def _write_node_list(fh, nodes):
+    # Full lines of i10 fields, then the rest on a shorter last line
+    nfull = nodes.size // ZONE_COLUMNS * ZONE_COLUMNS
+    np.savetxt(fh, nodes[:nfull].reshape(-1, ZONE_COLUMNS), fmt="%10d")
+    if nfull < nodes.size:
+        rest = " ".join(["%10d" % v for v in nodes[nfull:]])
+        fh.write((rest + "\n").encode())
+
+
+def _line_chunks(fh):
+    # Blocks of whole lines
+    tail = b""
+    while True:
+        chunk = fh.read(_ZONE_CHUNK)
+        if not chunk:
+            if tail:
+                yield tail
+            return
+        chunk = tail + chunk
+        cut = chunk.rfind(b"\n") + 1
+        if cut == 0:
+            tail = chunk
+            continue
+        tail = chunk[cut:]
+        yield chunk[:cut]
 
 
 def spherical_writeFEHM(node_locations, filename_base, title="default"):
@@ -23,5 +23,6 @@ setup(
     ],
     packages=[
         "pylagrit",
+        "pylagrit.io",
     ],
 )
@@ -174,6 +174,924 @@ class TestPyLaGriT(unittest.TestCase):
             
         if any([not isinstance(x, pylagrit.MO) for x in mo_subs]):
             raise ValueError('MO not returned.')
+
+    def test_dump_vtu(self):
+        '''
+        Test the VTU Dump Function
+
+        Tests that a mesh object can be written as a raw and a zlib
+        compressed binary vtu file.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((3, 3, 3), (0, 0, 0), (1, 1, 1))
+            mo.dump_vtu('test.vtu')
+            mo.dump_vtu('test_zlib.vtu', attributes=['imt1'], compression='zlib')
+        for f in ['test.vtu', 'test_zlib.vtu']:
+            with open(f, 'rb') as fh:
+                if b'<Piece NumberOfPoints="27" NumberOfCells="8">' not in fh.read():
+                    raise ValueError('Unexpected vtu file contents.')
+            os.remove(f)
+
+    def test_dump_xdmf(self):
+        '''
+        Test the XDMF Dump Function
+
+        Tests that a mesh object can be written as XDMF with binary heavy
+        data and that a time step can be appended.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((3, 3, 3), (0, 0, 0), (1, 1, 1))
+            mo.dump_xdmf('test_xdmf', attributes=['imt1'])
+            mo.dump_xdmf('test_xdmf', attributes=['imt1'], time=1., append=True)
+        fs = glob.glob('test_xdmf*')
+        if len(fs) != 5 or os.path.getsize('test_xdmf_coords.bin') != 27*3*8:
+            raise ValueError('Unexpected xdmf files.')
+        for f in fs:
+            os.remove(f)
+
+    def test_dump_compressed(self):
+        '''
+        Test Compressed Dump and Read
+
+        Tests that a mesh object dumped with compression can be read back
+        and matches the uncompressed dump, and that every streamed format,
+        and the staged LaGriT format, decompresses to the uncompressed dump.
+        '''
+
+        import gzip
+        from pylagrit.io.compress import STREAM_FORMATS
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((3, 3, 3), (0, 0, 0), (1, 1, 1))
+            mo.dump('test_gz.inp', compress='gz')
+            mo2 = lg.read('test_gz.inp.gz')
+            mo2.dump('test_gz2.inp')
+        from pylagrit.io import read_avs
+        a = read_avs('test_gz.inp.gz')
+        b = read_avs('test_gz2.inp')
+        if not (a['coords'] == b['coords']).all() or not (a['itet'] == b['itet']).all():
+            raise ValueError('Compressed round trip does not match.')
+        for f in ['test_gz.inp.gz', 'test_gz2.inp']:
+            os.remove(f)
+        ext = {'avs': '.inp', 'avs2': '.inp', 'gmv': '.gmv', 'tecplot': '.plt'}
+        for format in STREAM_FORMATS + ['lagrit', None]:
+            with suppress_stdout():
+                mo.dump('test_gz' + ext.get(format, '.lg'), format)
+                mo.dump('test_gz2.lg', format, compress='gz')
+            gzname = 'test_gz2.lg' + ('.plt' if format == 'tecplot' else '') + '.gz'
+            with open('test_gz' + ext.get(format, '.lg'), 'rb') as fh, gzip.open(gzname) as gz:
+                if fh.read() != gz.read():
+                    raise ValueError('Compressed %s dump does not match.' % format)
+            for f in ['test_gz' + ext.get(format, '.lg'), gzname]:
+                os.remove(f)
+
+    def test_read_avs(self):
+        '''
+        Test the Chunked AVS Reader
+
+        Tests that reading an AVS file in small chunks with a pool of
+        workers matches a single chunk read and the mesh dumped.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((4, 4, 4), (0, 0, 0), (1, 1, 1))
+            mo.dump('test_read.inp', 'avs2')
+        from pylagrit.io import read_avs
+        a = read_avs('test_read.inp', workers=1)
+        b = read_avs('test_read.inp', chunksize=10, workers=2)
+        os.remove('test_read.inp')
+        if a['coords'].shape != (64, 3) or len(a['itet']) != 27*8:
+            raise ValueError('Unexpected mesh read.')
+        for k in ['coords', 'itet', 'itetoff', 'itettyp', 'itetclr']:
+            if not (a[k] == b[k]).all():
+                raise ValueError('Chunked read of %s does not match.' % k)
+        if not (a['node_attributes']['imt1'] == b['node_attributes']['imt1']).all():
+            raise ValueError('Chunked read of node attributes does not match.')
+
+    def test_create_boundary_facesets(self):
+        '''
+        Test the Boundary Faceset Creation
+
+        Tests that each boundary faceset file matches the file written by
+        EltSet.create_faceset for the same side.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((4, 3, 3), (0, 0, 0), (3, 2, 2))
+            fs = mo.create_boundary_facesets(base_name='test_fs')
+            mo_surf = mo.extract_surfmesh(external=True)
+            mo_surf.settets_normal()
+            for i, side in enumerate(fs.keys()):
+                e = mo_surf.eltset_attribute('itetclr', i + 1)
+                e.create_faceset('test_fs_ref.avs')
+                with open(fs[side].filename) as f1, open('test_fs_ref.avs') as f2:
+                    if f1.read() != f2.read():
+                        raise ValueError('Faceset %s does not match.' % side)
+        for f in glob.glob('test_fs*.avs'):
+            os.remove(f)
+
+    def test_create_facesets(self):
+        '''
+        Test the Batch Faceset Creation
+
+        Tests that facesets written together match facesets written one at
+        a time and contain one row per element of the element set.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((4, 3, 3), (0, 0, 0), (3, 2, 2))
+            mo_surf = mo.extract_surfmesh(external=True)
+            mo_surf.settets_normal()
+            etop = mo_surf.eltset_attribute('itetclr', 2)
+            eright = mo_surf.eltset_attribute('itetclr', 3)
+            fs = mo_surf.create_facesets([etop, eright], ['test_fsb1.avs', 'test_fsb2.avs'])
+            etop.create_faceset('test_fsb3.avs')
+        with open('test_fsb1.avs') as f1, open('test_fsb3.avs') as f2:
+            lines = f1.readlines()
+            if lines != f2.readlines():
+                raise ValueError('Batch faceset does not match.')
+        if len(lines) != 4 + 6 or fs[eright.name].filename != 'test_fsb2.avs':
+            raise ValueError('Unexpected faceset.')
+        for f in glob.glob('test_fsb*.avs'):
+            os.remove(f)
+
+    def test_dump_many(self):
+        '''
+        Test the Concurrent Dump Function
+
+        Tests that formats written by parallel sessions match files dumped
+        directly and that a timing is returned for each format.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((4, 4, 4), (0, 0, 0), (1, 1, 1))
+            mo.dump('test_many_ref.inp', 'avs')
+            mo.dump_fehm('test_many_ref')
+            times = mo.dump_many({'avs': 'test_many.inp', 'fehm': ('test_many',)})
+        if list(times.keys()) != ['snapshot', 'avs', 'fehm']:
+            raise ValueError('Unexpected timings.')
+        for ext in ['.inp', '.fehmn', '_material.zone']:
+            with open('test_many' + ext) as f1, open('test_many_ref' + ext) as f2:
+                if f1.read() != f2.read():
+                    raise ValueError('Concurrent dump of %s does not match.' % ext)
+        for f in glob.glob('test_many*'):
+            os.remove(f)
+
+    def test_zone(self):
+        '''
+        Test the Zone File Utilities
+
+        Tests that a zone file written by LaGriT is read, rewritten and read
+        back by LaGriT, and that zones are converted, merged and subtracted.
+        '''
+
+        from pylagrit import utilities as util
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create()
+            mo.createpts_brick_xyz((4, 4, 4), (0, 0, 0), (1, 1, 1))
+            p = mo.pset_geom_xyz((0, 0, 0), (0.5, 0.5, 0.5))
+            p.dump('test_zone', zonetype='zone')
+        zones, names = util.read_zone('test_zone_' + p.name + '.zone', names=True)
+        if list(zones[1]) != [1, 2, 5, 6, 17, 18, 21, 22] or names[1] != p.name:
+            raise ValueError('Unexpected zone read.')
+        util.write_zone('test_zone2.zone', {4: zones[1], 9: [64]})
+        with suppress_stdout():
+            mo.sendline('read/zone/test_zone2.zone/' + mo.name + '/zid')
+            mo.dump('test_zone2.inp')
+        from pylagrit.io import read_avs
+        zid = read_avs('test_zone2.inp')['node_attributes']['zid']
+        if zid.sum() != 4 * 8 + 9 or zid[63] != 9:
+            raise ValueError('Written zone file not read by LaGriT.')
+        util.zone_to_zonn('test_zone2.zone', inplace=True)
+        if util.read_zone('test_zone2.zonn')[9][0] != 64:
+            raise ValueError('Unexpected zonn file.')
+        merged = util.merge_zones(zones, {1: [64, 2], 3: [7]})
+        if list(merged[1]) != [1, 2, 5, 6, 17, 18, 21, 22, 64] or list(merged[3]) != [7]:
+            raise ValueError('Unexpected merged zones.')
+        if list(util.subtract_zones(merged, [1, 64, 7])[3]) != []:
+            raise ValueError('Unexpected subtracted zones.')
+        for f in glob.glob('test_zone*'):
+            os.remove(f)
+
+    def test_dump_zones_by_attribute(self):
+        '''
+        Test Batched Zone Export
+
+        Tests that per material zones match dump/zone_imt, that several
+        psets are written to a single zone file LaGriT can read, and that a
+        list of psets is written to one file each.
+        '''
+
+        from pylagrit import utilities as util
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create()
+            mo.createpts_brick_xyz((3, 3, 2), (0, 0, 0), (1, 1, 1))
+            mo.setatt('imt', 7, stride=[1, 4, 0])
+            zones = mo.dump_zones_by_attribute('imt', 'test_zba')
+            mo.dump_zone_imt('test_zba_lg', 7)
+            ps = [mo.pset_geom_xyz((0.5 * i - 0.01, 0, 0), (0.5 * i + 0.01, 1, 1)) for i in range(3)]
+            mo.dump_pset('test_zba_ps', pset=ps, single_file=True)
+            mo.dump_pset('test_zba_sel', pset=ps[1:2])
+            mo.sendline('read/zone/test_zba_ps.zone/' + mo.name + '/zid')
+            zid = mo.to_arrays()['node_attributes']['zid']
+        if list(zones) != [0, 7] or list(zones[7]) != list(util.read_zone('test_zba_lg_material.zone')[7]):
+            raise ValueError('Unexpected material zones.')
+        if list(util.read_zone('test_zba_imt.zone')[0]) != list(range(5, 19)):
+            raise ValueError('Unexpected material zone file.')
+        if list(zid) != [1, 2, 3] * 6:
+            raise ValueError('Combined pset zone file not read by LaGriT.')
+        if glob.glob('test_zba_sel*') != ['test_zba_sel_' + ps[1].name + '.zone']:
+            raise ValueError('Unexpected files for a list of psets.')
+        for f in glob.glob('test_zba*'):
+            os.remove(f)
+
+    def test_connect_parallel(self):
+        '''
+        Test Tiled Parallel Connect
+
+        Tests that connecting a point cloud in one or four tiles gives the
+        same tetrahedra, which match those of connect away from the hull.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        numpy.random.seed(0)
+        write_avs('test_cp_pts.inp', numpy.random.rand(300, 3))
+        tets = []
+        with suppress_stdout():
+            for tiles in [None, 1, 4]:
+                mo = lg.read('test_cp_pts.inp')
+                if tiles is None:
+                    mo.connect()
+                else:
+                    mo = mo.connect_parallel(tiles=tiles, resetpts_itp=False)
+                mesh = mo.to_arrays()
+                xyz = mesh['coords'][mesh['itet'].reshape(-1, 4) - 1].round(8)
+                tets.append(set(tuple(sorted(map(tuple, t))) for t in xyz.tolist()))
+        if tets[1] != tets[2]:
+            raise ValueError('Tiled connect depends on the number of tiles.')
+        inner = set(t for t in tets[0] if numpy.all((numpy.array(t) > 0.2) & (numpy.array(t) < 0.8)))
+        if not inner <= tets[2]:
+            raise ValueError('Tiled connect does not match connect inside the hull.')
+        os.remove('test_cp_pts.inp')
+
+    def test_merge_tree(self):
+        '''
+        Test Tree Reduction Merge
+
+        Tests that merging in a balanced tree, in this and in worker
+        sessions, matches merging one mesh object after another and leaves
+        no intermediate mesh objects.
+        '''
+
+        import numpy
+        lg = self.lg
+        arrays = []
+        with suppress_stdout():
+            mos = []
+            for i in range(11):
+                mo = lg.create_hex()
+                mo.createpts_brick_xyz((3, 3, 2), (i, 0, 0), (i + 1, 1, 1))
+                mo.setatt('imt', i + 1)
+                mos.append(mo)
+            for mo in mos:
+                lg.sendline('addmesh/merge/test_seq/test_seq/' + mo.name)
+            lg.mo['test_seq'] = pylagrit.MO('test_seq', lg)
+            arrays.append(lg.mo['test_seq'].to_arrays())
+            names = set(lg.mo)
+            for workers in [None, 2]:
+                arrays.append(lg.merge(mos, workers=workers).to_arrays())
+        if len(set(lg.mo) - names) != 2:
+            raise ValueError('Intermediate mesh objects were not released.')
+        for a in arrays[1:]:
+            for k in ['coords', 'itet', 'itetclr', 'itettyp']:
+                if not numpy.array_equal(arrays[0][k], a[k]):
+                    raise ValueError('Merged %s differs from sequential merge.' % k)
+            if not numpy.array_equal(arrays[0]['node_attributes']['imt1'], a['node_attributes']['imt1']):
+                raise ValueError('Merged imt differs from sequential merge.')
+
+    def test_refine_to_object(self):
+        '''
+        Test Multi Level Refinement to an Object
+
+        Tests that refining to a surface with several levels refines as
+        much as refining to it one level at a time, and that the nodes of
+        intersecting elements get the requested imt.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        write_avs('test_rto_surf.inp', numpy.array([[-1., -1., 0.3], [2., -1., 0.4], [-1., 2., 0.5]]),
+                  [1, 2, 3], [0], [3], [1])
+        nelems = []
+        with suppress_stdout():
+            surf = lg.read('test_rto_surf.inp')
+            for levels in [[3], [None] * 3]:
+                mo = lg.create_hex()
+                mo.createpts_brick_xyz((5, 5, 5), (0, 0, 0), (1, 1, 1))
+                for level in levels:
+                    mo.refine_to_object(surf, level=level)
+                nelems.append(mo.information()['elements'])
+            mo.refine_to_object(surf, imt=7)
+            imt = mo.to_arrays()['node_attributes']['imt1']
+        if nelems[0] != nelems[1] or nelems[0] <= 64:
+            raise ValueError('Unexpected number of elements after refinement.')
+        if not 0 < (imt == 7).sum() < len(imt) or (imt == 13).any():
+            raise ValueError('imt not set to the requested value.')
+        os.remove('test_rto_surf.inp')
+
+    def test_classify_nodes(self):
+        '''
+        Test Node Classification by Shapes
+
+        Tests that labels from classify_nodes match setting an attribute on
+        the pset of each shape in turn.
+        '''
+
+        lg = self.lg
+        shapes = [{'mins': (0, 0, 0), 'maxs': (1, 1, 0.45)},
+                  {'mins': (0.2, 0.2, 0.3), 'maxs': (0.8, 0.8, 0.9), 'value': 7},
+                  {'geom': 'rtz', 'mins': (0, 45, 0), 'maxs': (0.3, 200, 0.7), 'ctr': (0.5, 0.5, 0.1)},
+                  {'geom': 'rtp', 'mins': (0.2, 0, 0), 'maxs': (0.45, 100, 300), 'ctr': (0.25, 0.5, 0.5)}]
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((9, 9, 9), (0, 0, 0), (1, 1, 1))
+            labels = mo.classify_nodes(shapes)
+            mo.addatt('ref', vtype='VINT')
+            for i, shape in enumerate(shapes):
+                p = mo.pset_geom(shape['mins'], shape['maxs'], ctr=shape.get('ctr', (0, 0, 0)),
+                                 geom=shape.get('geom', 'xyz'))
+                p.setatt('ref', shape.get('value', i + 1))
+            atts = mo.to_arrays()['node_attributes']
+        if len(set(labels)) != 5 or (atts['id_region'] != labels).any() or (atts['ref'] != labels).any():
+            raise ValueError('Node labels differ from pset/geom.')
+
+    def test_assign_from_raster(self):
+        '''
+        Test Raster Sampling into Attributes
+
+        Tests nearest sampling into element materials, keeping elements on
+        nodata cells, and that bilinear sampling of a linear raster into a
+        node attribute reproduces it between cell centers.
+        '''
+
+        import numpy
+        lg = self.lg
+        x, y = numpy.meshgrid(numpy.arange(0.5, 4), numpy.arange(3.5, 0, -1))
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((5, 5, 2), (0, 0, 0), (4, 4, 1))
+            mo.assign_from_raster([[1, 2], [3, -9]], (0, 0), 2., 'itetclr', nodata=-9)
+            mo.assign_from_raster(x + 2 * y, (0, 0), (1., 1.), 'ramp', method='bilinear')
+            arrays = mo.to_arrays()
+        centroids = numpy.add.reduceat(arrays['coords'][arrays['itet'] - 1], arrays['itetoff']) / 8
+        left, top = centroids[:, 0] < 2, centroids[:, 1] > 2
+        expected = numpy.where(top, numpy.where(left, 1, 2), numpy.where(left, 3, 1))
+        if (arrays['itetclr'] != expected).any():
+            raise ValueError('Unexpected materials sampled from raster.')
+        coords = arrays['coords']
+        within = numpy.all((coords[:, :2] >= 0.5) & (coords[:, :2] <= 3.5), axis=1)
+        ramp = arrays['node_attributes']['ramp']
+        if not within.any() or not numpy.allclose(ramp[within], (coords[:, 0] + 2 * coords[:, 1])[within]):
+            raise ValueError('Unexpected bilinear values sampled from raster.')
+
+    def test_read_dem(self):
+        '''
+        Test Reading ESRI ASCII and Binary DEMs
+
+        Tests that elevations land on the cell centers, that NODATA nodes are
+        removed, and that a binary grid read in tiles has the same nodes.
+        '''
+
+        import numpy
+        lg = self.lg
+        z = numpy.arange(35.).reshape(5, 7)
+        z[0, 0] = -9999.
+        header = 'ncols 7\nnrows 5\nxllcorner 10\nyllcorner 20\ncellsize 2\nNODATA_value -9999\n'
+        with open('test_dem.asc', 'w') as fh:
+            fh.write(header)
+            numpy.savetxt(fh, z, fmt='%g')
+        with open('test_dem.hdr', 'w') as fh:
+            fh.write(header + 'byteorder LSBFIRST\n')
+        z.astype('<f4').tofile('test_dem.flt')
+        with suppress_stdout():
+            surf = lg.read_dem('test_dem.asc', block_rows=2).to_arrays()
+            tiles = [t.to_arrays() for t in lg.read_dem('test_dem.flt', tiles=(2, 2))]
+        coords = surf['coords']
+        rows = numpy.rint((29 - coords[:, 1]) / 2).astype(int)
+        cols = numpy.rint((coords[:, 0] - 11) / 2).astype(int)
+        if len(coords) != 34 or len(surf['itettyp']) != 23 or (coords[:, 2] != z[rows, cols]).any():
+            raise ValueError('Unexpected DEM surface.')
+        tiled = numpy.unique(numpy.concatenate([t['coords'] for t in tiles]), axis=0)
+        if (tiled != numpy.unique(coords, axis=0)).any() or sum(len(t['itettyp']) for t in tiles) != 23:
+            raise ValueError('Tiled DEM surface differs.')
+        for f in glob.glob('test_dem.*'):
+            os.remove(f)
+
+    def test_refine_to_size(self):
+        '''
+        Test Refining to a Target Size
+
+        Tests that only hexes larger than a size field are refined, and that
+        leaf elements end up no larger than their target size.
+        '''
+
+        import numpy
+        lg = self.lg
+        size = lambda xyz: 0.02 + numpy.linalg.norm(xyz, axis=1)
+        with suppress_stdout():
+            m = lg.create()
+            m.createpts_brick_xyz((5, 5, 5), (0, 0, 0), (1, 1, 1))
+            result = m.refine_to_size(size, max_passes=4)
+            arrays = m.to_arrays()
+        if not result['converged'] or result['refined'] != [1]:
+            raise ValueError('Unexpected refinement passes.')
+        leaves = arrays['element_attributes']['itetkid'] == 0
+        coords = arrays['coords'][arrays['itet'] - 1].reshape(-1, 8, 3)[leaves]
+        edges = coords.max(axis=1) - coords.min(axis=1)
+        if (edges[:, 0] > size(coords.mean(axis=1))).any():
+            raise ValueError('Element larger than its target size.')
+        if len(arrays['itettyp']) != 64 + 8 * sum(result['refined']):
+            raise ValueError('Unexpected number of elements.')
+
+    def test_improve(self):
+        '''
+        Test Improving Mesh Quality until it Stalls
+
+        Tests that sweeps on a jittered triangle mesh raise the mean aspect
+        ratio, stop once it no longer improves, and remove the aratio
+        attribute they added.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        n = 10
+        x, y = numpy.meshgrid(numpy.linspace(0, 1, n), numpy.linspace(0, 1, n))
+        coords = numpy.column_stack([x.ravel(), y.ravel(), numpy.zeros(n * n)])
+        inner = (coords[:, :2] > 0).all(axis=1) & (coords[:, :2] < 1).all(axis=1)
+        numpy.random.seed(0)
+        coords[inner, :2] += numpy.random.uniform(-0.05, 0.05, (inner.sum(), 2))
+        k = (numpy.arange(n - 1) + n * numpy.arange(n - 1)[:, None]).ravel()
+        itet = numpy.concatenate([numpy.column_stack([k, k + 1, k + n + 1]),
+                                  numpy.column_stack([k, k + n + 1, k + n])]) + 1
+        nelem = len(itet)
+        write_avs('test_improve.inp', coords, itet.ravel(), 3 * numpy.arange(nelem),
+                  numpy.full(nelem, 3), numpy.ones(nelem, int))
+        with suppress_stdout():
+            mo = lg.read('test_improve.inp')
+            mo.resetpts_itp()
+            result = mo.improve(max_iters=8)
+            attributes = mo.information()['attributes']
+        mean = result['mean']
+        if mean[-1] <= mean[0] or result['sweeps'] >= 8 or len(mean) != result['sweeps'] + 1:
+            raise ValueError('Unexpected improvement sweeps.')
+        if 'aratio' in attributes:
+            raise ValueError('Quality attribute left behind.')
+        os.remove('test_improve.inp')
+
+    def test_quality_report(self):
+        '''
+        Test Element Quality Reports
+
+        Tests the metrics of a right triangle and of a flat one, that the
+        flat triangle is reported worst, and that no attributes are left.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        coords = numpy.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.], [0.6, 0.6, 0.]])
+        write_avs('test_quality.inp', coords, [1, 2, 3, 2, 4, 3], [0, 3], [3, 3], [1, 1])
+        with suppress_stdout():
+            mo = lg.read('test_quality.inp')
+            attributes = list(mo.information()['attributes'])
+            report = mo.quality_report(bins=5, worst=1)
+            if list(mo.information()['attributes']) != attributes:
+                raise ValueError('Quality attributes left behind.')
+        if list(report) != ['aspect', 'edge_ratio', 'volume', 'dihedral_min']:
+            raise ValueError('Unexpected metrics.')
+        if not numpy.allclose(report['volume']['values'], [0.5, 0.1]):
+            raise ValueError('Unexpected areas.')
+        angle = numpy.degrees(numpy.arctan(0.2))
+        if not numpy.allclose(report['dihedral_min']['values'], [45., angle]):
+            raise ValueError('Unexpected minimum angles.')
+        for metric in ['aspect', 'edge_ratio', 'dihedral_min']:
+            if list(report[metric]['worst']) != [2]:
+                raise ValueError('Flat triangle not reported worst.')
+        if report['aspect']['histogram'][0].sum() != 2:
+            raise ValueError('Unexpected histogram.')
+        os.remove('test_quality.inp')
+
+    def test_upscale_many(self):
+        '''
+        Test Upscaling Several Attributes with One Search
+
+        Tests that each method gives the same values as upscale reusing the
+        pt_gtg attribute, and that a returned mapping can be reused.
+        '''
+
+        import numpy
+        lg = self.lg
+        methods = ['sum', 'min', 'max', 'ariave', 'harave', 'geoave']
+        with suppress_stdout():
+            src = lg.create()
+            src.createpts_brick_xyz((11, 9, 7), (0, 0, 0), (1, 1, 1))
+            src.addatt('perm')
+            coords = src.to_arrays()['coords']
+            numpy.savetxt('test_upscale.txt', numpy.exp(coords[:, 0] + 2 * coords[:, 1] - coords[:, 2]))
+            src.sendline('cmo/readatt/' + src.name + '/perm/1,0,0/test_upscale.txt')
+            snk = lg.create()
+            snk.createpts_brick_xyz((3, 4, 2), (0, 0, 0), (1, 1, 1))
+            for method in methods:
+                snk.addatt('lg_' + method)
+                snk.upscale(method, 'lg_' + method, src, 'perm', boundary_choice='single', keepatt=True)
+            src.delatt(['pt_gtg', 'dups_gtg'])
+            mapping = snk.upscale_many([(m, 'np_' + m, 'perm') for m in methods], src)
+            snk.upscale_many([('ariave', 'again', 'perm')], src, mapping=mapping)
+            values = snk.to_arrays()['node_attributes']
+        for method in methods:
+            if not numpy.allclose(values['lg_' + method], values['np_' + method], rtol=1e-10):
+                raise ValueError('Upscaled values differ for ' + method)
+        if (values['again'] != values['np_ariave']).any() or mapping.min() < 1:
+            raise ValueError('Unexpected reuse of the mapping.')
+        os.remove('test_upscale.txt')
+
+    def test_interpolate_many(self):
+        '''
+        Test Interpolating Several Attributes with One Search
+
+        Tests that continuous interpolation of linear fields on triangles is
+        exact, that points outside are flagged, that a plan is reused, that
+        voronoi takes nearest node values, and that continuous interpolation
+        of linear fields from distorted hexes and prisms is exact for every
+        attribute.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        n = 6
+        x, y = numpy.meshgrid(numpy.linspace(0, 1, n), numpy.linspace(0, 1, n))
+        coords = numpy.column_stack([x.ravel(), y.ravel(), numpy.zeros(n * n)])
+        k = (numpy.arange(n - 1) + n * numpy.arange(n - 1)[:, None]).ravel()
+        itet = numpy.concatenate([numpy.column_stack([k, k + 1, k + n + 1]),
+                                  numpy.column_stack([k, k + n + 1, k + n])]) + 1
+        nelem = len(itet)
+        write_avs('test_interp_src.inp', coords, itet.ravel(), 3 * numpy.arange(nelem),
+                  numpy.full(nelem, 3), numpy.ones(nelem, int),
+                  node_attributes={'f': 1 + coords[:, 0] + 3 * coords[:, 1],
+                                   'g': 2 - coords[:, 1]})
+        numpy.random.seed(0)
+        points = numpy.column_stack([numpy.random.uniform(-0.2, 1.2, (30, 2)), numpy.zeros(30)])
+        write_avs('test_interp_snk.inp', points)
+        with suppress_stdout():
+            src = lg.read('test_interp_src.inp')
+            snk = lg.read('test_interp_snk.inp')
+            plan = snk.interpolate_many('continuous', [('f', None)], src)
+            snk.interpolate_many('continuous', [('g', None)], src, plan=plan)
+            snk.interpolate_many('voronoi', [('fv', 'f')], src)
+            values = snk.to_arrays()['node_attributes']
+        inside = ((points[:, :2] >= 0) & (points[:, :2] <= 1)).all(axis=1)
+        if not numpy.allclose(values['f'][inside], 1 + points[inside, 0] + 3 * points[inside, 1]):
+            raise ValueError('Unexpected continuous interpolation.')
+        if not numpy.allclose(values['g'][inside], 2 - points[inside, 1]):
+            raise ValueError('Unexpected interpolation with a plan.')
+        if (values['f'][~inside] != 6).any() or (plan.element[inside] == 0).any():
+            raise ValueError('Unexpected flag values.')
+        nearest = numpy.rint(numpy.clip(points[:, :2], 0, 1) * (n - 1)) / (n - 1)
+        if not numpy.allclose(values['fv'], 1 + nearest[:, 0] + 3 * nearest[:, 1]):
+            raise ValueError('Unexpected voronoi interpolation.')
+        # Linear fields are exact in distorted hexes and prisms
+        n = 5
+        g = numpy.stack(numpy.meshgrid(*[numpy.linspace(0, 1, n)] * 3, indexing='ij'), -1)
+        g = g.reshape(-1, 3)
+        g[:, 2] += 0.3 * g[:, 0] * g[:, 1] * g[:, 2]
+        k = numpy.arange(n ** 3).reshape(n, n, n)[:-1, :-1, :-1].ravel()[:, None]
+        c = [0, n * n, n * n + n, n, 1, n * n + 1, n * n + n + 1, n + 1]
+        elements = {8: k + numpy.array(c),
+                    7: numpy.concatenate([k + numpy.array([c[i] for i in [0, 1, 2, 4, 5, 6]]),
+                                          k + numpy.array([c[i] for i in [0, 2, 3, 4, 6, 7]])])}
+        points = numpy.random.uniform(0.05, 0.95, (125, 3))
+        write_avs('test_interp_snk.inp', points)
+        for t, itet in elements.items():
+            nelem, width = itet.shape
+            write_avs('test_interp_src.inp', g, itet.ravel() + 1, width * numpy.arange(nelem),
+                      numpy.full(nelem, t), numpy.ones(nelem, int),
+                      node_attributes={'f': 1 + g[:, 0] + 2 * g[:, 1] + 3 * g[:, 2]})
+            with suppress_stdout():
+                src = lg.read('test_interp_src.inp')
+                snk = lg.read('test_interp_snk.inp')
+                snk.interpolate_many('continuous', [('f', None), ('fpy', 'f')], src)
+                values = snk.to_arrays()['node_attributes']
+            f = 1 + points[:, 0] + 2 * points[:, 1] + 3 * points[:, 2]
+            if not numpy.allclose(values['f'], f) or not numpy.allclose(values['fpy'], f):
+                raise ValueError('Unexpected continuous interpolation in type %d.' % t)
+        os.remove('test_interp_src.inp')
+        os.remove('test_interp_snk.inp')
+
+    def test_spatial_index(self):
+        '''
+        Test Searching a Mesh Object with a Spatial Index
+
+        Tests that distances and voronoi values found with an index agree
+        with LaGriT, that it stays fresh while other mesh objects change,
+        and that it is built again after the mesh object changes, also by
+        commands sent to the session.
+        '''
+
+        import numpy
+        from pylagrit import SpatialIndex
+        from pylagrit.io import write_avs
+        lg = self.lg
+        numpy.random.seed(0)
+        coords = numpy.random.rand(200, 3)
+        points = numpy.random.uniform(-0.2, 1.2, (50, 3))
+        write_avs('test_index_src.inp', coords, node_attributes={'f': numpy.arange(200.)})
+        write_avs('test_index_snk.inp', points)
+        with suppress_stdout():
+            src = lg.read('test_index_src.inp')
+            snk = lg.read('test_index_snk.inp')
+            index = SpatialIndex(src)
+            snk.compute_distance(src, attname='dlag')
+            snk.compute_distance(src, attname='didx', index=index)
+            tree = index._nodes
+            snk.interpolate_voronoi('fv', src, 'f', index=index)
+            reused = index._nodes is tree and not index.stale
+            src.setatt('xic', 2.)
+            stale = index.stale
+            snk.compute_distance(src, attname='dmoved', index=index)
+            rebuilt = index._nodes is not tree
+            lg.sendline('cmo/setatt/' + src.name + '/yic/1,0,0/2.')
+            direct = index.stale
+            snk.compute_distance(src, attname='ddirect', index=index)
+            values = snk.to_arrays()['node_attributes']
+        d = numpy.sqrt(((points[:, None] - coords[None]) ** 2).sum(axis=2))
+        if not numpy.allclose(values['didx'], values['dlag']):
+            raise ValueError('Indexed distances differ from LaGriT.')
+        if (values['fv'] != d.argmin(axis=1)).any():
+            raise ValueError('Unexpected voronoi interpolation with an index.')
+        if not reused or not stale or not rebuilt:
+            raise ValueError('Spatial index not kept or not rebuilt.')
+        coords[:, 0] = 2.
+        d = numpy.sqrt(((points[:, None] - coords[None]) ** 2).sum(axis=2))
+        if not numpy.allclose(values['dmoved'], d.min(axis=1)):
+            raise ValueError('Unexpected distances after the source moved.')
+        coords[:, 1] = 2.
+        d = numpy.sqrt(((points[:, None] - coords[None]) ** 2).sum(axis=2))
+        if not direct or not numpy.allclose(values['ddirect'], d.min(axis=1)):
+            raise ValueError('Spatial index not stale after a command sent to the session.')
+        os.remove('test_index_src.inp')
+        os.remove('test_index_snk.inp')
+
+    def test_nearest_nodes(self):
+        '''
+        Test Nearest Node Queries
+
+        Tests the k nearest nodes within a radius against a brute force
+        search, that ties, also between duplicate nodes in different leaves,
+        go to the lowest node, and that the tree is kept after attribute
+        changes and built again after the coordinates change.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        numpy.random.seed(1)
+        coords = numpy.random.rand(500, 3)
+        points = numpy.random.rand(100, 3)
+        write_avs('test_nearest.inp', coords)
+        with suppress_stdout():
+            m = lg.read('test_nearest.inp')
+            distance, node = m.nearest_nodes(points)
+            distances, nodes = m.nearest_nodes(points, k=3, radius=0.1)
+            tree = m.spatial_index()._nodes
+            m.addatt('f', value=1.)
+            m.nearest_nodes(points)
+            kept = m.spatial_index()._nodes is tree
+            m.setatt('zic', 0.)
+            moved = m.nearest_nodes(points)[0]
+            rebuilt = m.spatial_index()._nodes is not tree
+        d = numpy.sqrt(((points[:, None] - coords[None]) ** 2).sum(axis=2))
+        order = numpy.argsort(d, axis=1)[:, :3]
+        if (node != order[:, 0] + 1).any() or not numpy.allclose(distance, d.min(axis=1)):
+            raise ValueError('Unexpected nearest nodes.')
+        near = numpy.take_along_axis(d, order, axis=1) <= 0.1
+        if (nodes != numpy.where(near, order + 1, 0)).any() or (numpy.isinf(distances) == near).any():
+            raise ValueError('Unexpected nearest nodes within a radius.')
+        coords[:, 2] = 0.
+        d = numpy.sqrt(((points[:, None] - coords[None]) ** 2).sum(axis=2))
+        if not kept or not rebuilt or not numpy.allclose(moved, d.min(axis=1)):
+            raise ValueError('Nearest node tree not kept or not rebuilt.')
+        os.remove('test_nearest.inp')
+        from pylagrit.spatial import KDTree
+        grid = numpy.stack(numpy.meshgrid(*[numpy.linspace(0, 1, 11)] * 3, indexing='ij'), -1).reshape(-1, 3)
+        coords = numpy.r_[grid, grid[numpy.random.choice(len(grid), 300)]]
+        numpy.random.shuffle(coords)
+        points = numpy.r_[coords[:300], numpy.round(numpy.random.rand(300, 3) * 20) / 20]
+        tree = KDTree(coords, leafsize=4)
+        leaves = numpy.searchsorted(tree.starts, numpy.argsort(tree.order), side='right')
+        # Squared distances summed as the tree sums them
+        d = coords[None] - points[:, None]
+        d = numpy.einsum('ijk,ijk->ij', d, d)
+        tied = d == d.min(axis=1)[:, None]
+        split = [len(set(leaves[row])) > 1 for row in tied & (d == 0)]
+        if tree.query(points)[1].tolist() != tied.argmax(axis=1).tolist() or not any(split):
+            raise ValueError('Ties between nearest nodes not broken by the lowest node.')
+
+    def test_locate_probe(self):
+        '''
+        Test Locating and Probing Points in a Mesh Object
+
+        Tests the elements and barycentric weights of points in a triangle
+        mesh, linear and nearest sampling of attributes, that indexed
+        interpolation agrees with LaGriT, the trilinear weights of points in
+        distorted hexes, and points that are all outside the mesh.
+        '''
+
+        import numpy
+        from pylagrit.io import write_avs
+        lg = self.lg
+        n = 6
+        x, y = numpy.meshgrid(numpy.linspace(0, 1, n), numpy.linspace(0, 1, n))
+        coords = numpy.column_stack([x.ravel(), y.ravel(), numpy.zeros(n * n)])
+        k = (numpy.arange(n - 1) + n * numpy.arange(n - 1)[:, None]).ravel()
+        itet = numpy.concatenate([numpy.column_stack([k, k + 1, k + n + 1]),
+                                  numpy.column_stack([k, k + n + 1, k + n])]) + 1
+        nelem = len(itet)
+        write_avs('test_probe_src.inp', coords, itet.ravel(), 3 * numpy.arange(nelem),
+                  numpy.full(nelem, 3), numpy.arange(nelem) + 1,
+                  node_attributes={'f': 1 + coords[:, 0] + 3 * coords[:, 1]})
+        numpy.random.seed(2)
+        points = numpy.column_stack([numpy.random.uniform(-0.2, 1.2, (40, 2)), numpy.zeros(40)])
+        write_avs('test_probe_snk.inp', points)
+        with suppress_stdout():
+            src = lg.read('test_probe_src.inp')
+            snk = lg.read('test_probe_snk.inp')
+            meshes = len(lg.mo)
+            element, weights = src.locate(points)
+            linear = src.probe(points, ['f', 'itetclr'])
+            nearest = src.probe(points, 'f', method='nearest')
+            added = len(lg.mo) - meshes
+            index = src.spatial_index()
+            for method, att in [('continuous', 'f'), ('map', 'itetclr')]:
+                snk.interpolate_many(method, [(method + '_lg', att)], src)
+                snk.interpolate_many(method, [(method + '_idx', att)], src, index=index)
+            values = snk.to_arrays()['node_attributes']
+        inside = ((points[:, :2] > 0) & (points[:, :2] < 1)).all(axis=1)
+        if added or ((element > 0) != inside).any() or weights.shape != (40, 3):
+            raise ValueError('Unexpected located elements.')
+        located = (weights[inside, :, None] * coords[itet[element[inside] - 1] - 1]).sum(axis=1)
+        if not numpy.allclose(located, points[inside]) or (weights < -1e-8).any():
+            raise ValueError('Unexpected barycentric weights.')
+        f = linear['f']
+        if not numpy.allclose(f[inside], 1 + points[inside, 0] + 3 * points[inside, 1]):
+            raise ValueError('Unexpected linear probe.')
+        if not numpy.isnan(f[~inside]).all() or (linear['itetclr'][inside] != element[inside]).any():
+            raise ValueError('Unexpected probe outside the mesh or of element values.')
+        grid = numpy.rint(numpy.clip(points[:, :2], 0, 1) * (n - 1)) / (n - 1)
+        if not numpy.allclose(nearest['f'], 1 + grid[:, 0] + 3 * grid[:, 1]):
+            raise ValueError('Unexpected nearest probe.')
+        for method in ['continuous', 'map']:
+            if not numpy.allclose(values[method + '_idx'], values[method + '_lg']):
+                raise ValueError('Indexed %s interpolation differs from LaGriT.' % method)
+        # Distorted hexes, and points that are all outside the mesh
+        n = 5
+        g = numpy.stack(numpy.meshgrid(*[numpy.linspace(0, 1, n)] * 3, indexing='ij'), -1)
+        g = g.reshape(-1, 3)
+        g[:, 2] += 0.3 * g[:, 0] * g[:, 1] * g[:, 2]
+        k = numpy.arange(n ** 3).reshape(n, n, n)[:-1, :-1, :-1].ravel()
+        corners = [0, n * n, n * n + n, n, 1, n * n + 1, n * n + n + 1, n + 1]
+        hexes = k[:, None] + numpy.array(corners)
+        nelem = len(hexes)
+        write_avs('test_probe_hex.inp', g, hexes.ravel() + 1, 8 * numpy.arange(nelem),
+                  numpy.full(nelem, 8), numpy.ones(nelem, dtype=int),
+                  node_attributes={'f': g[:, 0] * g[:, 1] * g[:, 2]})
+        u = numpy.random.uniform(0, 1, (nelem, 3))
+        w = numpy.column_stack([a * b * c for c in [1 - u[:, 2], u[:, 2]]
+                                for a, b in [(1 - u[:, 0], 1 - u[:, 1]), (u[:, 0], 1 - u[:, 1]),
+                                             (u[:, 0], u[:, 1]), (1 - u[:, 0], u[:, 1])]])
+        corners = g[hexes]
+        points = numpy.einsum('mi,mij->mj', w, corners)
+        f = numpy.einsum('mi,mi->m', w, corners.prod(axis=2))
+        with suppress_stdout():
+            hexmo = lg.read('test_probe_hex.inp')
+            centroids = hexmo.locate(corners.mean(axis=1))[0]
+            element, weights = hexmo.locate(points)
+            linear = hexmo.probe(points, 'f')['f']
+            outside = hexmo.locate([[5., 5., 5.]])[0]
+            probed = hexmo.probe([[5., 5., 5.], [-1., 0., 0.]], ['f', 'itetclr'])
+        if (centroids != numpy.arange(nelem) + 1).any() or (element != centroids).any():
+            raise ValueError('Unexpected located distorted hexes.')
+        if not numpy.allclose(weights, w) or not numpy.allclose(linear, f):
+            raise ValueError('Unexpected trilinear weights in distorted hexes.')
+        if outside[0] != 0 or not all(numpy.isnan(v).all() for v in probed.values()):
+            raise ValueError('Unexpected points outside the mesh.')
+        os.remove('test_probe_src.inp')
+        os.remove('test_probe_snk.inp')
+        os.remove('test_probe_hex.inp')
+
+    def test_uge(self):
+        '''
+        Test the PFLOTRAN UGE Utilities
+
+        Tests that a uge file is rewritten byte for byte, and that cells are
+        filtered, renumbered and merged, with and without the area/distance
+        column.
+        '''
+
+        import numpy
+        from pylagrit.io import read_uge, write_uge, filter_uge, renumber_uge, merge_uge_cells
+        lines = ['CELLS           3',
+                 '         1   5.000000000000E-01   5.000000000000E-01   5.000000000000E-01   1.000000000000E+00',
+                 '         2   1.500000000000E+00   5.000000000000E-01   5.000000000000E-01   1.000000000000E+00',
+                 '         3   2.500000000000E+00   5.000000000000E-01   5.000000000000E-01   1.000000000000E-120',
+                 'CONNECTIONS           2',
+                 '         1          2   1.000000000000E+00   5.000000000000E-01   5.000000000000E-01   1.000000000000E+00',
+                 '         2          3   2.000000000000E+00   5.000000000000E-01   5.000000000000E-01   0.000000000000E+00']
+        with open('test_uge.uge', 'w') as fh:
+            fh.write('\n'.join(lines).replace('E-120', '-120') + '\n')
+        uge = read_uge('test_uge.uge')
+        write_uge('test_uge2.uge', uge)
+        if open('test_uge.uge').read() != open('test_uge2.uge').read():
+            raise ValueError('Rewritten uge file differs.')
+        kept = filter_uge(uge, uge['areas'] > 0)
+        if len(kept['areas']) != 1 or len(kept['ids']) != 3:
+            raise ValueError('Unexpected filtered uge.')
+        renumbered = renumber_uge(uge, [2, 1, 0])
+        if list(renumbered['connections'][0]) != [2, 1] or renumbered['volumes'][2] != 1.0:
+            raise ValueError('Unexpected renumbered uge.')
+        merged = merge_uge_cells(uge, [0, 0, 1])
+        if list(merged['volumes']) != [2.0, 1.0e-120] or list(merged['connections'][0]) != [1, 2]:
+            raise ValueError('Unexpected merged uge.')
+        # Area/distance column, computed again from the merged centroids
+        lines[4] += '  I J  Xm Ym Zm   Aij  Aij/dist '
+        lines[5] += '   1.000000000000E+00'
+        lines[6] = lines[6][:-20] + '2.000000000000E+00   2.000000000000E+00'
+        with open('test_uge3.uge', 'w') as fh:
+            fh.write('\n'.join(lines).replace('E-120', '-120') + '\n')
+        uge = read_uge('test_uge3.uge')
+        write_uge('test_uge4.uge', merge_uge_cells(uge, [0, 0, 1]))
+        merged = read_uge('test_uge4.uge')
+        if 'area_distance' not in merged or not numpy.allclose(merged['area_distance'], [2.0 / 1.5]):
+            raise ValueError('Unexpected area/distance of merged uge.')
+        for f in glob.glob('test_uge*'):
+            os.remove(f)
+
+    def test_dump_exo_native(self):
+        '''
+        Test the Python Exodus II Writer
+
+        Tests that a mesh with node sets and side sets is written as a
+        netCDF-3 64-bit offset Exodus file without the Exodus library, and
+        that side sets of pyramids are rejected.
+        '''
+
+        lg = self.lg
+        with suppress_stdout():
+            mo = lg.create_hex()
+            mo.createpts_brick_xyz((4, 3, 3), (0, 0, 0), (3, 2, 2))
+            mo.pset_geom_xyz((0, 0, 0), (1, 1, 1))
+            fs = mo.create_boundary_facesets(base_name='test_exo_fs')
+            mo.dump_exo('test_native.exo', psets=True, facesets=fs.values(), native=True)
+        with open('test_native.exo', 'rb') as fh:
+            data = fh.read()
+        if data[:4] != b'CDF\x02':
+            raise ValueError('Not a netCDF 64-bit offset file.')
+        for name in [b'connect1', b'node_ns1', b'elem_ss6', b'side_ss6', b'HEX']:
+            if name not in data:
+                raise ValueError('Missing %s in Exodus file.' % name.decode())
+        # LaGriT has no Exodus side numbers for pyramid faces
+        from pylagrit.io import write_exodus
+        pyramid = [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0], [0.5, 0.5, 1]]
+        try:
+            write_exodus('test_native.exo', pyramid, [1, 2, 3, 4, 5], [0], [6],
+                         side_sets={1: ([1], [1])})
+        except ValueError:
+            pass
+        else:
+            raise ValueError('Side set of a pyramid written.')
+        for f in glob.glob('test_exo_fs*') + ['test_native.exo']:
+            os.remove(f)
                      
 @contextmanager
 def suppress_stdout():
@@ -198,6 +1116,31 @@ if __name__ == '__main__':
     suite.addTest(TestPyLaGriT('test_copy'))
     suite.addTest(TestPyLaGriT('test_pset_not'))
     suite.addTest(TestPyLaGriT('test_subset'))
+    suite.addTest(TestPyLaGriT('test_dump_vtu'))
+    suite.addTest(TestPyLaGriT('test_dump_xdmf'))
+    suite.addTest(TestPyLaGriT('test_dump_compressed'))
+    suite.addTest(TestPyLaGriT('test_read_avs'))
+    suite.addTest(TestPyLaGriT('test_create_boundary_facesets'))
+    suite.addTest(TestPyLaGriT('test_create_facesets'))
+    suite.addTest(TestPyLaGriT('test_dump_many'))
+    suite.addTest(TestPyLaGriT('test_zone'))
+    suite.addTest(TestPyLaGriT('test_dump_exo_native'))
+    suite.addTest(TestPyLaGriT('test_uge'))
+    suite.addTest(TestPyLaGriT('test_dump_zones_by_attribute'))
+    suite.addTest(TestPyLaGriT('test_connect_parallel'))
+    suite.addTest(TestPyLaGriT('test_merge_tree'))
+    suite.addTest(TestPyLaGriT('test_refine_to_object'))
+    suite.addTest(TestPyLaGriT('test_classify_nodes'))
+    suite.addTest(TestPyLaGriT('test_assign_from_raster'))
+    suite.addTest(TestPyLaGriT('test_read_dem'))
+    suite.addTest(TestPyLaGriT('test_refine_to_size'))
+    suite.addTest(TestPyLaGriT('test_improve'))
+    suite.addTest(TestPyLaGriT('test_quality_report'))
+    suite.addTest(TestPyLaGriT('test_upscale_many'))
+    suite.addTest(TestPyLaGriT('test_interpolate_many'))
+    suite.addTest(TestPyLaGriT('test_spatial_index'))
+    suite.addTest(TestPyLaGriT('test_nearest_nodes'))
+    suite.addTest(TestPyLaGriT('test_locate_probe'))
     runner.run(suite)
     
     
@@ -212,18 +212,24 @@ void cread_(unit , array , ilen , ierr)
 void cclose (unit)
   int *unit;
   {
-      fclose(fd[*unit]);
+/*  files may be closed again by the caller, so forget closed streams  */
+      if (fd[*unit] != NULL) fclose(fd[*unit]);
+      fd[*unit] = NULL;
   }
 
 void cclose_(unit)
   int *unit;
   {
-      fclose(fd[*unit]);
+/*  files may be closed again by the caller, so forget closed streams  */
+      if (fd[*unit] != NULL) fclose(fd[*unit]);
+      fd[*unit] = NULL;
   }
 
 void CCLOSE(unit)
   int *unit;
   {
-      fclose(fd[*unit]);
+/*  files may be closed again by the caller, so forget closed streams  */
+      if (fd[*unit] != NULL) fclose(fd[*unit]);
+      fd[*unit] = NULL;
   }
 